@@ -0,0 +1,76 @@
+"""Compare two result files written by benchmarks/run.py.
+
+    python benchmarks/compare.py before.json after.json
+    python benchmarks/compare.py before.json after.json --threshold 5 --fail
+
+Changes larger than the threshold (in percent) are marked as regressions or
+improvements. With --fail the exit status is 1 when anything regressed.
+"""
+
+import argparse
+import json
+import sys
+
+# For everything else (times, sizes) lower is better
+HIGHER_IS_BETTER = {"entries/s"}
+
+
+def load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+
+    results = {
+        (row["backend"], row["size"], row["operation"]): row
+        for row in report["results"]
+    }
+    return report["meta"], results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark runs")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0)
+    parser.add_argument("--fail", action="store_true")
+    args = parser.parse_args()
+
+    before_meta, before = load(args.before)
+    after_meta, after = load(args.after)
+
+    print(f"before: {before_meta.get('commit')}  after: {after_meta.get('commit')}")
+    print(
+        f"{'backend':<9} {'size':>8}  {'operation':<22} "
+        f"{'before':>12} {'after':>12} {'change':>8}"
+    )
+
+    regressions = 0
+
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key]["value"], after[key]["value"]
+        unit = after[key]["unit"]
+
+        change = (new - old) / old * 100 if old else 0.0
+        better = change > 0 if unit in HIGHER_IS_BETTER else change < 0
+
+        mark = ""
+        if abs(change) >= args.threshold:
+            mark = "improved" if better else "REGRESSED"
+            regressions += not better
+
+        backend, size, operation = key
+        print(
+            f"{backend:<9} {size:>8}  {operation:<22} "
+            f"{old:>12,.3f} {new:>12,.3f} {change:>+7.1f}%  {unit} {mark}"
+        )
+
+    for key in sorted(before.keys() ^ after.keys()):
+        print(
+            f"only in {'before' if key in before else 'after'}: {' '.join(map(str, key))}"
+        )
+
+    if args.fail and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
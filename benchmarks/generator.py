@@ -0,0 +1,126 @@
+"""Deterministic synthetic diaries for the lifelog benchmarks.
+
+The same seed, size and distribution always produce the same entries, so
+results from different commits are measured against identical data.
+
+    python benchmarks/generator.py --entries 10000 --output diary.jsonl
+    python benchmarks/generator.py --entries 1000 --distribution lognormal
+
+The JSONL output can be loaded with `lifelog import`.
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+
+from datetime import datetime, timedelta
+
+DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+DEFAULT_SEED = 1234
+DEFAULT_MEAN_WORDS = 120
+START_DATE = datetime(2015, 1, 1, 7, 0)
+
+WORDS = (
+    "morning coffee walk dog park rain sun cloud train office meeting code "
+    "review bug release lunch friend call family dinner book read chapter "
+    "movie music guitar run gym swim bike tired happy calm anxious grateful "
+    "plan idea project garden kitchen bread soup market travel airport hotel "
+    "beach mountain river forest city street night sleep dream note list "
+    "doctor school teacher lesson language history letter photo memory week "
+    "weekend holiday birthday gift weather winter spring summer autumn tea"
+).split()
+
+# Rare words give searches something selective to look for
+RARE_WORDS = ("aurora", "zeppelin", "quokka", "obsidian", "marzipan")
+RARE_WORD_RATE = 0.01
+
+
+class DiaryGenerator:
+    def __init__(
+        self,
+        entries,
+        distribution="lognormal",
+        mean_words=DEFAULT_MEAN_WORDS,
+        seed=DEFAULT_SEED,
+    ):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown distribution {distribution!r}")
+
+        self.entries = entries
+        self.distribution = distribution
+        self.mean_words = mean_words
+        self.seed = seed
+
+    def word_count(self, rng):
+        if self.distribution == "fixed":
+            return self.mean_words
+
+        if self.distribution == "uniform":
+            return rng.randint(1, 2 * self.mean_words)
+
+        # Most entries are short, a few are very long; sigma=1 keeps the mean
+        # at mean_words.
+        sigma = 1.0
+        mu = math.log(self.mean_words) - sigma**2 / 2
+        return max(1, int(rng.lognormvariate(mu, sigma)))
+
+    def make_body(self, rng):
+        words = rng.choices(WORDS, k=self.word_count(rng))
+
+        if rng.random() < RARE_WORD_RATE:
+            words[rng.randrange(len(words))] = rng.choice(RARE_WORDS)
+
+        # Break the text into sentences and paragraphs so it looks like a diary
+        sentences = []
+        while words:
+            length = rng.randint(5, 15)
+            sentence, words = words[:length], words[length:]
+            sentences.append(" ".join(sentence).capitalize() + ".")
+
+        paragraphs = [
+            " ".join(sentences[i : i + 4]) for i in range(0, len(sentences), 4)
+        ]
+        return "\n\n".join(paragraphs)
+
+    def __iter__(self):
+        rng = random.Random(self.seed)
+        timestamp = START_DATE
+
+        for _ in range(self.entries):
+            # Timestamps only ever move forward, a few entries per day
+            timestamp += timedelta(seconds=rng.randint(600, 12 * 3600))
+            yield timestamp, self.make_body(rng)
+
+    def __len__(self):
+        return self.entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic diary")
+    parser.add_argument("--entries", type=int, default=1000)
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--mean-words", type=int, default=DEFAULT_MEAN_WORDS)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--output", type=str, help="JSONL file (default: stdout)")
+    args = parser.parse_args()
+
+    generator = DiaryGenerator(
+        args.entries, args.distribution, args.mean_words, args.seed
+    )
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for timestamp, body in generator:
+            out.write(
+                json.dumps({"timestamp": timestamp.isoformat(), "body": body}) + "\n"
+            )
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""Storage benchmark suite for lifelog.
+
+Loads a synthetic diary (see generator.py) into each storage backend and
+times the operations the CLI relies on. Results are written as JSON rows of
+{backend, size, operation, value, unit} so two runs can be diffed with
+compare.py.
+
+    python benchmarks/run.py --sizes 1000 10000 --output before.json
+    python benchmarks/run.py --sizes 1000000 --backend database --skip-startup
+    python benchmarks/compare.py before.json after.json
+
+Everything runs offline against temporary directories.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from datetime import datetime, timezone
+from itertools import islice
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+# The backends read DEBUG_MODE at import time and would use the dev diary
+os.environ.pop("DEBUG_MODE", None)
+
+from benchmarks.generator import (
+    DEFAULT_MEAN_WORDS,
+    DEFAULT_SEED,
+    DISTRIBUTIONS,
+    RARE_WORDS,
+    DiaryGenerator,
+)
+from benchmarks.startup import benchmark_startup, write_config
+from lifelog.core.config import Config
+from lifelog.core.entry import Entry
+
+BACKENDS = ("database", "file")
+DEFAULT_SIZES = (1000, 10000)
+LOAD_BATCH_SIZE = 10_000
+SEARCH_QUERIES = ("coffee", RARE_WORDS[0], "morning walk")
+
+
+def open_storage(config):
+    if config.settings["storage_mode"] == "database":
+        from lifelog.storage.database import DatabaseStorage
+
+        return DatabaseStorage(config)
+
+    from lifelog.storage.file import FileStorage
+
+    return FileStorage(config)
+
+
+def disk_usage(folder):
+    return sum(
+        path.stat().st_size for path in Path(folder).rglob("*") if path.is_file()
+    )
+
+
+def history_bytes(storage, folder):
+    """Bytes spent on past versions.
+
+    Database pages are reused and grow in steps, so their size says little
+    about a few edits: count the deltas, plus the keyframe bodies only
+    history still refers to. The file backend appends every version, its
+    files are the measure.
+    """
+    connection = getattr(storage, "connection", None)
+    if connection is None:
+        return disk_usage(folder)
+
+    return connection.execute(
+        """
+        SELECT
+            (SELECT coalesce(sum(length(data)), 0) FROM entries_history)
+            + (SELECT coalesce(sum(length(CAST(body AS BLOB))), 0) FROM bodies
+               WHERE body_id IN (SELECT body_id FROM entries_history)
+                 AND body_id NOT IN (SELECT body_id FROM entries))
+        """
+    ).fetchone()[0]
+
+
+def settle(storage):
+    # Fold the WAL back into the database so file sizes reflect stored data
+    connection = getattr(storage, "connection", None)
+    if connection is not None:
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def time_call(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+class Suite:
+    def __init__(self, backend, size, args):
+        self.backend = backend
+        self.size = size
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.results = []
+
+    def record(self, operation, value, unit):
+        self.results.append(
+            {
+                "backend": self.backend,
+                "size": self.size,
+                "operation": operation,
+                "value": round(value, 4),
+                "unit": unit,
+            }
+        )
+        print(f"  {operation:<22} {value:>14,.3f} {unit}")
+
+    def run(self):
+        print(f"{self.backend} / {self.size} entries")
+
+        with tempfile.TemporaryDirectory(prefix="lifelog-bench-") as tmp:
+            config_file = write_config(tmp, self.backend)
+            storage = open_storage(Config(config_file))
+
+            try:
+                self.bench_writes(storage, tmp)
+                self.bench_reads(storage)
+                self.bench_updates(storage, tmp)
+                self.bench_search(storage)
+            finally:
+                storage.close()
+
+            if not self.args.skip_startup:
+                self.bench_startup(config_file)
+
+        return self.results
+
+    def bench_writes(self, storage, folder):
+        generator = DiaryGenerator(
+            self.size, self.args.distribution, self.args.mean_words, self.args.seed
+        )
+        entries = (
+            Entry(body=body, timestamp=timestamp, storage_type=storage.type)
+            for timestamp, body in generator
+        )
+
+        start = time.perf_counter()
+        while batch := list(islice(entries, LOAD_BATCH_SIZE)):
+            storage.add_entries(batch)
+        elapsed = time.perf_counter() - start
+        settle(storage)
+
+        self.record("bulk_load", self.size / elapsed, "entries/s")
+        self.record("disk_size", disk_usage(folder) / 1024 / 1024, "MiB")
+
+        def add_one():
+            storage.add_entry(
+                Entry(
+                    body="benchmark entry",
+                    timestamp=datetime.now(),
+                    storage_type=storage.type,
+                )
+            )
+
+        self.record("add_entry", time_call(add_one, self.args.repeat), "ms")
+
+    def bench_reads(self, storage):
+        self.record(
+            "first_page",
+            time_call(lambda: storage.get_entry_headers_page(), self.args.repeat),
+            "ms",
+        )
+
+        start = time.perf_counter()
+        self.uids = [header.uid for header in storage.iter_entry_headers()]
+        self.record("all_headers", (time.perf_counter() - start) * 1000, "ms")
+
+        self.record("get_entries", time_call(storage.get_entries, 1), "ms")
+
+        self.record(
+            "get_entry",
+            time_call(
+                lambda: storage.get_entry(self.rng.choice(self.uids)),
+                self.args.repeat,
+            ),
+            "ms",
+        )
+
+    def bench_updates(self, storage, folder):
+        edits = self.args.repeat
+        settle(storage)
+        before = history_bytes(storage, folder)
+
+        def edit_one():
+            entry = storage.get_entry(self.rng.choice(self.uids))
+            storage.update_entry(
+                entry,
+                Entry(
+                    body=entry.body + "\n\nEdited during the benchmark.",
+                    timestamp=datetime.now(),
+                    storage_type=storage.type,
+                ),
+            )
+
+        self.record("update_entry", time_call(edit_one, edits), "ms")
+        settle(storage)
+        self.record(
+            "history_growth",
+            (history_bytes(storage, folder) - before) / edits,
+            "B/edit",
+        )
+
+    def bench_search(self, storage):
+        for query in SEARCH_QUERIES:
+            self.record(
+                f"search[{query}]",
+                time_call(
+                    lambda query=query: storage.search_entries(query),
+                    self.args.repeat,
+                ),
+                "ms",
+            )
+
+    def bench_startup(self, config_file):
+        scenarios = benchmark_startup(
+            storage_mode=self.backend,
+            runs=self.args.startup_runs,
+            verbose=False,
+            config_file=config_file,
+        )
+
+        for name, stats in scenarios.items():
+            self.record(f"startup[{name}]", stats["median_ms"], "ms")
+
+
+def git_commit():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PROJECT_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return result.stdout.strip() or None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="lifelog storage benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument(
+        "--backend",
+        action="append",
+        choices=BACKENDS,
+        help="backend to run, can be repeated (default: all)",
+    )
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--mean-words", type=int, default=DEFAULT_MEAN_WORDS)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument(
+        "--repeat", type=int, default=50, help="samples per timed operation"
+    )
+    parser.add_argument("--startup-runs", type=int, default=5)
+    parser.add_argument("--skip-startup", action="store_true")
+    parser.add_argument("--output", type=str, help="write results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for backend in args.backend or BACKENDS:
+        for size in args.sizes:
+            results.extend(Suite(backend, size, args).run())
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "sqlite": sqlite3.sqlite_version,
+            "distribution": args.distribution,
+            "mean_words": args.mean_words,
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"Wrote results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""Cold-start benchmark for the lifelog CLI.
+
+Every sample runs in a fresh interpreter against a throwaway diary, so the
+numbers include interpreter start, imports, config parsing and schema setup.
+
+    python benchmarks/startup.py --runs 20 --output startup.json
+    python benchmarks/startup.py --importtime --storage-mode file
+
+Scenarios:
+    message  `lifelog -m TEXT`, end to end
+    read     `lifelog -r` up to the point the first page is ready to render
+    menu     `lifelog` up to the point the interactive menu is ready
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+CONFIG_TEMPLATE = """\
+[settings]
+editor="vi"
+verbose=false
+storage_mode="{storage_mode}"
+
+[paths]
+diary_db="{db}"
+diary_folder="{folder}"
+
+[storage]
+db_engine="sqlite3"
+file_extension="md"
+"""
+
+# The interactive paths need a TTY, so they are driven up to the moment the
+# terminal would take over. Arguments after the code end up in sys.argv.
+INTERACTIVE_SNIPPET = """\
+import sys
+from itertools import islice
+from lifelog.main import App
+
+app = App()
+if app.args.read_entries:
+    # What select_and_open_entry() hands the picker, and the first page it
+    # loads before curses draws it
+    from lifelog.cli.picker import Picker
+    picker = Picker(
+        app.storage.iter_entry_headers,
+        "Select entry to view: ",
+        page_size=app.storage.page_size,
+    )
+    [str(header) for header in islice(picker.source, picker.page_size)]
+else:
+    app.menu_handler
+"""
+
+
+def scenario_commands(config_file):
+    return {
+        "message": [
+            sys.executable,
+            "-m",
+            "lifelog",
+            "--config-file",
+            config_file,
+            "-m",
+            "startup benchmark entry",
+        ],
+        "read": [
+            sys.executable,
+            "-c",
+            INTERACTIVE_SNIPPET,
+            "--config-file",
+            config_file,
+            "-r",
+        ],
+        "menu": [
+            sys.executable,
+            "-c",
+            INTERACTIVE_SNIPPET,
+            "--config-file",
+            config_file,
+        ],
+    }
+
+
+def make_env():
+    env = dict(os.environ)
+    env.pop("DEBUG_MODE", None)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(PROJECT_ROOT), env.get("PYTHONPATH")])
+    )
+    return env
+
+
+def run_once(command, env, importtime=False):
+    if importtime:
+        command = [command[0], "-X", "importtime", *command[1:]]
+
+    start = time.perf_counter()
+    try:
+        # A crashing CLI would otherwise pass for a fast startup
+        result = subprocess.run(
+            command, env=env, capture_output=True, text=True, check=True
+        )
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(
+            f"{' '.join(command)} failed ({e.returncode}):\n{e.stderr}"
+        ) from e
+    elapsed = time.perf_counter() - start
+
+    return elapsed, result.stderr
+
+
+def parse_importtime(stderr, top):
+    imports = []
+
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        imports.append((module.strip(), int(cumulative_us), int(self_us)))
+
+    imports.sort(key=lambda item: item[1], reverse=True)
+    return [
+        {"module": module, "cumulative_us": cumulative, "self_us": self_time}
+        for module, cumulative, self_time in imports[:top]
+    ]
+
+
+def write_config(folder, storage_mode="database"):
+    config_file = Path(folder) / "config.toml"
+    config_file.write_text(
+        CONFIG_TEMPLATE.format(
+            storage_mode=storage_mode,
+            db=Path(folder) / "diary.db",
+            folder=Path(folder) / "diary",
+        )
+    )
+    return str(config_file)
+
+
+def seed_diary(config_file, entries):
+    code = (
+        "import sys\n"
+        "from datetime import datetime\n"
+        "from lifelog.core.config import Config\n"
+        "from lifelog.core.entry import Entry\n"
+        "from lifelog.storage.database import DatabaseStorage\n"
+        "from lifelog.storage.file import FileStorage\n"
+        "config = Config(sys.argv[1])\n"
+        "mode = config.settings['storage_mode']\n"
+        "storage = (DatabaseStorage if mode == 'database' else FileStorage)(config)\n"
+        "storage.add_entries([Entry(body=f'seed entry {i}', timestamp=datetime.now(), "
+        "storage_type=mode) for i in range(int(sys.argv[2]))])\n"
+    )
+    subprocess.run(
+        [sys.executable, "-c", code, config_file, str(entries)],
+        env=make_env(),
+        check=True,
+    )
+
+
+def summarize(samples):
+    samples_ms = [sample * 1000 for sample in samples]
+    return {
+        "runs": len(samples_ms),
+        "min_ms": round(min(samples_ms), 2),
+        "median_ms": round(statistics.median(samples_ms), 2),
+        "mean_ms": round(statistics.fmean(samples_ms), 2),
+        "max_ms": round(max(samples_ms), 2),
+        "samples_ms": [round(sample, 2) for sample in samples_ms],
+    }
+
+
+def benchmark_startup(
+    storage_mode="database",
+    entries=1000,
+    runs=10,
+    scenarios=None,
+    importtime=False,
+    top=15,
+    verbose=True,
+    config_file=None,
+):
+    # Without a config file, measure against a throwaway seeded diary
+    if config_file is None:
+        with tempfile.TemporaryDirectory(prefix="lifelog-startup-") as tmp:
+            config_file = write_config(tmp, storage_mode)
+            seed_diary(config_file, entries)
+            return benchmark_startup(
+                storage_mode,
+                entries,
+                runs,
+                scenarios,
+                importtime,
+                top,
+                verbose,
+                config_file,
+            )
+
+    results = {}
+    env = make_env()
+    commands = scenario_commands(config_file)
+
+    for name in scenarios or commands:
+        command = commands[name]
+
+        # Warm the OS page cache and .pyc files so runs are comparable
+        run_once(command, env)
+        samples = [run_once(command, env)[0] for _ in range(runs)]
+
+        results[name] = summarize(samples)
+
+        if importtime:
+            _, stderr = run_once(command, env, importtime=True)
+            results[name]["imports"] = parse_importtime(stderr, top)
+
+        if not verbose:
+            continue
+
+        stats = results[name]
+        print(
+            f"{name:<8} median {stats['median_ms']:>8.2f} ms"
+            f"  min {stats['min_ms']:>8.2f} ms  max {stats['max_ms']:>8.2f} ms"
+        )
+
+        for item in stats.get("imports", []):
+            print(f"    {item['cumulative_us']:>8} us  {item['module']}")
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="lifelog cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--entries", type=int, default=1000)
+    parser.add_argument(
+        "--storage-mode", choices=["database", "file"], default="database"
+    )
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=["message", "read", "menu"],
+        help="scenario to run, can be repeated (default: all)",
+    )
+    parser.add_argument(
+        "--importtime",
+        action="store_true",
+        help="also record the slowest imports of each scenario (-X importtime)",
+    )
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--output", type=str, help="write results as JSON")
+    args = parser.parse_args()
+
+    results = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "storage_mode": args.storage_mode,
+        "entries": args.entries,
+        "scenarios": benchmark_startup(
+            storage_mode=args.storage_mode,
+            entries=args.entries,
+            runs=args.runs,
+            scenarios=args.scenario,
+            importtime=args.importtime,
+            top=args.top,
+        ),
+    }
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"Wrote results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,2 @@
 __appname__ = "lifelog"
-__version__ = "0.0.1"
+__version__ = "0.1.0a1"
@@ -1,8 +1,19 @@
 import argparse
+import codecs
 import os
 
 from dataclasses import dataclass
-from importlib.metadata import version as get_version
+from datetime import datetime
+
+from lifelog import __version__
+from lifelog.core.constants import (
+    DEFAULT_IMPORT_BATCH_SIZE,
+    EXPORT_FORMATS,
+    IMPORT_FORMATS,
+)
+from lifelog.core.stats import PERIODS
+from lifelog.core.tags import normalize_tag
+from lifelog.core.timestamps import resolve_date_range
 
 
 @dataclass(frozen=True)
@@ -12,10 +23,86 @@ class CliArgs:
     read_entries: bool
     new: bool
     config_file: str
+    search: str
+    related: int | None = None
+    separator: str = "\n"
+    profile: bool = False
+    profile_output: str | None = None
+    since: datetime | None = None
+    until: datetime | None = None
+    tag: str | None = None
+    # Subcommands, only set when the matching command is used
+    command: str | None = None
+    sources: list[str] | None = None
+    format: str = "auto"
+    batch_size: int = DEFAULT_IMPORT_BATCH_SIZE
+    destination: str | None = None
+    workers: int | None = None
+    period: str = "month"
+    limit: int | None = None
+    rebuild: bool = False
+    stop: bool = False
+    pages: int | None = None
+    uid: int | None = None
+    paths: list[str] | None = None
+    handle: str | None = None
+    output: str | None = None
+    before: int | None = None
+
+
+def parse_separator(value):
+    # So "\0" or "\n\n" can be given on the command line. unicode_escape
+    # reads bytes as latin-1, so anything else goes through as an escape.
+    separator = codecs.decode(
+        value.encode("latin-1", "backslashreplace"), "unicode_escape"
+    )
+
+    if not separator:
+        raise argparse.ArgumentTypeError("the separator can't be empty")
+
+    return separator
 
 
-def parse_args() -> CliArgs:
-    parser = argparse.ArgumentParser(description="Diary app")
+def add_date_range_arguments(parser, default=None):
+    # Subcommands accept these too, SUPPRESS keeps them from overwriting
+    # values given before the subcommand.
+    parser.add_argument(
+        "--since",
+        type=str,
+        metavar="DATE",
+        default=default,
+        help="only entries from DATE on (2024-03-01, today, yesterday, 3d, 2w)",
+    )
+
+    parser.add_argument(
+        "--until",
+        type=str,
+        metavar="DATE",
+        default=default,
+        help="only entries up to and including DATE",
+    )
+
+    parser.add_argument(
+        "--on",
+        type=str,
+        metavar="DATE",
+        default=default,
+        help="only entries written on DATE",
+    )
+
+
+def add_tag_argument(parser, default=None):
+    parser.add_argument(
+        "--tag",
+        type=str,
+        metavar="TAG",
+        default=default,
+        help="only entries tagged TAG, e.g. health, #health or @alice",
+    )
+
+
+def parse_args(argv=None) -> CliArgs:
+    parser = argparse.ArgumentParser(prog="lifelog", description="Diary app")
 
     parser.add_argument(
         "-n", "--new", action="store_true", help="open an editor and write an entry"
@@ -29,10 +116,39 @@ def parse_args() -> CliArgs:
     )
 
     parser.add_argument(
-        "-m", "--message", type=str, metavar="TEXT", help="write a quick diary entry"
+        "-m",
+        "--message",
+        type=str,
+        metavar="TEXT",
+        help="write a quick diary entry, or '-' to write one per line read from stdin",
     )
 
-    __version__ = get_version("lifelog")
+    parser.add_argument(
+        "--separator",
+        type=parse_separator,
+        default="\n",
+        metavar="SEP",
+        help=r"record separator for '-m -', e.g. '\0' or '\n\n' (default: newline)",
+    )
+
+    parser.add_argument(
+        "-s",
+        "--search",
+        type=str,
+        metavar="QUERY",
+        help="full-text search entries and print the best matches",
+    )
+
+    parser.add_argument(
+        "--related",
+        type=int,
+        metavar="UID",
+        help="print the entries most similar to entry UID",
+    )
+
+    add_date_range_arguments(parser)
+    add_tag_argument(parser)
+
     parser.add_argument(
         "-v", "--version", action="version", version=f"%(prog)s {__version__}"
     )
@@ -49,6 +165,158 @@ def parse_args() -> CliArgs:
         "--config-file", type=str, metavar="TEXT", help="specify the config file to use"
     )
 
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="time config loading, storage calls, the editor and the menu, "
+        "and print a summary when done",
+    )
+
+    parser.add_argument(
+        "--profile-output",
+        type=str,
+        metavar="PATH",
+        help="with --profile, also write a Chrome trace (.json) or a cProfile "
+        "stats file (any other name)",
+    )
+
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    import_parser = subparsers.add_parser(
+        "import",
+        help="import entries from markdown folders, text files or JSONL exports",
+    )
+    import_parser.add_argument(
+        "sources", nargs="+", metavar="PATH", help="files or folders to import"
+    )
+    import_parser.add_argument(
+        "--format",
+        choices=IMPORT_FORMATS,
+        default="auto",
+        help="format of the source files, guessed from the extension by default",
+    )
+    import_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_IMPORT_BATCH_SIZE,
+        metavar="N",
+        help="number of entries written per transaction",
+    )
+
+    export_parser = subparsers.add_parser(
+        "export",
+        help="export all entries to JSONL, a markdown folder or a .tar.gz archive",
+    )
+    export_parser.add_argument(
+        "destination",
+        metavar="PATH",
+        help="file or folder to write, e.g. diary.jsonl, diary/ or diary.tar.gz",
+    )
+    export_parser.add_argument(
+        "--format",
+        choices=EXPORT_FORMATS,
+        default="auto",
+        help="output format, guessed from the destination by default",
+    )
+    export_parser.add_argument(
+        "--workers",
+        type=int,
+        metavar="N",
+        help="number of threads rendering and compressing entries",
+    )
+    add_date_range_arguments(export_parser, argparse.SUPPRESS)
+    add_tag_argument(export_parser, argparse.SUPPRESS)
+
+    stats_parser = subparsers.add_parser(
+        "stats", help="show entries and words over time, streaks and longest entries"
+    )
+    stats_parser.add_argument(
+        "--period",
+        choices=PERIODS,
+        default="month",
+        help="group the totals by day, week, month or year",
+    )
+    stats_parser.add_argument(
+        "--limit",
+        type=int,
+        metavar="N",
+        help="number of periods and longest entries to show",
+    )
+    stats_parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="recompute the statistics and search index from the entries themselves",
+    )
+    add_date_range_arguments(stats_parser, argparse.SUPPRESS)
+
+    tags_parser = subparsers.add_parser(
+        "tags", help="list the #tags and @people used, most used first"
+    )
+    tags_parser.add_argument(
+        "--limit", type=int, metavar="N", help="number of tags to show"
+    )
+    add_date_range_arguments(tags_parser, argparse.SUPPRESS)
+
+    attach_parser = subparsers.add_parser(
+        "attach", help="attach images, audio notes, PDFs or other files to an entry"
+    )
+    attach_parser.add_argument(
+        "uid", type=int, metavar="UID", help="entry to attach to"
+    )
+    attach_parser.add_argument(
+        "paths", nargs="+", metavar="PATH", help="files to attach"
+    )
+
+    attachment_parser = subparsers.add_parser(
+        "attachment", help="save an attachment to a file"
+    )
+    attachment_parser.add_argument(
+        "handle", metavar="HANDLE", help="attachment handle, e.g. att:3f2a9c1b0d4e"
+    )
+    attachment_parser.add_argument(
+        "-o",
+        "--output",
+        metavar="PATH",
+        help="file or folder to write, the attachment's name by default",
+    )
+
+    backup_parser = subparsers.add_parser(
+        "backup",
+        help="take a verified snapshot of the diary database and rotate old ones",
+    )
+    backup_parser.add_argument(
+        "destination",
+        nargs="?",
+        metavar="FOLDER",
+        help="folder to write the snapshot to, paths.backup_folder by default",
+    )
+    backup_parser.add_argument(
+        "--pages",
+        type=int,
+        metavar="N",
+        help="pages copied per step, fewer keeps each lock shorter",
+    )
+
+    archive_parser = subparsers.add_parser(
+        "archive",
+        help="move the entries of past years out of the diary, one database per year",
+    )
+    archive_parser.add_argument(
+        "--before",
+        type=int,
+        metavar="YEAR",
+        help="archive the years before YEAR, by default all but the last "
+        "archive.hot_years",
+    )
+
+    daemon_parser = subparsers.add_parser(
+        "daemon",
+        help="keep lifelog loaded and serve commands over a local socket",
+    )
+    daemon_parser.add_argument(
+        "--stop", action="store_true", help="stop the running daemon"
+    )
+
     # Print out args if none were provided
     # NOTE: no longer used since we have the MenuHandler
     # args = parser.parse_args()
@@ -57,4 +325,25 @@ def parse_args() -> CliArgs:
     #    parser.print_help()
     #    sys.exit(1)
 
-    return CliArgs(**vars(parser.parse_args()))
+    args = parser.parse_args(argv)
+
+    if args.on and (args.since or args.until):
+        parser.error("--on can't be combined with --since or --until")
+
+    try:
+        args.since, args.until = resolve_date_range(args.since, args.until, args.on)
+    except ValueError as e:
+        parser.error(str(e))
+
+    del args.on
+
+    if args.tag is not None:
+        try:
+            args.tag = normalize_tag(args.tag)
+        except ValueError as e:
+            parser.error(str(e))
+
+    if args.profile_output:
+        args.profile = True
+
+    return CliArgs(**vars(args))
@@ -4,6 +4,7 @@ import subprocess
 from pathlib import Path
 
 from lifelog.cli.interface import ui, State
+from lifelog.core import profiling
 
 
 class Editor:
@@ -18,7 +19,8 @@ class Editor:
     def open(self, file_path: Path):
         try:
             ui.state = State.IN_EDITOR
-            subprocess.run([self.editor, str(file_path)], check=True)
+            with profiling.span("editor"):
+                subprocess.run([self.editor, str(file_path)], check=True)
             ui.reset_state()
         except subprocess.CalledProcessError as e:
             print(f"Editor exited with an error: {e}")
@@ -23,7 +23,7 @@ class Interface:
 
     @state.setter
     def state(self, value: State):
-        logger.info(f"Setting state to: {value}")
+        logger.info("Setting state to: %s", value)
         self._last_state = self._state
         self._state = value
 
@@ -35,28 +35,27 @@ class Interface:
         if not self._last_state:
             raise Exception("Can't reset state if its last state was None")
 
-        logger.info(f"Setting state to: {self._last_state}")
+        logger.info("Setting state to: %s", self._last_state)
         self._state = self._last_state
 
     def print(self, *args):
         message = " ".join(map(str, args))
 
-        logger.debug(f"User wants to print {message} in state {str(self._state)}")
+        logger.debug("User wants to print %s in state %s", message, self._state)
 
         match self.state:
             case State.MENU:
-                logger.debug(f"Adding message to buffer: '{message}'")
+                logger.debug("Adding message to buffer: '%s'", message)
                 self._buffer.append(message)
 
             case State.CLI:
-                logger.debug(
-                    f"Printing message: '{message}'"
-                )  # TODO: maybe unecessary idk
+                # TODO: maybe unecessary idk
+                logger.debug("Printing message: '%s'", message)
                 print(message)
 
             case _:
                 msg = f"State {self.state} does not have a valid way of dealing with user messages."
-                logger.CRITICAL(msg)
+                logger.critical(msg)
                 raise ValueError(msg)
 
     def flush(self):
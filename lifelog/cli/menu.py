@@ -1,11 +1,14 @@
 import logging
 
-from simple_term_menu import TerminalMenu
+from itertools import islice
 from lifelog.utils.cli import send_cls
 from lifelog.cli.interface import ui, State
+from lifelog.core import profiling
 
 logger = logging.getLogger(__name__)
 
+LOAD_MORE_LABEL = "-- Load more entries --"
+
 
 class MenuHandler:
     def __init__(self, app, config):
@@ -31,12 +34,13 @@ class MenuHandler:
     def run(self):
         ui.state = State.MENU
         while True:
-            logger.info(f"Current buffer: {ui.buffer}")
+            logger.info("Current buffer: %s", ui.buffer)
 
-            self._send_header()
+            with profiling.span("menu.render"):
+                self._send_header()
 
-            if content := ui.flush(): 
-                print(f"\n{content}")
+                if content := ui.flush():
+                    print(f"\n{content}")
 
             choice = input("\nEnter option: ").strip().lower()
 
@@ -55,20 +59,71 @@ class MenuHandler:
         exit(0)
 
 
-def prompt_selection(items: tuple, title: str, ignore_help: bool = False):
-    if not ignore_help:
-        title += "\n(Press / and start typing to filter the list)"
+def prompt_selection(
+    items,
+    title: str,
+    ignore_help: bool = False,
+    page_size: int | None = None,
+    search=None,
+):
+    """Lets the user pick one of `items`, returns None when cancelled.
+
+    `items` is a list, or a callable taking a page size and returning a fresh
+    lazy iterator (see Picker). Falls back to TerminalMenu where curses isn't
+    available.
+    """
+    load = items if callable(items) else lambda _: iter(items)
 
-    menu_display = [str(item) for item in items]
+    with profiling.span("menu.select"):
+        try:
+            from lifelog.cli.picker import Picker
+        except ImportError:  # Windows without windows-curses
+            return _prompt_with_terminal_menu(
+                load(page_size), title, ignore_help, page_size
+            )
 
-    terminal_menu = TerminalMenu(
-        menu_display,
-        title=title,
-        menu_cursor="> ",
-        menu_cursor_style=("fg_cyan", "bold"),
-    )
+        return Picker(load, title, page_size=page_size, search=search).run()
 
-    selected_index = terminal_menu.show()
 
-    if selected_index is not None:
-        return items[selected_index]
+def _prompt_with_terminal_menu(items, title, ignore_help=False, page_size=None):
+    from simple_term_menu import TerminalMenu
+
+    if not ignore_help:
+        title += "\n(Press / and start typing to filter the list)"
+
+    # Items may be a lazy iterable (e.g. Storage.iter_entries), so only pull
+    # one page at a time and let the user ask for more.
+    items = iter(items)
+    loaded = []
+    menu_display = []
+    has_more = True
+    cursor_index = 0
+
+    while True:
+        if has_more:
+            page = list(islice(items, page_size)) if page_size else list(items)
+            loaded.extend(page)
+            # A bare "|" starts TerminalMenu's preview data, escape it
+            menu_display.extend(str(item).replace("|", "\\|") for item in page)
+            has_more = page_size is not None and len(page) == page_size
+
+            logger.info("Loaded %s more items into selection", len(page))
+
+        terminal_menu = TerminalMenu(
+            menu_display + [LOAD_MORE_LABEL] if has_more else menu_display,
+            title=title,
+            cursor_index=cursor_index,
+            menu_cursor="> ",
+            menu_cursor_style=("fg_cyan", "bold"),
+        )
+
+        selected_index = terminal_menu.show()
+
+        if selected_index is None:
+            return None
+
+        if has_more and selected_index == len(loaded):
+            cursor_index = len(loaded)
+            continue
+
+        return loaded[selected_index]
@@ -0,0 +1,348 @@
+import curses
+import logging
+import os
+import time
+
+from itertools import islice
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per query while a filter scans everything, the listing itself
+# uses the storage page size so the first screen shows up immediately.
+SCAN_PAGE_SIZE = 2_000
+# Time spent filtering between two looks at the keyboard
+SCAN_SLICE = 0.03  # seconds
+# Only the best matches are kept, so a filter matching everything stays small
+MATCH_LIMIT = 10_000
+# Words shorter than this match too much to be worth asking the index about
+MIN_INDEX_WORD = 2
+
+KEY_ESCAPE = "\x1b"
+KEY_CLEAR = "\x15"  # Ctrl-U
+BACKSPACE_KEYS = (curses.KEY_BACKSPACE, "\x7f", "\b")
+ENTER_KEYS = (curses.KEY_ENTER, "\n", "\r")
+UP_KEYS = (curses.KEY_UP, "\x10")  # Ctrl-P
+DOWN_KEYS = (curses.KEY_DOWN, "\x0e")  # Ctrl-N
+
+
+class Picker:
+    """Curses list picker that only ever touches the rows it shows.
+
+    `load(page_size)` returns a fresh, lazy iterator over the items (e.g.
+    Storage.iter_entry_headers); rows are pulled from it as the cursor gets
+    near the end of what is loaded. Typing filters the list with fuzzy
+    matching on str(item). `search(words)`, when given, returns a lazy
+    iterator over the items with a word starting with each of `words` (a
+    storage-side index), or None; filters use it instead of scanning
+    everything when they can.
+
+    Filtering runs in short slices between keystrokes, so the list stays
+    responsive while a large diary is still being searched.
+    """
+
+    def __init__(self, load, title, page_size=None, search=None):
+        self.load = load
+        self.title = title
+        self.page_size = page_size or 100
+        self.search = search
+
+        self.rows = []
+        self.source = iter(load(self.page_size))
+        self.exhausted = False
+
+        self.query = ""
+        self.filter = None
+        self.cursor = 0
+        self.top = 0
+
+    def run(self):
+        # Esc should cancel right away instead of waiting for a sequence
+        os.environ.setdefault("ESCDELAY", "25")
+
+        try:
+            return curses.wrapper(self._main)
+        except KeyboardInterrupt:
+            return None
+
+    def _main(self, screen):
+        curses.curs_set(0)
+
+        while True:
+            self._fill()
+            self._draw(screen)
+
+            busy = self.filter is not None and not self.filter.done
+            screen.timeout(0 if busy else -1)
+
+            try:
+                key = screen.get_wch()
+            except curses.error:
+                # No key pressed (or the wait got interrupted, e.g. by a
+                # resize), get on with the filter if there is one
+                if self.filter is not None:
+                    self.filter.advance(SCAN_SLICE)
+                continue
+
+            if key in ENTER_KEYS:
+                if items := self._items():
+                    return items[self.cursor]
+                continue
+
+            if key == KEY_ESCAPE:
+                return None
+
+            self._handle_key(key, screen.getmaxyx()[0])
+
+    def _handle_key(self, key, height):
+        page = max(height - self._header_height() - 1, 1)
+
+        if key in UP_KEYS:
+            self.cursor -= 1
+        elif key in DOWN_KEYS:
+            self.cursor += 1
+        elif key == curses.KEY_PPAGE:
+            self.cursor -= page
+        elif key == curses.KEY_NPAGE:
+            self.cursor += page
+        elif key == curses.KEY_HOME:
+            self.cursor = 0
+        elif key == curses.KEY_END:
+            self.cursor = len(self._items()) - 1
+        elif key in BACKSPACE_KEYS:
+            self._set_query(self.query[:-1])
+        elif key == KEY_CLEAR:
+            self._set_query("")
+        elif isinstance(key, str) and key.isprintable():
+            self._set_query(self.query + key)
+
+        self.cursor = max(min(self.cursor, len(self._items()) - 1), 0)
+
+    def _set_query(self, query):
+        if query == self.query:
+            return
+
+        previous, self.query = self.filter, query
+        self.cursor = self.top = 0
+
+        if not query.strip():
+            self.filter = None
+            return
+
+        self.filter = self._make_filter(query, previous)
+        logger.debug("Filtering on '%s' (%s)", query, self.filter.kind)
+
+    def _make_filter(self, query, previous=None):
+        words = query.lower().split()
+
+        if self.search is not None:
+            index_words = [word for word in words if is_index_word(word)]
+
+            if index_words and (candidates := self.search(index_words)) is not None:
+                return Filter(words, candidates, "index", optional=index_words)
+
+        # Whatever doesn't match the old query can't match a longer one, so
+        # a scan can narrow down what it has found and carry on from there.
+        if (
+            previous is not None
+            and previous.kind == "scan"
+            and not previous.truncated
+            and query.lower().startswith(previous.query)
+        ):
+            return previous.narrow(words)
+
+        return Filter(words, iter(self.load(SCAN_PAGE_SIZE)), "scan")
+
+    def _items(self):
+        return self.filter.results() if self.filter is not None else self.rows
+
+    def _fill(self):
+        # Load the unfiltered list up to a screen past the cursor
+        if self.filter is not None and self.filter.done and not self.filter.found:
+            if self.filter.kind == "index":
+                # The index only knows whole words, fall back to fuzzy matching
+                self.filter = Filter(
+                    self.filter.words, iter(self.load(SCAN_PAGE_SIZE)), "scan"
+                )
+
+        if self.filter is not None or self.exhausted:
+            return
+
+        wanted = self.cursor + 2 * curses.LINES - len(self.rows)
+        if wanted > 0:
+            page = list(islice(self.source, max(wanted, self.page_size)))
+            self.rows.extend(page)
+            self.exhausted = len(page) < max(wanted, self.page_size)
+            logger.debug("Loaded %s more rows into the picker", len(page))
+
+    def _header_height(self):
+        return self.title.count("\n") + 2
+
+    def _draw(self, screen):
+        height, width = screen.getmaxyx()
+        items = self._items()
+        header_height = self._header_height()
+        visible = max(height - header_height - 1, 1)
+
+        # Keep the cursor inside the window, scrolling as little as possible
+        if self.cursor < self.top:
+            self.top = self.cursor
+        elif self.cursor >= self.top + visible:
+            self.top = self.cursor - visible + 1
+
+        screen.erase()
+
+        for y, line in enumerate(self.title.splitlines()):
+            _put(screen, y, line, width, curses.A_BOLD)
+        _put(screen, header_height - 1, f"> {self.query}", width)
+
+        for y, item in enumerate(items[self.top : self.top + visible]):
+            selected = self.top + y == self.cursor
+            _put(
+                screen,
+                header_height + y,
+                ("> " if selected else "  ") + str(item),
+                width,
+                curses.A_REVERSE if selected else curses.A_NORMAL,
+            )
+
+        _put(screen, height - 1, self._status(len(items)), width, curses.A_DIM)
+        screen.refresh()
+
+    def _status(self, count):
+        if self.filter is None:
+            more = "" if self.exhausted else "+"
+            return f"{count:,}{more} entries  (type to filter, Enter opens, Esc quits)"
+
+        truncated = "+" if self.filter.truncated else ""
+        searching = "" if self.filter.done else ", searching…"
+        return f"{count:,}{truncated} matches{searching}"
+
+
+class Filter:
+    """Incrementally matches `words` against the items `candidates` yields.
+
+    `optional` words came from the index, which matched them somewhere in
+    the item rather than in its text, so they score nothing instead of
+    ruling the item out when they don't match str(item).
+    """
+
+    def __init__(self, words, candidates, kind, optional=()):
+        self.words = words
+        self.query = " ".join(words)
+        self.candidates = candidates
+        self.kind = kind
+        self.optional = set(optional)
+
+        self.matches = []  # (-score, position, item)
+        self.position = 0
+        self.sorted = True
+        self._results = []  # what results() returns, None once stale
+        self.truncated = False
+        self.done = False
+
+    @property
+    def found(self):
+        return bool(self.matches)
+
+    def advance(self, budget):
+        deadline = time.perf_counter() + budget
+
+        while time.perf_counter() < deadline:
+            batch = list(islice(self.candidates, 256))
+
+            found = len(self.matches)
+            for item in batch:
+                score = fuzzy_score(self.words, str(item).lower(), self.optional)
+                if score is not None:
+                    self.matches.append((-score, self.position, item))
+                self.position += 1
+
+            if len(self.matches) > found:
+                self.sorted = False
+                self._results = None
+
+            if len(self.matches) > 2 * MATCH_LIMIT:
+                self.matches = self._sorted_matches()[:MATCH_LIMIT]
+                self.truncated = True
+
+            if len(batch) < 256:
+                self.done = True
+                return
+
+    def narrow(self, words):
+        # Rescore what was found and keep scanning where this one stopped
+        narrowed = Filter(words, self.candidates, self.kind)
+        narrowed.position = self.position
+        narrowed.done = self.done
+
+        for _, position, item in self.matches:
+            score = fuzzy_score(words, str(item).lower())
+            if score is not None:
+                narrowed.matches.append((-score, position, item))
+        narrowed.sorted = False
+        narrowed._results = None
+
+        return narrowed
+
+    def _sorted_matches(self):
+        if not self.sorted:
+            # Mostly a sorted run plus a few new matches, cheap for timsort
+            self.matches.sort(key=lambda match: match[:2])
+            self.sorted = True
+
+        return self.matches
+
+    def results(self):
+        # Drawing, counting and moving the cursor all ask for these on every
+        # key, only rebuild them when the scan found something new
+        if self._results is None:
+            self._results = [item for _, _, item in self._sorted_matches()]
+
+        return self._results
+
+
+def fuzzy_score(words, text, optional=()):
+    """Scores how well `text` matches every word, or None when one doesn't.
+
+    Substrings score best, more so at the start of a word; otherwise the
+    letters must appear in order and score less the more spread out they
+    are.
+    """
+    score = 0
+
+    for word in words:
+        position = text.find(word)
+
+        if position >= 0:
+            score += 10 * len(word)
+            if position == 0 or not text[position - 1].isalnum():
+                score += 5
+            continue
+
+        first = position = text.find(word[0])
+        for char in word[1:]:
+            if position < 0:
+                break
+            position = text.find(char, position + 1)
+
+        if position < 0:
+            if word not in optional:
+                return None
+            continue
+
+        spread = position - first + 1 - len(word)
+        score += max(4 * len(word) - spread, 1)
+
+    return score
+
+
+def is_index_word(word):
+    return len(word) >= MIN_INDEX_WORD and word.isalpha()
+
+
+def _put(screen, y, text, width, attributes=curses.A_NORMAL):
+    # curses raises when writing into the bottom right corner
+    try:
+        screen.addnstr(y, 0, text, max(width - 1, 0), attributes)
+    except curses.error:
+        pass
@@ -0,0 +1,130 @@
+"""Thin `lifelog` entry point that hands the command to a running daemon.
+
+Nothing beyond what the interpreter has already loaded is imported here, so
+a capture through `lifelog daemon` costs little more than starting Python.
+`json` and `socket` would pull in re and enum and double that, so messages
+are marshalled dicts and the socket comes straight from _socket.
+
+marshal is only safe between ends that trust each other, so the client only
+talks to a daemon run by the same user: the socket lives in a 0700 directory
+of that user's and the peer's uid is checked before anything is sent.
+
+Without a daemon, or for commands that need the terminal or take long, it
+falls back to running lifelog in this process. Once a request was sent it
+never does: the daemon may have run it already.
+"""
+
+import _socket
+import marshal
+import os
+import sys
+
+CONNECT_TIMEOUT = 0.5  # seconds, a live daemon accepts immediately
+# Long commands run in the client (see daemon.runs_in_client), anything
+# slower than this means the daemon is stuck
+RESPONSE_TIMEOUT = 60  # seconds
+MARSHAL_VERSION = 4
+SOCKET_NAME = "daemon.sock"
+
+
+class DaemonError(Exception):
+    """The daemon took a request but no usable response came back."""
+
+
+def socket_path():
+    if path := os.environ.get("LIFELOG_SOCKET"):
+        return path
+
+    # XDG_RUNTIME_DIR is private already, /tmp is shared with everyone, so
+    # the socket gets a directory of its own (see Daemon.serve)
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or "/tmp"
+    user = os.getuid() if hasattr(os, "getuid") else os.getlogin()
+    return os.path.join(runtime_dir, f"lifelog-{user}", SOCKET_NAME)
+
+
+def peer_uid(client, path):
+    if hasattr(_socket, "SO_PEERCRED"):
+        # struct ucred: pid, uid, gid as C ints
+        credentials = client.getsockopt(_socket.SOL_SOCKET, _socket.SO_PEERCRED, 12)
+        return int.from_bytes(credentials[4:8], sys.byteorder)
+
+    # Elsewhere the socket's owner, which only its creator can be
+    return os.stat(path).st_uid
+
+
+def encode(message):
+    return marshal.dumps(message, MARSHAL_VERSION)
+
+
+def decode(data):
+    return marshal.loads(data)
+
+
+def send_request(request, path=None):
+    """Returns the daemon's response, or None when no daemon of this user is
+    reachable. Raises DaemonError when the request was sent but no response
+    came back."""
+    if not hasattr(_socket, "AF_UNIX"):
+        return None
+
+    path = str(path or socket_path())
+    client = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    chunks = []
+
+    try:
+        try:
+            client.settimeout(CONNECT_TIMEOUT)
+            client.connect(path)
+
+            if peer_uid(client, path) != os.getuid():
+                sys.stderr.write(
+                    f"lifelog: ignoring {path}, it belongs to another user\n"
+                )
+                return None
+
+        except OSError:
+            return None
+
+        try:
+            client.settimeout(RESPONSE_TIMEOUT)
+            client.sendall(encode(request))
+            client.shutdown(_socket.SHUT_WR)
+
+            while chunk := client.recv(65536):
+                chunks.append(chunk)
+
+            response = decode(b"".join(chunks))
+            if not isinstance(response, dict):
+                raise TypeError(f"unexpected {type(response).__name__}")
+
+            return response
+
+        except (OSError, EOFError, ValueError, TypeError) as e:
+            raise DaemonError(f"no response from the daemon at {path}: {e}") from e
+
+    finally:
+        client.close()
+
+
+def main():
+    try:
+        response = send_request(
+            {"command": "run", "argv": sys.argv[1:], "cwd": os.getcwd()}
+        )
+    except DaemonError as e:
+        # Running it again here could write the entry twice
+        sys.stderr.write(f"lifelog: {e}, the command may or may not have run\n")
+        sys.exit(1)
+
+    if response is None or response.get("fallback"):
+        from lifelog.main import main as run_in_process
+
+        return run_in_process()
+
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    sys.exit(response["status"])
+
+
+if __name__ == "__main__":
+    main()
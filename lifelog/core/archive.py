@@ -0,0 +1,52 @@
+import logging
+import time
+
+from datetime import date
+
+from lifelog.cli.interface import ui
+from lifelog.core.constants import DEFAULT_ARCHIVE_HOT_YEARS
+
+logger = logging.getLogger(__name__)
+
+
+class Archiver:
+    """Moves the entries of past years out of the diary database.
+
+    Each year goes to its own archive database, which is only opened when
+    a listing, search or report reaches into it, so the diary file everyday
+    captures and backups work on stays small. See storage/archives.py.
+    """
+
+    def __init__(self, storage, hot_years=None):
+        self.storage = storage
+        self.hot_years = int(
+            DEFAULT_ARCHIVE_HOT_YEARS if hot_years is None else hot_years
+        )
+
+        if self.hot_years < 1:
+            raise ValueError("archive.hot_years must be at least 1")
+
+    def run(self, before=None):
+        if self.storage.type != "database":
+            ui.print("lifelog archive only supports storage_mode = 'database'")
+            return 0
+
+        before = before or date.today().year - self.hot_years + 1
+        started = time.perf_counter()
+
+        def progress(year, moved):
+            ui.print(f"Archived {moved:,} entries written in {year}")
+
+        moved = self.storage.archive(before, progress)
+        elapsed = time.perf_counter() - started
+
+        if not moved:
+            ui.print(f"No entries written before {before} left to archive")
+            return 0
+
+        logger.info("Archived %s entries before %s in %.2fs", moved, before, elapsed)
+        ui.print(
+            f"Done: moved {moved:,} entries written before {before} to "
+            f"{self.storage.archive_folder} in {elapsed:.2f}s"
+        )
+        return moved
@@ -0,0 +1,167 @@
+import logging
+import shutil
+import time
+
+from pathlib import Path
+
+from lifelog.cli.interface import ui
+from lifelog.core.constants import ATTACHMENT_CHUNK_SIZE
+from lifelog.storage.bodies import HASH_SIZE, content_hasher
+
+logger = logging.getLogger(__name__)
+
+HANDLE_PREFIX = "att:"
+HANDLE_SIZE = 6  # bytes of the content hash shown in a handle
+
+
+class Attachment:
+    """A file attached to an entry, referred to by its handle.
+
+    Payloads are stored once per content (see Storage.add_attachment), the
+    handle is the start of the content hash, so it stays the same across
+    entries, exports and machines.
+    """
+
+    __slots__ = ("digest", "name", "mime_type", "size")
+
+    def __init__(self, digest, name, mime_type, size):
+        self.digest = digest
+        self.name = name
+        self.mime_type = mime_type
+        self.size = size
+
+    @property
+    def handle(self):
+        return make_handle(self.digest)
+
+    def __str__(self):
+        return (
+            f"{self.handle}  {self.name} "
+            f"({self.mime_type or 'unknown type'}, {format_size(self.size)})"
+        )
+
+
+def make_handle(digest):
+    return HANDLE_PREFIX + digest[:HANDLE_SIZE].hex()
+
+
+def parse_handle(handle) -> bytes:
+    """Returns the hash prefix a handle (or a longer hex prefix) stands for."""
+    value = handle.strip().removeprefix(HANDLE_PREFIX)
+
+    try:
+        prefix = bytes.fromhex(value)
+    except ValueError:
+        prefix = b""
+
+    if not HANDLE_SIZE <= len(prefix) <= HASH_SIZE:
+        raise ValueError(
+            f"Invalid attachment handle '{handle}', expected e.g. att:3f2a9c1b0d4e"
+        )
+
+    return prefix
+
+
+def hash_file(path) -> bytes:
+    # Read in chunks, attachments can be far larger than memory
+    hasher = content_hasher()
+
+    with open(path, "rb") as f:
+        while chunk := f.read(ATTACHMENT_CHUNK_SIZE):
+            hasher.update(chunk)
+
+    return hasher.digest()
+
+
+def copy_verified(source, target, digest, size=None):
+    """Copies `source` to the writable `target` in chunks, checking its hash.
+
+    Raises ValueError when the file changed since it was hashed.
+    """
+    hasher = content_hasher()
+    written = 0
+
+    with open(source, "rb") as f:
+        while chunk := f.read(ATTACHMENT_CHUNK_SIZE):
+            if size is not None and written + len(chunk) > size:
+                break
+
+            hasher.update(chunk)
+            target.write(chunk)
+            written += len(chunk)
+
+    if hasher.digest() != digest or (size is not None and written != size):
+        raise ValueError(f"{source} changed while it was being attached")
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:,.0f} {unit}" if unit == "B" else f"{size:,.1f} {unit}"
+        size /= 1024
+
+
+class AttachmentHandler:
+    def __init__(self, storage):
+        self.storage = storage
+
+    def attach(self, uid, paths):
+        # Slow to import, and only needed here
+        import mimetypes
+
+        for path in map(Path, paths):
+            path = path.expanduser()
+
+            if not path.is_file():
+                ui.print(f"Skipping {path}: not a file")
+                continue
+
+            started = time.perf_counter()
+            try:
+                attachment = self.storage.add_attachment(
+                    uid,
+                    path,
+                    name=path.name,
+                    mime_type=mimetypes.guess_type(path.name)[0],
+                    digest=hash_file(path),
+                )
+            except ValueError as e:
+                # Changed while it was copied, or too large; nothing was stored
+                logger.error("Failed to attach %s to entry %s: %s", path, uid, e)
+                ui.print(f"Skipping {path}: {e}")
+                continue
+
+            if attachment is None:
+                ui.print(f"No entry found with uid {uid}")
+                return
+
+            logger.info(
+                "Attached %s to entry %s as %s in %.2fs",
+                path,
+                uid,
+                attachment.handle,
+                time.perf_counter() - started,
+            )
+            ui.print(f"Attached {attachment}")
+
+    def extract(self, handle, output=None):
+        try:
+            found = self.storage.open_attachment(parse_handle(handle))
+        except ValueError as e:
+            ui.print(str(e))
+            return None
+
+        if found is None:
+            ui.print(f"No attachment found for {handle}")
+            return None
+
+        attachment, stream = found
+        path = Path(output or attachment.name).expanduser()
+        if path.is_dir():
+            path = path / attachment.name
+
+        with stream, open(path, "wb") as f:
+            shutil.copyfileobj(stream, f, ATTACHMENT_CHUNK_SIZE)
+
+        ui.print(f"Wrote {attachment.name} ({format_size(attachment.size)}) to {path}")
+        return path
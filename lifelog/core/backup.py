@@ -0,0 +1,250 @@
+import logging
+import shutil
+import sqlite3
+import time
+
+from datetime import datetime
+from pathlib import Path
+
+from lifelog.cli.interface import ui
+from lifelog.core.constants import (
+    DEFAULT_BACKUP_FOLDER,
+    DEFAULT_BACKUP_PAGES_PER_STEP,
+    DEFAULT_BACKUP_RETENTION,
+    DEFAULT_BACKUP_STEP_PAUSE,
+)
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PREFIX = "diary-"
+SNAPSHOT_SUFFIX = ".db"
+# diary-<time>.db's archives are copied to diary-<time>.archive/
+SNAPSHOT_ARCHIVES_SUFFIX = ".archive"
+PARTIAL_SUFFIX = ".partial"
+# Tries to copy the archives while `lifelog archive` keeps replacing them
+BACKUP_ATTEMPTS = 3
+SNAPSHOT_TIME_FORMAT = "%Y%m%d-%H%M%S-%f"
+PROGRESS_STEP = 10  # percent
+
+
+class Backup:
+    """Takes verified snapshots of the diary database and rotates them.
+
+    The SQLite backup API copies `pages_per_step` pages at a time and only
+    holds a read lock while a step runs, pausing `step_pause` seconds in
+    between, so a session writing at the same time waits a few milliseconds
+    at most (with WAL, not at all). A snapshot is written under a temporary
+    name, checked with PRAGMA integrity_check and only then renamed into
+    place, so the backup folder never holds a half-written snapshot. Names
+    are never reused: a backup fails rather than overwrite a snapshot.
+
+    Archived years (see storage/archives.py) are copied the same way, into
+    a folder next to the snapshot. Restoring means copying the snapshot to
+    paths.diary_db and the files in its folder to paths.archive_folder.
+    """
+
+    def __init__(
+        self, storage, folder=None, pages_per_step=None, step_pause=None, retention=None
+    ):
+        self.storage = storage
+        self.folder = Path(folder or DEFAULT_BACKUP_FOLDER).expanduser()
+        self.pages_per_step = int(pages_per_step or DEFAULT_BACKUP_PAGES_PER_STEP)
+        self.step_pause = float(
+            DEFAULT_BACKUP_STEP_PAUSE if step_pause is None else step_pause
+        )
+        self.retention = {
+            period: int((retention or {}).get(f"keep_{period}", default))
+            for period, default in DEFAULT_BACKUP_RETENTION.items()
+        }
+
+        if any(keep < 0 for keep in self.retention.values()):
+            raise ValueError("backup.keep_* settings can't be negative")
+
+    def run(self, destination=None, pages_per_step=None):
+        if self.storage.type != "database":
+            ui.print("lifelog backup only supports storage_mode = 'database'")
+            return None
+
+        folder = Path(destination).expanduser() if destination else self.folder
+        folder.mkdir(parents=True, exist_ok=True)
+
+        snapshot = folder / (
+            f"{SNAPSHOT_PREFIX}{datetime.now():{SNAPSHOT_TIME_FORMAT}}{SNAPSHOT_SUFFIX}"
+        )
+        partial = snapshot.with_name(snapshot.name + PARTIAL_SUFFIX)
+        archives = snapshot_archives(snapshot)
+        partial_archives = archives.with_name(archives.name + PARTIAL_SUFFIX)
+
+        started = time.perf_counter()
+        reserve(snapshot, partial)
+
+        try:
+            copies = self._copy_all(
+                partial, partial_archives, pages_per_step or self.pages_per_step
+            )
+
+            for path in (partial, *copies):
+                self._verify(path)
+
+            if copies:
+                partial_archives.replace(archives)
+            partial.replace(snapshot)
+
+        finally:
+            partial.unlink(missing_ok=True)
+            shutil.rmtree(partial_archives, ignore_errors=True)
+
+        elapsed = time.perf_counter() - started
+        size = snapshot.stat().st_size + sum(
+            path.stat().st_size for path in archives.glob("*")
+        )
+
+        if copies:
+            ui.print(f"Backed up {len(copies)} archives to {archives}")
+
+        logger.info("Backed up to %s (%s bytes) in %.2fs", snapshot, size, elapsed)
+        ui.print(
+            f"Done: backed up to {snapshot} ({size / 1024 / 1024:,.1f} MiB) "
+            f"in {elapsed:.2f}s, integrity check ok"
+        )
+
+        if removed := self.rotate(folder):
+            ui.print(f"Removed {len(removed)} old snapshots")
+
+        return snapshot
+
+    def _copy_all(self, path, archives, pages_per_step) -> list:
+        # The archives to copy are the ones the diary's copy refers to. If
+        # `lifelog archive` replaced one of them in between, start over.
+        for attempt in range(1, BACKUP_ATTEMPTS + 1):
+            self._copy(path, pages_per_step)
+
+            try:
+                return self.storage.backup_archives(path, archives, pages_per_step)
+
+            except FileNotFoundError:
+                if attempt == BACKUP_ATTEMPTS:
+                    raise
+
+                logger.info("Archives changed during the backup, retrying")
+                shutil.rmtree(archives, ignore_errors=True)
+
+    def _copy(self, path, pages_per_step):
+        reported = -PROGRESS_STEP
+
+        def progress(status, remaining, total):
+            nonlocal reported
+
+            done = 100 * (total - remaining) // max(total, 1)
+            if done >= reported + PROGRESS_STEP:
+                reported = done - done % PROGRESS_STEP
+                ui.print(
+                    f"Backed up {done}% ({total - remaining:,} of {total:,} pages)"
+                )
+
+            # No lock is held between steps, give writers a chance to run
+            if remaining and self.step_pause:
+                time.sleep(self.step_pause)
+
+        self.storage.backup(path, pages_per_step, progress)
+
+    def _verify(self, path):
+        connection = sqlite3.connect(f"{path.as_uri()}?mode=ro", uri=True)
+
+        try:
+            problems = [row[0] for row in connection.execute("PRAGMA integrity_check")]
+        finally:
+            connection.close()
+
+        if problems != ["ok"]:
+            logger.error("Snapshot %s failed its integrity check: %s", path, problems)
+            raise sqlite3.DatabaseError(
+                f"Backup failed its integrity check: {'; '.join(problems[:5])}"
+            )
+
+    def rotate(self, folder):
+        snapshots = list_snapshots(folder)
+        keep = select_snapshots_to_keep(
+            [taken for taken, _ in snapshots], self.retention
+        )
+
+        removed = []
+        for taken, path in snapshots:
+            if taken not in keep:
+                path.unlink(missing_ok=True)
+                shutil.rmtree(snapshot_archives(path), ignore_errors=True)
+                removed.append(path)
+                logger.info("Removed old snapshot %s", path)
+
+        return removed
+
+
+def reserve(snapshot, partial):
+    # A backup racing another in the same microsecond, or running after
+    # the clock was set back, fails here instead of replacing a snapshot.
+    # The partial file is created exclusively so only one of them gets it.
+    try:
+        if snapshot.exists() or snapshot_archives(snapshot).exists():
+            raise FileExistsError
+        partial.open("x").close()
+
+    except FileExistsError:
+        logger.error("Snapshot %s already exists or is being written", snapshot)
+        raise FileExistsError(
+            f"Snapshot {snapshot} already exists, not overwriting it"
+        ) from None
+
+
+def snapshot_archives(snapshot):
+    return snapshot.with_suffix(SNAPSHOT_ARCHIVES_SUFFIX)
+
+
+def list_snapshots(folder):
+    """Returns (taken_at, path) of the snapshots in `folder`, newest first."""
+    snapshots = []
+
+    for path in Path(folder).glob(f"{SNAPSHOT_PREFIX}*{SNAPSHOT_SUFFIX}"):
+        stamp = path.name[len(SNAPSHOT_PREFIX) : -len(SNAPSHOT_SUFFIX)]
+
+        if (taken := parse_snapshot_time(stamp)) is not None:
+            snapshots.append((taken, path))
+
+    return sorted(snapshots, reverse=True)
+
+
+def parse_snapshot_time(stamp):
+    try:
+        return datetime.strptime(stamp, SNAPSHOT_TIME_FORMAT)
+    except ValueError:
+        # Not ours, leave it alone
+        return None
+
+
+def select_snapshots_to_keep(taken, retention):
+    """Picks which snapshot times to keep, grandfather-father-son style.
+
+    The `last` newest are kept, plus the newest snapshot of each of the
+    `daily`, `weekly` and `monthly` most recent days, weeks and months that
+    have one. The newest snapshot is always kept.
+    """
+    taken = sorted(taken, reverse=True)
+    keep = set(taken[: max(retention.get("last", 0), 1)])
+
+    periods = {
+        "daily": lambda moment: moment.date(),
+        "weekly": lambda moment: moment.isocalendar()[:2],
+        "monthly": lambda moment: (moment.year, moment.month),
+    }
+
+    for period, key in periods.items():
+        seen = set()
+
+        for moment in taken:
+            if len(seen) >= retention.get(period, 0):
+                break
+
+            if key(moment) not in seen:
+                seen.add(key(moment))
+                keep.add(moment)
+
+    return keep
@@ -24,11 +24,13 @@ class Config:
 
         self.config_file = self._resolve_config_path(user_provided_path, default_path)
 
-        logger.info(f"Using config file: {str(self.config_file)}")
+        logger.info("Using config file: %s", self.config_file)
         self.data = self._load_config()
         self.settings = self.data["settings"]
         self.paths = self.data["paths"]
         self.storage = self.data["storage"]
+        self.backup = self.data.get("backup", {})
+        self.archive = self.data.get("archive", {})
 
     def _resolve_config_path(self, user_provided_path: str, default_path: Path):
         if user_provided_path:
@@ -37,7 +39,7 @@ class Config:
                 return user_path
             else:
                 logger.error(
-                    f"Explicitly provided config file not found: {user_provided_path}"
+                    "Explicitly provided config file not found: %s", user_provided_path
                 )
                 raise FileNotFoundError(
                     f"Could not find config file {user_provided_path}"
@@ -61,4 +63,4 @@ class Config:
         default_path.parent.mkdir(parents=True, exist_ok=True)
         default_path.write_bytes(template.read_bytes())
 
-        logger.info(f"Created default config at {default_path}")
+        logger.info("Created default config at %s", default_path)
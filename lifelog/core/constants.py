@@ -1,2 +1,31 @@
 DEFAULT_CONFIG_NAME = "config.toml"
 CONFIG_TEMPLATE_NAME = "default_config.toml"
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_SEARCH_LIMIT = 20
+DEFAULT_IMPORT_BATCH_SIZE = 10_000
+IMPORT_FORMATS = ("auto", "markdown", "text", "jsonl")
+EXPORT_FORMATS = ("auto", "jsonl", "markdown", "tar")
+# Starts the attachment list under an exported entry, importing skips it
+ATTACHMENTS_MARKER = "<!-- lifelog:attachments -->"
+PREVIEW_LENGTH = 60
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024
+DEFAULT_HISTORY_KEYFRAME_INTERVAL = 16
+DEFAULT_STATS_LIMIT = 12
+DEFAULT_INGEST_BATCH_SIZE = 1_000
+DEFAULT_INGEST_FLUSH_INTERVAL = 0.2  # seconds
+DEFAULT_BODY_COMPRESSION = "zlib"
+DEFAULT_BODY_COMPRESSION_THRESHOLD = 512  # bytes
+DEFAULT_BACKUP_FOLDER = "~/.local/share/lifelog/backups"
+DEFAULT_BACKUP_PAGES_PER_STEP = 256
+DEFAULT_BACKUP_STEP_PAUSE = 0.002  # seconds
+# Snapshots kept by `lifelog backup`: the newest `last`, and the newest of
+# each of the most recent days, weeks and months
+DEFAULT_BACKUP_RETENTION = {"last": 7, "daily": 7, "weekly": 4, "monthly": 12}
+DEFAULT_TAGS_LIMIT = 50
+ATTACHMENT_CHUNK_SIZE = 1024 * 1024  # bytes read or written at a time
+DEFAULT_ARCHIVE_FOLDER = "~/.local/share/lifelog/archive"
+# `lifelog archive` leaves the current year and the one before in the diary
+DEFAULT_ARCHIVE_HOT_YEARS = 2
+DEFAULT_RELATED_LIMIT = 5
+# Below an entry opened in the editor, see `related_entries` in the config
+DEFAULT_FOOTER_RELATED = 3
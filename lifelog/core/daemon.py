@@ -0,0 +1,219 @@
+import io
+import logging
+import os
+import signal
+import socket
+
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+
+from lifelog.cli.args import parse_args
+from lifelog.cli.interface import ui
+from lifelog.client import DaemonError, decode, encode, send_request, socket_path
+
+logger = logging.getLogger(__name__)
+
+LONG_COMMANDS = ("import", "export", "backup", "archive", "attach", "attachment")
+
+
+class Daemon:
+    """Serves lifelog commands over a Unix socket from one warm App.
+
+    A client sends one request, {"command": "run", "argv": [...], "cwd": ...},
+    and half-closes the connection; the response {"status", "stdout",
+    "stderr"} is sent back before it is closed (see lifelog.client).
+    Requests are handled one at a time on this thread, so they share the
+    App's storage connection and caches without locking. Commands that need
+    a terminal or a different config file, and long ones that would hold up
+    every capture behind them, are answered with {"fallback": true} and the
+    client runs them itself.
+
+    The socket is created in a directory only this user can write to, which
+    the client checks along with the uid of the daemon it connects to.
+    """
+
+    def __init__(self, app, path=None):
+        self.app = app
+        self.path = Path(path or socket_path())
+        # app.args is replaced by every request, remember what we serve
+        self.config_file = app.args.config_file
+        self.config_path = app.config.config_file.resolve()
+        self.running = False
+
+    def serve(self):
+        try:
+            if send_request({"command": "ping"}, self.path):
+                ui.print(f"A lifelog daemon is already listening on {self.path}")
+                return
+        except DaemonError as e:
+            ui.print(f"A lifelog daemon seems stuck on {self.path}: {e}")
+            return
+
+        if not self._make_private_folder():
+            return
+
+        # Left behind by a daemon that didn't shut down cleanly
+        self.path.unlink(missing_ok=True)
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        # Only this user may talk to the daemon, umask covers the bind race
+        umask = os.umask(0o177)
+        try:
+            server.bind(str(self.path))
+        finally:
+            os.umask(umask)
+
+        server.listen()
+        self.running = True
+
+        signal.signal(signal.SIGTERM, lambda *_: self._shutdown(server))
+
+        logger.info("Daemon listening on %s", self.path)
+        ui.print(f"lifelog daemon listening on {self.path}")
+
+        try:
+            while self.running:
+                try:
+                    connection, _ = server.accept()
+                except OSError:
+                    # The socket was closed by a stop request or SIGTERM
+                    break
+
+                with connection:
+                    self._handle(connection, server)
+
+        except KeyboardInterrupt:
+            pass
+
+        finally:
+            server.close()
+            self.path.unlink(missing_ok=True)
+            logger.info("Daemon stopped")
+
+    @staticmethod
+    def stop(path=None):
+        try:
+            if send_request({"command": "stop"}, path) is None:
+                ui.print("No lifelog daemon is running")
+                return
+        except DaemonError as e:
+            ui.print(f"Could not stop the lifelog daemon: {e}")
+            return
+
+        ui.print("Stopped the lifelog daemon")
+
+    def _make_private_folder(self) -> bool:
+        folder = self.path.parent
+
+        try:
+            folder.mkdir(mode=0o700, exist_ok=True)
+            info = folder.stat()
+        except OSError as e:
+            logger.error("Could not create socket folder %s: %s", folder, e)
+            ui.print(f"Could not create {folder}: {e}")
+            return False
+
+        # Anyone else who can write to it could put their own socket there
+        if info.st_uid != os.getuid() or info.st_mode & 0o022:
+            logger.error("Socket folder %s is not private to this user", folder)
+            ui.print(
+                f"Not serving from {folder}, it must belong to you and only be "
+                "writable by you"
+            )
+            return False
+
+        return True
+
+    def _shutdown(self, server):
+        self.running = False
+        server.close()
+
+    def _handle(self, connection, server):
+        data = b""
+        while chunk := connection.recv(65536):
+            data += chunk
+
+        try:
+            request = decode(data)
+            response = self._dispatch(request, server)
+        except Exception as e:
+            logger.exception("Failed to handle daemon request")
+            response = {"status": 1, "stdout": "", "stderr": f"lifelog daemon: {e}\n"}
+
+        try:
+            connection.sendall(encode(response))
+        except OSError as e:
+            logger.warning("Client went away before the response was sent: %s", e)
+
+    def _dispatch(self, request, server):
+        match request.get("command"):
+            case "ping":
+                return {"status": 0}
+
+            case "stop":
+                self._shutdown(server)
+                return {"status": 0}
+
+            case "run":
+                return self._run(request["argv"], request["cwd"])
+
+        raise ValueError(f"Unknown daemon command {request.get('command')!r}")
+
+    def _run(self, argv, cwd):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        status = 0
+
+        # Relative paths (import sources, export destinations) are the client's
+        os.chdir(cwd)
+
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                args = parse_args(argv)
+
+                if runs_in_client(args) or not self._same_config(args):
+                    return {"fallback": True}
+
+                logger.info("Running %s for client in %s", argv, cwd)
+                self.app.args = args
+                self.app.run()
+
+            except SystemExit as e:
+                # argparse errors, --help and --version
+                status = e.code if isinstance(e.code, int) else 1
+
+        return {
+            "status": status,
+            "stdout": stdout.getvalue(),
+            "stderr": stderr.getvalue(),
+        }
+
+    def _same_config(self, args):
+        if args.config_file is None or self.config_file is None:
+            return args.config_file == self.config_file
+
+        return Path(args.config_file).resolve() == self.config_path
+
+
+def runs_in_client(args):
+    # The menu, the editor, stdin streams and the daemon itself run in the
+    # client's process, and so do profiles, which should include startup.
+    # Long commands too, the daemon would make every capture wait for them.
+    if (
+        args.command in LONG_COMMANDS
+        or args.read_entries
+        or args.new
+        or args.message == "-"
+        or args.command == "daemon"
+        or args.profile
+    ):
+        return True
+
+    return not (
+        args.message
+        or args.search
+        or args.command
+        or args.since
+        or args.until
+        or args.tag
+    )
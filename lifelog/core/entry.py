@@ -1,27 +1,54 @@
+import importlib.util
 import logging
 import tempfile
-import json
 
 from datetime import datetime
 from pathlib import Path
 
-from lifelog.cli.editor import Editor
-from lifelog.cli.menu import prompt_selection
 from lifelog.cli.interface import ui
+from lifelog.core.constants import (
+    DEFAULT_FOOTER_RELATED,
+    DEFAULT_RELATED_LIMIT,
+    PREVIEW_LENGTH,
+)
 
 logger = logging.getLogger(__name__)
 
+# Shown below an entry opened in the editor and cut off again when it's saved
+FOOTER_START = "<!-- lifelog: nothing from here on is saved"
+FOOTER_END = "-->"
+
 
 class EntryHandler:
     def __init__(self, config, storage):
         self.config = config
         self.storage = storage
+        self._related = None
         # self.entries = entries
 
     @property
     def entries(self):
         pass
 
+    @property
+    def related(self):
+        # Kept for the session, a daemon or the menu reuse the loaded index
+        if self._related is None:
+            from lifelog.core.related import RelatedEntries
+
+            self._related = RelatedEntries(self.storage)
+
+        return self._related
+
+    @property
+    def related_limit(self):
+        # Only a nicety below the entry: without NumPy it's left out quietly,
+        # before anything is read for it
+        if importlib.util.find_spec("numpy") is None:
+            return 0
+
+        return int(self.config.settings.get("related_entries", DEFAULT_FOOTER_RELATED))
+
     def create_entry_from_string(self, body):
         entry = Entry(
             timestamp=datetime.now(),
@@ -30,7 +57,7 @@ class EntryHandler:
         )
 
         logger.info(
-            f"Created entry: {json.dumps({'body': entry.body, 'timestamp': str(entry.timestamp)})}"
+            "Created entry at %s (%d characters)", entry.timestamp, len(entry.body)
         )
 
         ui.print(f"Created entry: {entry}")
@@ -38,6 +65,8 @@ class EntryHandler:
         self.storage.add_entry(entry)
 
     def create_entry_from_editor(self):
+        from lifelog.cli.editor import Editor
+
         editor = Editor(self.config.settings["editor"])
 
         with tempfile.NamedTemporaryFile(
@@ -54,9 +83,7 @@ class EntryHandler:
                 storage_type=self.storage.type,
             )
 
-            logger.info(
-                f"User wrote: {json.dumps({'body': entry.body, 'timestamp': str(entry.timestamp)})}"
-            )
+            logger.info("User wrote %d characters", len(entry.body))
 
             if entry.body != "":
                 logger.info("Adding entry...")
@@ -68,54 +95,127 @@ class EntryHandler:
                 temp_path.unlink()
 
     def open_entry_in_editor(self, entry):
+        from lifelog.cli.editor import Editor
+
         editor = Editor(self.config.settings["editor"])
 
+        # Listings only carry headers, fetch the full body now it's needed
+        if isinstance(entry, EntryHeader):
+            entry = self.storage.get_entry(entry.uid)
+
         if entry is None:
             logger.warning("Failed to find entry to open in editor")
+            return
+
+        footer = []
+        if attachments := self.storage.get_entry_attachments(entry.uid):
+            footer.append("Attachments (`lifelog attachment HANDLE` saves one):")
+            footer.extend(f"  {attachment}" for attachment in attachments)
+
+        if self.related_limit and (
+            related := self.related.find(entry.uid, self.related_limit)
+        ):
+            from lifelog.core.related import format_related
+
+            if footer:
+                footer.append("")
+            footer.append("Related entries:")
+            footer.extend(f"  {format_related(found)}" for found, _ in related)
 
         with tempfile.NamedTemporaryFile(mode="w", delete=False) as tf:
             temp_path = Path(tf.name)
 
-            tf.write(entry.body)
+            tf.write(add_footer(entry.body, footer))
 
         try:
             editor.open(temp_path)
 
             new_entry = Entry(
                 timestamp=datetime.now(),
-                body=temp_path.read_text(encoding="utf-8"),
+                body=strip_footer(temp_path.read_text(encoding="utf-8")),
                 storage_type=self.storage.type,
             )
 
-            if new_entry != entry:
+            # Storage spots an unchanged body itself and skips the write
+            if self.storage.update_entry(entry, new_entry):
                 logger.info(
-                    f"User updated entry: {json.dumps({'body': new_entry.body, 'timestamp': str(new_entry.timestamp)})}"
+                    "User updated entry %s (%d characters)",
+                    entry.uid,
+                    len(new_entry.body),
                 )
 
-                self.storage.update_entry(entry, new_entry)
-
         finally:
             if temp_path.exists():
                 temp_path.unlink()
 
-    def select_and_open_entry(self):
-        entries = self.storage.get_entries()
+    def print_entries(self, since=None, until=None, tag=None):
+        found = False
+
+        for entry in self.storage.iter_entries(since=since, until=until, tag=tag):
+            found = True
+            ui.print(f"{entry} (#{entry.uid})\n{entry.body.strip()}\n")
+
+        if not found:
+            ui.print("No entries found")
+
+    def search_entries(self, query, since=None, until=None, tag=None):
+        results = self.storage.search_entries(query, since=since, until=until, tag=tag)
+
+        if not results:
+            ui.print(f"No entries found matching '{query}'")
+            return
+
+        for entry, snippet in results:
+            ui.print(f"{entry} (#{entry.uid}): {' '.join(snippet.split())}")
+
+    def show_related_entries(self, uid):
+        # Its own, longer list: the footer's limit is kept short for the editor
+        self.related.show(uid, DEFAULT_RELATED_LIMIT)
+
+    def select_and_open_entry(self, since=None, until=None, tag=None):
+        from lifelog.cli.menu import prompt_selection
 
         selected_entry = prompt_selection(
-            entries,
+            lambda page_size: self.storage.iter_entry_headers(
+                page_size, since=since, until=until, tag=tag
+            ),
             title="Select entry to view: ",
+            page_size=self.storage.page_size,
+            search=lambda words: self.storage.iter_entry_headers_matching(
+                words, since=since, until=until, tag=tag
+            ),
         )
 
         if not selected_entry:
             logger.warning("No entry was selected / Unable to find the selected entry")
             return
 
-        logger.info(f"Chose entry: {selected_entry}")
+        logger.info("Chose entry: %s", selected_entry)
 
         self.open_entry_in_editor(selected_entry)
 
 
+class EntryHeader:
+    # Listings can hold a lot of these, so keep them small: no __dict__ and
+    # only a short preview instead of the body.
+    __slots__ = ("uid", "timestamp", "preview", "storage_type")
+
+    def __init__(self, uid, timestamp, preview, storage_type=None):
+        self.uid = uid
+        self.timestamp = timestamp
+        self.preview = preview
+        self.storage_type = storage_type
+
+    def __str__(self):
+        if not self.preview:
+            return str(self.timestamp)
+
+        return f"{self.timestamp}  {self.preview}"
+
+
 class Entry:
+    __slots__ = ("_timestamp", "_body", "_storage_type", "_uid")
+
     def __init__(self, body, timestamp, storage_type=None, uid=None):
         self.timestamp = timestamp
         self.body = body
@@ -170,3 +270,28 @@ class Entry:
             return False
 
         return self.body == other.body
+
+
+def make_preview(text, length=PREVIEW_LENGTH):
+    preview = " ".join(text.split())
+
+    if len(preview) > length:
+        preview = preview[: length - 1].rstrip() + "…"
+
+    return preview
+
+
+def add_footer(body, lines):
+    if not lines:
+        return body
+
+    return "\n".join([body, "", FOOTER_START, *lines, FOOTER_END, ""])
+
+
+def strip_footer(text):
+    position = text.rfind(FOOTER_START)
+    if position < 0:
+        return text
+
+    # Drop the blank line add_footer() put in between too
+    return text[:position].removesuffix("\n\n")
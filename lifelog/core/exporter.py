@@ -0,0 +1,241 @@
+import gzip
+import json
+import logging
+import os
+import tarfile
+import time
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby, islice
+from pathlib import Path
+
+from lifelog.cli.interface import ui
+from lifelog.core.constants import ATTACHMENTS_MARKER
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = 1000
+PROGRESS_INTERVAL = 10_000
+GZIP_LEVEL = 6
+
+# Marks the end of a tar archive
+TAR_END = b"\0" * tarfile.BLOCKSIZE * 2
+
+
+class Exporter:
+    """Streams entries from storage into JSONL, a Markdown tree or a tarball.
+
+    Entries are read page by page and cut into chunks that a thread pool
+    renders (and compresses), while this thread writes finished chunks in
+    order. At most a few chunks per worker are in flight, so memory stays
+    flat whatever the size of the diary. zlib and file writes release the
+    GIL, which is where the time goes for large exports.
+    """
+
+    def __init__(self, storage, workers=None):
+        self.storage = storage
+        self.workers = workers or min(8, os.cpu_count() or 1)
+
+    def run(self, destination, fmt="auto", since=None, until=None, tag=None):
+        destination = Path(destination).expanduser()
+        fmt = guess_format(destination) if fmt == "auto" else fmt
+        self.since, self.until, self.tag = since, until, tag
+
+        started = time.perf_counter()
+        exported = 0
+
+        writers = {
+            "jsonl": self._export_jsonl,
+            "markdown": self._export_markdown,
+            "tar": self._export_tar,
+        }
+
+        for count in writers[fmt](destination):
+            if (exported + count) // PROGRESS_INTERVAL > exported // PROGRESS_INTERVAL:
+                ui.print(f"Exported {exported + count} entries")
+            exported += count
+
+        elapsed = time.perf_counter() - started
+        logger.info(
+            "Exported %s entries to %s as %s in %.2fs",
+            exported,
+            destination,
+            fmt,
+            elapsed,
+        )
+        ui.print(
+            f"Done: exported {exported} entries to {destination} in {elapsed:.2f}s"
+        )
+
+        return exported
+
+    def _map_ordered(self, render, chunks):
+        # Like Executor.map, but without submitting every chunk up front
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = deque()
+
+            for chunk in chunks:
+                pending.append(pool.submit(render, chunk))
+
+                if len(pending) >= self.workers * 2:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+
+    def _export_jsonl(self, destination):
+        compress = destination.suffix == ".gz"
+
+        def render(item):
+            chunk, attachments = item
+            data = "".join(
+                render_jsonl(entry, attachments.get(entry.uid)) for entry in chunk
+            ).encode("utf-8")
+            # Concatenated gzip members are still one valid gzip stream
+            return len(chunk), gzip.compress(data, GZIP_LEVEL) if compress else data
+
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        with open(destination, "wb") as f:
+            for count, data in self._map_ordered(render, self._iter_chunks()):
+                f.write(data)
+                yield count
+
+    def _export_markdown(self, destination):
+        def render(day):
+            date, entries, attachments = day
+            return (
+                date,
+                len(entries),
+                render_markdown(entries, attachments).encode("utf-8"),
+            )
+
+        for date, count, data in self._map_ordered(render, self._iter_days()):
+            path = destination / day_path(date)
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+            with open(path, "wb") as f:
+                f.write(data)
+
+            yield count
+
+    def _export_tar(self, destination):
+        mtime = int(time.time())
+
+        def render(item):
+            name, day_entries, attachments = item
+            data = render_markdown(day_entries, attachments).encode("utf-8")
+
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = mtime
+            info.mode = 0o644
+
+            padding = -len(data) % tarfile.BLOCKSIZE
+            member = info.tobuf(tarfile.PAX_FORMAT) + data + b"\0" * padding
+            return len(day_entries), gzip.compress(member, GZIP_LEVEL)
+
+        def named_days():
+            for date, day_entries, attachments in self._iter_days():
+                name = str(Path(destination.name.split(".")[0]) / day_path(date))
+                yield name, day_entries, attachments
+
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        with open(destination, "wb") as f:
+            for count, data in self._map_ordered(render, named_days()):
+                f.write(data)
+                yield count
+
+            f.write(gzip.compress(TAR_END, GZIP_LEVEL))
+
+    def _iter_chunks(self):
+        # Entries refer to their attachments by handle, payloads stay put.
+        # Looked up a chunk at a time, like the entries are read.
+        entries = self.storage.iter_entries(
+            since=self.since, until=self.until, tag=self.tag
+        )
+
+        for chunk in iter_chunks(entries, EXPORT_CHUNK_SIZE):
+            yield chunk, self.storage.get_attachments(chunk)
+
+    def _iter_days(self):
+        # Storage yields entries by timestamp, newest first, so each day
+        # arrives in one piece and only one day is held in memory at a time.
+        entries = (
+            (entry, attachments)
+            for chunk, attachments in self._iter_chunks()
+            for entry in chunk
+        )
+
+        for date, day in groupby(entries, key=lambda item: item[0].date):
+            day = list(day)[::-1]
+            yield (
+                date,
+                [entry for entry, _ in day],
+                {
+                    entry.uid: attachments[entry.uid]
+                    for entry, attachments in day
+                    if entry.uid in attachments
+                },
+            )
+
+
+def guess_format(destination):
+    name = destination.name.lower()
+
+    if name.endswith((".tar.gz", ".tgz")):
+        return "tar"
+
+    if name.endswith((".jsonl", ".jsonl.gz", ".ndjson")):
+        return "jsonl"
+
+    return "markdown"
+
+
+def iter_chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def day_path(date):
+    return Path(f"{date:%Y}") / f"{date:%m}" / f"{date:%Y-%m-%d}.md"
+
+
+def render_jsonl(entry, attachments=None):
+    record = {
+        "uid": entry.uid,
+        "timestamp": entry.timestamp.isoformat(),
+        "body": entry.body,
+    }
+
+    if attachments:
+        record["attachments"] = [
+            {
+                "handle": attachment.handle,
+                "name": attachment.name,
+                "mime_type": attachment.mime_type,
+                "size": attachment.size,
+            }
+            for attachment in attachments
+        ]
+
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def render_markdown(entries, attachments=None):
+    # Headings carry the full date so `lifelog import` can read the tree back,
+    # and the marker tells it the attachment list isn't part of the body
+    parts = []
+
+    for entry in entries:
+        parts.append(
+            f"## {entry.timestamp:%Y-%m-%d %H:%M:%S}\n\n{entry.body.strip()}\n\n"
+        )
+
+        if linked := (attachments or {}).get(entry.uid):
+            parts.append(f"{ATTACHMENTS_MARKER}\n")
+            parts.extend(f"- Attachment: {attachment}\n" for attachment in linked)
+            parts.append("\n")
+
+    return "".join(parts)
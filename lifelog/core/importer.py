@@ -0,0 +1,268 @@
+import json
+import logging
+import re
+import time
+
+from datetime import datetime
+from pathlib import Path
+
+from lifelog.cli.interface import ui
+from lifelog.core.constants import ATTACHMENTS_MARKER, DEFAULT_IMPORT_BATCH_SIZE
+from lifelog.core.entry import Entry
+
+logger = logging.getLogger(__name__)
+
+FORMAT_SUFFIXES = {
+    "markdown": (".md", ".markdown"),
+    "text": (".txt", ".text"),
+    "jsonl": (".jsonl", ".ndjson"),
+}
+
+BODY_KEYS = ("body", "text", "content", "message")
+TIMESTAMP_KEYS = ("timestamp", "date", "created_at", "created", "time")
+
+# Matches "2024-03-01", "2024-03-01 08:15", "2024-03-01T08:15:30", "20240301"
+# and friends, both in file names and in section headings.
+DATE_PATTERN = re.compile(
+    r"(?P<year>\d{4})-?(?P<month>\d{2})-?(?P<day>\d{2})"
+    r"(?:[T _.-]?(?P<hour>\d{2})[:.-]?(?P<minute>\d{2})(?:[:.-]?(?P<second>\d{2}))?)?"
+)
+HEADING_PATTERN = re.compile(r"^#*\s*" + DATE_PATTERN.pattern + r"\s*$")
+
+MAX_LOGGED_INVALID_RECORDS = 10
+
+
+class Importer:
+    def __init__(self, storage, batch_size=DEFAULT_IMPORT_BATCH_SIZE):
+        self.storage = storage
+        self.batch_size = batch_size
+
+    def run(self, sources, fmt="auto"):
+        progress = self.storage.get_import_progress()
+
+        batch = []
+        checkpoints = {}
+        imported = 0
+        files = 0
+        skipped = 0
+        started = time.perf_counter()
+
+        def flush():
+            nonlocal imported
+
+            if not batch and not checkpoints:
+                return
+
+            self.storage.add_entries(batch, checkpoints=list(checkpoints.values()))
+            imported += len(batch)
+
+            rate = imported / max(time.perf_counter() - started, 1e-9)
+            ui.print(
+                f"Imported {imported} entries from {files} files ({rate:,.0f} entries/s)"
+            )
+
+            batch.clear()
+            checkpoints.clear()
+
+        try:
+            for path, path_format in iter_source_files(sources, fmt):
+                key = str(path.resolve())
+                stat = path.stat()
+                done, completed, size, mtime_ns = progress.get(
+                    key, (0, False, None, None)
+                )
+
+                if completed and (size, mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+                    skipped += 1
+                    continue
+
+                files += 1
+                position = done
+
+                for position, timestamp, body in PARSERS[path_format](path):
+                    if position <= done:
+                        continue
+
+                    batch.append(
+                        Entry(
+                            body=body,
+                            timestamp=timestamp,
+                            storage_type=self.storage.type,
+                        )
+                    )
+                    checkpoints[key] = (key, position, False, None, None)
+
+                    if len(batch) >= self.batch_size:
+                        flush()
+
+                checkpoints[key] = (key, position, True, stat.st_size, stat.st_mtime_ns)
+
+            flush()
+
+        except KeyboardInterrupt:
+            logger.warning("Import interrupted after %s entries", imported)
+            ui.print(
+                f"Import interrupted after {imported} entries. "
+                "Run the same command again to resume."
+            )
+            return imported
+
+        elapsed = time.perf_counter() - started
+        logger.info(
+            "Imported %s entries from %s files in %.2fs, skipped %s unchanged files",
+            imported,
+            files,
+            elapsed,
+            skipped,
+        )
+        ui.print(
+            f"Done: imported {imported} entries from {files} files in {elapsed:.2f}s"
+            + (f" ({skipped} unchanged files skipped)" if skipped else "")
+        )
+
+        return imported
+
+
+def iter_source_files(sources, fmt="auto"):
+    suffixes = {
+        suffix: name
+        for name, name_suffixes in FORMAT_SUFFIXES.items()
+        for suffix in name_suffixes
+    }
+
+    for source in sources:
+        source = Path(source).expanduser()
+
+        if not source.exists():
+            raise FileNotFoundError(f"Import source {source} does not exist")
+
+        if source.is_file():
+            yield (
+                source,
+                fmt if fmt != "auto" else suffixes.get(source.suffix.lower(), "text"),
+            )
+            continue
+
+        # Sorted so an interrupted import walks the files in the same order
+        for path in sorted(source.rglob("*")):
+            if not path.is_file() or any(
+                part.startswith(".") for part in path.relative_to(source).parts
+            ):
+                continue
+
+            path_format = suffixes.get(path.suffix.lower())
+            if path_format is None or fmt not in ("auto", path_format):
+                continue
+
+            yield path, path_format
+
+
+def parse_jsonl(path):
+    modified = datetime.fromtimestamp(path.stat().st_mtime)
+    invalid = 0
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+
+            try:
+                record = json.loads(line)
+                body = next(record[key] for key in BODY_KEYS if key in record)
+                raw_timestamp = next(
+                    (record[key] for key in TIMESTAMP_KEYS if key in record), None
+                )
+                timestamp = parse_timestamp(raw_timestamp)
+
+            except (ValueError, TypeError, StopIteration) as e:
+                # Exports can have lots of these, so only log the first few
+                invalid += 1
+                if invalid <= MAX_LOGGED_INVALID_RECORDS:
+                    logger.debug(
+                        "Skipping invalid record %s:%s: %s", path, line_number, e
+                    )
+                continue
+
+            yield line_number, timestamp or modified, str(body)
+
+    if invalid:
+        logger.warning("Skipped %d invalid records in %s", invalid, path)
+
+
+def parse_dated_text(path):
+    # A file is either a single entry dated by its name (or mtime), or a
+    # journal with one section per date heading ("## 2024-03-01 08:15").
+    fallback = date_from_match(DATE_PATTERN.search(path.stem))
+    if fallback is None:
+        fallback = datetime.fromtimestamp(path.stat().st_mtime)
+
+    position = 0
+    timestamp = fallback
+    lines = []
+    # An export's attachment list, up to the next heading
+    in_attachments = False
+
+    def make_record():
+        body = "".join(lines).strip("\n")
+        if body.strip():
+            return timestamp, body
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            heading = HEADING_PATTERN.match(line.strip())
+            heading_date = date_from_match(heading)
+
+            if heading_date is None:
+                if line.strip() == ATTACHMENTS_MARKER:
+                    in_attachments = True
+                elif not in_attachments:
+                    lines.append(line)
+                continue
+
+            if record := make_record():
+                position += 1
+                yield position, *record
+
+            timestamp = heading_date
+            lines = []
+            in_attachments = False
+
+    if record := make_record():
+        position += 1
+        yield position, *record
+
+
+def parse_timestamp(value):
+    if value is None or value == "":
+        return None
+
+    if isinstance(value, (int, float)):
+        # Exports use both seconds and milliseconds since the epoch
+        return datetime.fromtimestamp(value / 1000 if value > 1e11 else value)
+
+    timestamp = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+
+    # Entries are stored in naive local time, like datetime.now()
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+
+    return timestamp
+
+
+def date_from_match(match):
+    if match is None:
+        return None
+
+    parts = {key: int(value) for key, value in match.groupdict().items() if value}
+
+    try:
+        return datetime(**parts)
+    except ValueError:
+        return None
+
+
+PARSERS = {
+    "markdown": parse_dated_text,
+    "text": parse_dated_text,
+    "jsonl": parse_jsonl,
+}
@@ -0,0 +1,154 @@
+import logging
+import queue
+import threading
+import time
+
+from datetime import datetime
+
+from lifelog.cli.interface import ui
+from lifelog.core.constants import (
+    DEFAULT_INGEST_BATCH_SIZE,
+    DEFAULT_INGEST_FLUSH_INTERVAL,
+)
+from lifelog.core.entry import Entry
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 64 * 1024
+# Chunks the reader may get ahead of the writer before it blocks
+MAX_PENDING_CHUNKS = 64
+
+
+class StreamIngester:
+    """Writes entries read from a stream, group-committed in batches.
+
+    A reader thread splits the stream into records and stamps them with the
+    time they arrived; this thread writes them with storage.add_entries once
+    batch_size records are pending or the oldest one has waited
+    flush_interval seconds, whichever comes first.
+    """
+
+    def __init__(self, storage, batch_size=None, flush_interval=None):
+        self.storage = storage
+        self.batch_size = batch_size or DEFAULT_INGEST_BATCH_SIZE
+        self.flush_interval = (
+            DEFAULT_INGEST_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        )
+
+    def run(self, stream, separator="\n"):
+        chunks = queue.Queue(MAX_PENDING_CHUNKS)
+        reader = threading.Thread(
+            target=read_records,
+            args=(stream, separator.encode("utf-8"), chunks),
+            name="lifelog-ingest-reader",
+            daemon=True,
+        )
+
+        batch = []
+        written = 0
+        deadline = None
+        started = time.perf_counter()
+
+        def flush():
+            nonlocal written
+
+            if not batch:
+                return
+
+            self.storage.add_entries(batch)
+            written += len(batch)
+            logger.debug("Committed %s streamed entries", len(batch))
+            batch.clear()
+
+        reader.start()
+
+        try:
+            while True:
+                timeout = None
+                if batch:
+                    timeout = max(deadline - time.monotonic(), 0)
+
+                try:
+                    chunk = chunks.get(timeout=timeout)
+                except queue.Empty:
+                    flush()
+                    continue
+
+                if chunk is None:
+                    break
+
+                if isinstance(chunk, Exception):
+                    raise chunk
+
+                timestamp, bodies = chunk
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+
+                batch.extend(
+                    Entry(
+                        body=body, timestamp=timestamp, storage_type=self.storage.type
+                    )
+                    for body in bodies
+                )
+
+                if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                    flush()
+
+            flush()
+
+        except KeyboardInterrupt:
+            flush()
+            logger.warning("Stream ingestion interrupted after %s entries", written)
+
+        elapsed = time.perf_counter() - started
+        logger.info("Wrote %s streamed entries in %.2fs", written, elapsed)
+        ui.print(
+            f"Done: wrote {written} entries in {elapsed:.2f}s "
+            f"({written / max(elapsed, 1e-9):,.0f} entries/s)"
+        )
+
+        return written
+
+
+def read_records(stream, separator, chunks):
+    """Splits a binary stream on `separator` and queues (timestamp, bodies).
+
+    read1 returns whatever the pipe has, so records are passed on as soon as
+    they arrive instead of after a full buffer. Ends with None, or with the
+    exception that stopped the reader.
+    """
+    # A long record arrives over many reads: only the new data (and the
+    # tail a separator may straddle) is searched, so it is scanned once
+    pending = bytearray()
+
+    try:
+        read = getattr(stream, "read1", stream.read)
+
+        while data := read(READ_SIZE):
+            start = max(len(pending) - len(separator) + 1, 0)
+            pending += data
+
+            end = pending.rfind(separator, start)
+            if end < 0:
+                continue
+
+            records = pending[:end].split(separator)
+            del pending[: end + len(separator)]
+
+            if bodies := decode_records(records):
+                chunks.put((datetime.now(), bodies))
+
+        if bodies := decode_records([pending]):
+            chunks.put((datetime.now(), bodies))
+
+        chunks.put(None)
+
+    except Exception as e:
+        logger.exception("Failed to read entries from the stream")
+        chunks.put(e)
+
+
+def decode_records(records):
+    # A UTF-8 separator never splits a character, so records decode alone
+    bodies = (record.decode("utf-8", errors="replace").strip() for record in records)
+    return [body for body in bodies if body]
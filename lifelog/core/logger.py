@@ -1,8 +1,63 @@
+import atexit
+import copy
 import logging
+import queue
+
+from datetime import date, datetime
 from pathlib import Path
 
+DEFAULT_FILE_LEVEL = "info"
+
+_file_handler = None
+_console_handler = None
+
+
+# Log args of these types can't change before the listener formats them
+IMMUTABLE_ARG_TYPES = frozenset(
+    {str, int, float, bool, bytes, type(None), date, datetime}
+)
+
+_exception_formatter = logging.Formatter()
+
+
+def _prepare_record(record):
+    # QueueHandler.prepare formats the message in the calling thread. This
+    # leaves it to the listener when the args are plain values, so a log call
+    # on a hot path only costs building the record. Anything else (a list
+    # that keeps changing, say) is formatted now, and tracebacks are rendered
+    # here rather than handed to another thread.
+    deferrable = not record.args or (
+        isinstance(record.args, tuple)
+        and all(type(arg) in IMMUTABLE_ARG_TYPES for arg in record.args)
+    )
+
+    if deferrable and not record.exc_info:
+        return record
+
+    # The console handler sees the same record, change a copy
+    record = copy.copy(record)
+
+    if not deferrable:
+        record.msg = record.getMessage()
+        record.args = None
+
+    if record.exc_info:
+        record.exc_text = _exception_formatter.formatException(record.exc_info)
+        record.exc_info = None
+
+    return record
+
+
+def setup_logging(verbose: bool, file_level: str = DEFAULT_FILE_LEVEL):
+    global _file_handler, _console_handler
+
+    # Pulls in socket and pickle, so not at import time
+    from logging.handlers import QueueHandler, QueueListener
+
+    class DeferredQueueHandler(QueueHandler):
+        def prepare(self, record):
+            return _prepare_record(record)
 
-def setup_logging(verbose: bool):
     # 1. Determine the path: ~/git/repo-name/logs/app.log
     # Path(__file__) gets the location of logger.py
     project_root = Path(__file__).parent.parent
@@ -16,18 +71,34 @@ def setup_logging(verbose: bool):
     file_format = logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
     shell_format = logging.Formatter("%(levelname)s: %(message)s")
 
-    # 3. Setup the Root Logger
-    root_logger = logging.getLogger()
-    root_logger.setLevel(logging.DEBUG)  # Catch everything
+    # 3. File Handler, written by a background thread fed through a queue
+    _file_handler = logging.FileHandler(log_filepath, mode="w")
+    _file_handler.setFormatter(file_format)
 
-    # 4. File Handler (Always DEBUG)
-    f_handler = logging.FileHandler(log_filepath, mode="w")
-    f_handler.setLevel(logging.DEBUG)
-    f_handler.setFormatter(file_format)
-    root_logger.addHandler(f_handler)
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, _file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    # 4. Setup the Root Logger
+    root_logger = logging.getLogger()
+    root_logger.addHandler(DeferredQueueHandler(log_queue))
 
     # 5. Console Handler (Level based on --verbose)
-    c_handler = logging.StreamHandler()
-    c_handler.setLevel(logging.ERROR)
-    c_handler.setFormatter(shell_format)
-    root_logger.addHandler(c_handler)
+    _console_handler = logging.StreamHandler()
+    _console_handler.setLevel(logging.INFO if verbose else logging.ERROR)
+    _console_handler.setFormatter(shell_format)
+    root_logger.addHandler(_console_handler)
+
+    set_file_log_level(file_level)
+
+
+def set_file_log_level(level: str):
+    # The root logger only lets through what the handlers want to see, so
+    # calls below that level return before a record is even created.
+    numeric_level = logging.getLevelName(str(level).upper())
+    if not isinstance(numeric_level, int):
+        raise ValueError(f"Invalid log level '{level}'")
+
+    _file_handler.setLevel(numeric_level)
+    logging.getLogger().setLevel(min(numeric_level, _console_handler.level))
@@ -0,0 +1,174 @@
+"""Timing spans for `lifelog --profile`.
+
+span(name) is a no-op returning a shared null context until enable() is
+called, so the instrumented code paths cost one global lookup when
+profiling is off. Storage methods are only wrapped once enabled, see
+Storage.instrument().
+"""
+
+import logging
+import sys
+import threading
+import time
+
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)
+
+_DISABLED = nullcontext()
+_profiler = None
+
+
+def span(name):
+    if _profiler is None:
+        return _DISABLED
+
+    return _profiler.span(name)
+
+
+def enabled():
+    return _profiler is not None
+
+
+def current():
+    return _profiler
+
+
+def enable(output=None):
+    """Starts recording spans, and cProfile too when `output` isn't a .json trace."""
+    global _profiler
+
+    _profiler = Profiler(output)
+    return _profiler
+
+
+def finish():
+    global _profiler
+
+    if _profiler is not None:
+        _profiler.finish()
+        _profiler = None
+
+
+class Profiler:
+    def __init__(self, output=None):
+        self.output = output
+        self.spans = []  # (name, start_ns, duration_ns, thread id)
+        self.started = time.perf_counter_ns()
+        self._cprofile = None
+
+        if output and not str(output).endswith(".json"):
+            import cProfile
+
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter_ns()
+
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter_ns() - start)
+
+    def record(self, name, start, duration):
+        self.spans.append((name, start, duration, threading.get_ident()))
+
+    def timed_iterator(self, name, iterator):
+        # Lazy results are timed while they are consumed, one span for all of
+        # it, measured from the first row to the last
+        start = None
+        busy = 0
+
+        try:
+            while True:
+                pulled = time.perf_counter_ns()
+                start = start or pulled
+
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    busy += time.perf_counter_ns() - pulled
+
+                yield item
+        finally:
+            if start is not None:
+                self.record(name, start, busy)
+
+    def finish(self):
+        elapsed = time.perf_counter_ns() - self.started
+
+        if self._cprofile is not None:
+            self._cprofile.disable()
+
+        print_summary(self.summary(), elapsed)
+
+        if self.output is None:
+            return
+
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(self.output)
+        else:
+            self.write_trace(self.output)
+
+        logger.info("Wrote profile to %s", self.output)
+        print(f"Wrote profile to {self.output}", file=sys.stderr)
+
+    def summary(self):
+        """Returns (name, calls, total_ns, max_ns) per span name, slowest first."""
+        totals = defaultdict(lambda: [0, 0, 0])
+
+        for name, _, duration, _ in self.spans:
+            total = totals[name]
+            total[0] += 1
+            total[1] += duration
+            total[2] = max(total[2], duration)
+
+        return sorted(
+            ((name, *total) for name, total in totals.items()),
+            key=lambda row: row[2],
+            reverse=True,
+        )
+
+    def write_trace(self, path):
+        import json
+
+        # Chrome's trace event format, opens in chrome://tracing and Perfetto
+        events = [
+            {
+                "name": name,
+                "cat": name.split(".", 1)[0],
+                "ph": "X",
+                "ts": (start - self.started) / 1000,
+                "dur": duration / 1000,
+                "pid": 1,
+                "tid": thread,
+            }
+            for name, start, duration, thread in self.spans
+        ]
+
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def print_summary(rows, elapsed):
+    # stderr, so a profiled command's output can still be piped
+    width = max([len(row[0]) for row in rows] + [len("span")])
+    lines = [
+        f"{'span':<{width}}  {'calls':>7}  {'total ms':>10}  {'mean ms':>9}  "
+        f"{'max ms':>9}  {'%':>5}"
+    ]
+
+    for name, calls, total, longest in rows:
+        lines.append(
+            f"{name:<{width}}  {calls:>7,}  {total / 1e6:>10.2f}  "
+            f"{total / calls / 1e6:>9.3f}  {longest / 1e6:>9.2f}  "
+            f"{100 * total / max(elapsed, 1):>5.1f}"
+        )
+
+    lines.append(f"Total run time {elapsed / 1e6:.2f} ms, spans can nest")
+    print("\n".join(lines), file=sys.stderr)
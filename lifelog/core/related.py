@@ -0,0 +1,259 @@
+"""Related entries, by cosine similarity of TF-IDF vectors.
+
+Entries are turned into bags of words when they are written: every word is
+hashed into one of VECTOR_SIZE buckets and counted (see lifelog.core.vectors),
+and the storage keeps the counts of every entry. IDF weights depend on the whole
+diary, so they are only applied by RelatedIndex, which holds every vector in
+NumPy arrays and scores all entries against one with a single sparse
+matrix-vector product. The arrays and their weights are cached next to the
+database; when entries were written since, only those are read again.
+
+NumPy is optional, without it there are no related entries.
+"""
+
+import json
+import logging
+import os
+
+from lifelog.cli.interface import ui
+from lifelog.core.constants import DEFAULT_RELATED_LIMIT
+from lifelog.core.entry import make_preview
+from lifelog.core.vectors import VECTOR_SIZE
+
+logger = logging.getLogger(__name__)
+
+CACHE_SUFFIX = ".vectors.npz"
+# Rebuild the cache instead of patching it once this share of its rows
+# belongs to entries since edited or moved
+MAX_DEAD_ROWS = 0.25
+
+
+class RelatedIndex:
+    def __init__(self, storage):
+        # Slow to import, and only needed here
+        import numpy
+
+        self.np = numpy
+        self.storage = storage
+        self.cache_path = storage.db_path.with_suffix(CACHE_SUFFIX)
+        self.state = None
+        self.uids = None  # per row, 0 once the entry was edited or moved
+        self.indptr = None
+        self.terms = None
+        self.counts = None
+        self._weights = None
+
+    def related(self, uid, limit=None) -> list:
+        """Returns (uid, similarity) of the entries most like entry `uid`."""
+        np = self.np
+        self._refresh()
+
+        rows = np.flatnonzero(self.uids == uid)
+        if not len(rows) or not len(self.uids):
+            return []
+
+        row = rows[0]
+        weights, row_of = self._weights
+        start, end = self.indptr[row], self.indptr[row + 1]
+
+        query = np.zeros(VECTOR_SIZE, dtype=np.float32)
+        query[self.terms[start:end]] = weights[start:end]
+
+        # The sparse matrix-vector product, in one pass over all terms
+        scores = np.bincount(
+            row_of, weights=weights * query[self.terms], minlength=len(self.uids)
+        )
+        scores[row] = 0
+        scores[self.uids == 0] = 0
+
+        limit = min(limit or DEFAULT_RELATED_LIMIT, len(scores))
+        best = np.argpartition(-scores, limit - 1)[:limit]
+        best = best[np.argsort(-scores[best], kind="stable")]
+
+        return [
+            (int(self.uids[found]), float(scores[found]))
+            for found in best
+            if scores[found] > 0
+        ]
+
+    def _refresh(self):
+        state = self.storage.get_vector_state()
+
+        if state == self.state:
+            return
+
+        if self.state is None:
+            self._load_cache()
+
+            # Saved with their weights, nothing to compute
+            if state == self.state:
+                return
+
+        if not self._update(state):
+            self._build(state)
+
+        self._weights = self._weigh()
+        self._save()
+
+    def _load_cache(self):
+        np = self.np
+
+        try:
+            with np.load(self.cache_path) as cache:
+                self.state = tuple(json.loads(str(cache["state"])))
+                self.uids = cache["uids"]
+                self.indptr = cache["indptr"]
+                self.terms = cache["terms"]
+                self.counts = cache["counts"]
+                weights = cache["weights"]
+
+        except (OSError, KeyError, ValueError) as e:
+            logger.info("No usable vector cache at %s: %s", self.cache_path, e)
+            self.state = None
+            return
+
+        lengths = np.diff(self.indptr)
+        self._weights = weights, np.repeat(np.arange(len(self.uids)), lengths)
+
+    def _update(self, state) -> bool:
+        # Between archive runs the diary mostly gets new or edited entries:
+        # append their new vectors and retire the old rows. Anything else
+        # (deletes, archives, edits of archived entries) means a rebuild.
+        if (
+            self.state is None
+            or self.state[1:] != state[1:]
+            or state[0] < self.state[0]
+        ):
+            return False
+
+        np = self.np
+        uids, lengths, terms, counts = self._read(after=self.state[0])
+        retired = np.isin(self.uids, uids)
+
+        self.uids = np.concatenate([np.where(retired, 0, self.uids), uids])
+        self.indptr = np.concatenate(
+            [self.indptr, self.indptr[-1] + np.cumsum(lengths)]
+        )
+        self.terms = np.concatenate([self.terms, terms])
+        self.counts = np.concatenate([self.counts, counts])
+
+        if np.count_nonzero(self.uids == 0) > MAX_DEAD_ROWS * len(self.uids):
+            return False
+
+        self.state = state
+        logger.info("Added %s entry vectors to the related index", len(uids))
+        return True
+
+    def _build(self, state):
+        np = self.np
+
+        uids, lengths, self.terms, self.counts = self._read()
+        self.uids = uids
+        self.indptr = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        self.state = state
+
+        logger.info("Built the related index from %s entry vectors", len(uids))
+
+    def _read(self, after=None):
+        np = self.np
+        uids, lengths, terms, counts = [], [], [], []
+
+        for uid, packed_terms, packed_counts in self.storage.iter_entry_vectors(after):
+            uids.append(uid)
+            lengths.append(len(packed_terms) // 4)
+            terms.append(packed_terms)
+            counts.append(packed_counts)
+
+        return (
+            np.array(uids, dtype=np.int64),
+            np.array(lengths, dtype=np.int64),
+            np.frombuffer(b"".join(terms), dtype="<u4"),
+            np.frombuffer(b"".join(counts), dtype="<u2"),
+        )
+
+    def _weigh(self):
+        # Sublinear TF times smoothed IDF, every row scaled to unit length so
+        # dot products are cosine similarities
+        np = self.np
+
+        lengths = np.diff(self.indptr)
+        row_of = np.repeat(np.arange(len(self.uids)), lengths)
+        alive = np.repeat(self.uids != 0, lengths)
+
+        documents = np.bincount(self.terms[alive], minlength=VECTOR_SIZE)
+        idf = np.log((1 + np.count_nonzero(self.uids)) / (1 + documents)) + 1
+
+        weights = ((1 + np.log(self.counts)) * idf[self.terms]).astype(np.float32)
+        norms = np.sqrt(
+            np.bincount(row_of, weights=weights * weights, minlength=len(self.uids))
+        )
+        weights /= np.maximum(norms, 1e-12)[row_of]
+
+        return weights, row_of
+
+    def _save(self):
+        partial = self.cache_path.with_name(self.cache_path.name + ".partial")
+
+        try:
+            with open(partial, "wb") as f:
+                self.np.savez(
+                    f,
+                    state=self.np.array(json.dumps(self.state)),
+                    uids=self.uids,
+                    indptr=self.indptr,
+                    terms=self.terms,
+                    counts=self.counts,
+                    weights=self._weights[0],
+                )
+            os.replace(partial, self.cache_path)
+
+        except OSError as e:
+            # Only a cache, the next run reads the vectors again
+            logger.warning("Could not write vector cache %s: %s", self.cache_path, e)
+            partial.unlink(missing_ok=True)
+
+
+class RelatedEntries:
+    def __init__(self, storage):
+        self.storage = storage
+        self._index = None
+
+    def find(self, uid, limit=None) -> list:
+        """Returns (Entry, similarity) pairs, or None when they can't be
+        computed (no NumPy, or a storage without vectors)."""
+        if self.storage.get_vector_state() is None:
+            return None
+
+        if self._index is None:
+            try:
+                self._index = RelatedIndex(self.storage)
+            except ImportError:
+                logger.info("NumPy is not installed, no related entries")
+                return None
+
+        return [
+            (entry, similarity)
+            for found, similarity in self._index.related(uid, limit)
+            if (entry := self.storage.get_entry(found)) is not None
+        ]
+
+    def show(self, uid, limit=None):
+        related = self.find(uid, limit)
+
+        if related is None:
+            ui.print(
+                "Related entries need NumPy (pip install numpy) and "
+                "storage_mode = 'database'"
+            )
+            return
+
+        if not related:
+            ui.print(f"No entries related to #{uid} found")
+            return
+
+        for entry, similarity in related:
+            ui.print(f"{similarity:.2f}  {format_related(entry)}")
+
+
+def format_related(entry):
+    return f"{entry} (#{entry.uid}) {make_preview(entry.body)}"
@@ -0,0 +1,105 @@
+import logging
+
+from datetime import date, timedelta
+
+from lifelog.cli.interface import ui
+from lifelog.core.constants import DEFAULT_STATS_LIMIT
+
+logger = logging.getLogger(__name__)
+
+PERIODS = ("day", "week", "month", "year")
+
+
+def count_words(body):
+    return len(body.split()) if body else 0
+
+
+def day_bounds(since=None, until=None):
+    """Turns a [since, until) datetime range into inclusive first/last days."""
+    first = since.date() if since else None
+    last = (until - timedelta(microseconds=1)).date() if until else None
+    return first, last
+
+
+def period_key(day, period):
+    if period == "day":
+        return day.isoformat()
+    if period == "week":
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    if period == "month":
+        return f"{day:%Y-%m}"
+    return f"{day:%Y}"
+
+
+def find_streaks(days, today=None):
+    """Returns (current, longest) streaks of consecutive days in `days`.
+
+    `days` must be sorted ascending. The current streak still counts when
+    nothing has been written yet today. longest is (length, first, last).
+    """
+    today = today or date.today()
+    longest = (0, None, None)
+    length, first, previous = 0, None, None
+
+    for day in days:
+        if previous is not None and day - previous == timedelta(days=1):
+            length += 1
+        else:
+            length, first = 1, day
+
+        if length > longest[0]:
+            longest = (length, first, day)
+        previous = day
+
+    current = length if previous and today - previous <= timedelta(days=1) else 0
+    return current, longest
+
+
+class StatsReport:
+    def __init__(self, storage):
+        self.storage = storage
+
+    def run(self, period="month", limit=None, since=None, until=None, rebuild=False):
+        limit = limit or DEFAULT_STATS_LIMIT
+
+        if rebuild:
+            ui.print("Rebuilding statistics from entries...")
+            self.storage.rebuild_stats()
+
+        # One row per day written, so this stays small however long the diary
+        daily = self.storage.get_daily_stats(since=since, until=until)
+        if not daily:
+            ui.print("No entries found")
+            return
+
+        entries = sum(count for _, count, _ in daily)
+        words = sum(word_count for _, _, word_count in daily)
+
+        ui.print(
+            f"Entries: {entries:,}  Words: {words:,}  Days written: {len(daily):,}"
+            f"  Words per entry: {words / entries:,.0f}"
+        )
+
+        current, (longest, first, last) = find_streaks([day for day, _, _ in daily])
+        ui.print(
+            f"Current streak: {current} days  "
+            f"Longest streak: {longest} days ({first} to {last})"
+        )
+
+        totals = {}
+        for day, count, word_count in daily:
+            key = period_key(day, period)
+            total = totals.setdefault(key, [0, 0])
+            total[0] += count
+            total[1] += word_count
+
+        ui.print(f"\nPer {period} (last {min(limit, len(totals))}):")
+        for key, (count, word_count) in list(totals.items())[-limit:]:
+            ui.print(f"  {key:<10} {count:>8,} entries {word_count:>10,} words")
+
+        ui.print("\nLongest entries:")
+        for header, word_count in self.storage.get_longest_entries(
+            limit, since=since, until=until
+        ):
+            ui.print(f"  {word_count:>8,} words  {header} (#{header.uid})")
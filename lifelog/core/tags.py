@@ -0,0 +1,56 @@
+import logging
+import re
+
+from lifelog.cli.interface import ui
+from lifelog.core.constants import DEFAULT_TAGS_LIMIT
+
+logger = logging.getLogger(__name__)
+
+# #tag and @person, starting with a letter. Not inside a word, so e-mail
+# addresses, URL fragments and "C#" aren't tags, and a markdown heading has
+# a space after its "#".
+TAG_PATTERN = re.compile(r"(?<![\w#@&])([#@])([^\W\d_][\w-]*)")
+
+
+def extract_tags(body) -> set:
+    """Returns the normalized tags of a body, e.g. {"#health", "@alice"}."""
+    if not body or ("#" not in body and "@" not in body):
+        return set()
+
+    return {
+        sigil + name.rstrip("-").casefold() for sigil, name in TAG_PATTERN.findall(body)
+    }
+
+
+def normalize_tag(tag) -> str:
+    # "health" means "#health", people need their "@"
+    tag = tag.strip()
+
+    if not tag.startswith(("#", "@")):
+        tag = "#" + tag
+
+    if TAG_PATTERN.fullmatch(tag) is None:
+        raise ValueError(f"Invalid tag '{tag}', expected e.g. #health or @alice")
+
+    return tag.rstrip("-").casefold()
+
+
+class TagsReport:
+    def __init__(self, storage):
+        self.storage = storage
+
+    def run(self, limit=None, since=None, until=None):
+        counts = self.storage.get_tag_counts(since=since, until=until)
+
+        if not counts:
+            ui.print("No tags found")
+            return
+
+        limit = limit or DEFAULT_TAGS_LIMIT
+        width = max(len(tag) for tag, _ in counts[:limit])
+
+        for tag, entries in counts[:limit]:
+            ui.print(f"  {tag:<{width}} {entries:>8,} entries")
+
+        if len(counts) > limit:
+            ui.print(f"  ... and {len(counts) - limit:,} more tags")
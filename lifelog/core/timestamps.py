@@ -0,0 +1,70 @@
+import re
+
+from datetime import date, datetime, time, timedelta
+
+# Entries are stored in naive local time, like datetime.now(), as integer
+# microseconds since this naive epoch.
+EPOCH = datetime(1970, 1, 1)
+
+RELATIVE_PATTERN = re.compile(r"^(?P<count>\d+)\s*(?P<unit>[dw])$")
+
+
+def to_epoch_us(timestamp):
+    return (timestamp - EPOCH) // timedelta(microseconds=1)
+
+
+def from_epoch_us(value):
+    return EPOCH + timedelta(microseconds=value)
+
+
+def parse_date(value, today=None):
+    """Parses a CLI date into (datetime, is_whole_day).
+
+    Accepts ISO dates and datetimes, "today", "yesterday" and relative days
+    or weeks ago ("3d", "2w").
+    """
+    today = today or date.today()
+    value = value.strip().lower()
+
+    if value == "today":
+        day = today
+    elif value == "yesterday":
+        day = today - timedelta(days=1)
+    elif match := RELATIVE_PATTERN.match(value):
+        days = int(match["count"]) * (7 if match["unit"] == "w" else 1)
+        day = today - timedelta(days=days)
+    else:
+        try:
+            return datetime.combine(date.fromisoformat(value), time()), True
+        except ValueError:
+            pass
+
+        try:
+            return datetime.fromisoformat(value), False
+        except ValueError:
+            raise ValueError(
+                f"Invalid date '{value}', expected e.g. 2024-03-01, "
+                "2024-03-01T08:00, today, yesterday, 3d or 2w"
+            ) from None
+
+    return datetime.combine(day, time()), True
+
+
+def resolve_date_range(since=None, until=None, on=None, today=None):
+    """Turns --since/--until/--on values into a [since, until) datetime range.
+
+    Either bound may be None. A whole-day --until includes that day.
+    """
+    if on is not None:
+        start, _ = parse_date(on, today)
+        return start, start + timedelta(days=1)
+
+    start = parse_date(since, today)[0] if since else None
+    end = None
+
+    if until:
+        end, whole_day = parse_date(until, today)
+        if whole_day:
+            end += timedelta(days=1)
+
+    return start, end
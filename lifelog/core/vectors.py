@@ -0,0 +1,36 @@
+"""Term vectors of entry bodies, computed whenever an entry is written.
+
+Kept apart from lifelog.core.related (and its json and NumPy) so writing an
+entry imports only what hashing its words needs.
+"""
+
+import re
+import sys
+import zlib
+
+from array import array
+from collections import Counter
+
+VECTOR_SIZE = 1 << 20  # hash buckets, collisions are rare at diary scale
+WORD_PATTERN = re.compile(r"[^\W\d_]{2,}")
+
+
+def term_vector(body) -> tuple:
+    """Returns the (terms, counts) of a body as little-endian uint32 and
+    uint16 arrays, packed to bytes, terms ascending."""
+    # Hashing each distinct word once is cheaper than hashing every word
+    counts = {}
+    for word, count in Counter(WORD_PATTERN.findall(body.casefold())).items():
+        term = zlib.crc32(word.encode("utf-8")) & (VECTOR_SIZE - 1)
+        counts[term] = counts.get(term, 0) + count
+
+    terms = sorted(counts)
+
+    packed_terms = array("I", terms)
+    packed_counts = array("H", (min(counts[term], 0xFFFF) for term in terms))
+
+    if sys.byteorder == "big":
+        packed_terms.byteswap()
+        packed_counts.byteswap()
+
+    return packed_terms.tobytes(), packed_counts.tobytes()
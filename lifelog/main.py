@@ -1,59 +1,195 @@
 import logging
 import os
+import sys
 
-from importlib.metadata import version as get_version
-from dotenv import load_dotenv
+from pathlib import Path
 
+from lifelog import __version__
+from lifelog.core import profiling
 from lifelog.core.entry import EntryHandler
 from lifelog.cli.args import parse_args
-from lifelog.core.logger import setup_logging
+from lifelog.core.logger import setup_logging, set_file_log_level
 from lifelog.core.config import Config
-from lifelog.cli.menu import MenuHandler
 from lifelog.cli.interface import ui
-from lifelog.storage.database import DatabaseStorage
-from lifelog.storage.file import FileStorage
+
+# NOTE: the menu, editor, terminal menu and storage backends are imported
+# where they are used so quick captures (-m) don't pay for them on startup.
 
 logger = logging.getLogger(__name__)
 
-load_dotenv()
+
+def _load_dotenv():
+    # python-dotenv is only a dev dependency, so only import it when the
+    # project checkout actually has a .env file.
+    env_file = Path(__file__).parent.parent / ".env"
+
+    if env_file.exists():
+        from dotenv import load_dotenv
+
+        load_dotenv(env_file)
+
+
+_load_dotenv()
 
 DEBUG_MODE = os.getenv("DEBUG_MODE") == "1"
 
 
 class App:
-    def __init__(self):
-        self.args = parse_args()
+    def __init__(self, args=None):
+        self.args = args or parse_args()
 
         setup_logging(self.args.verbose)
 
-        logger.info(f"-----| Starting run @ lifelog-{get_version('lifelog')} |-----")
+        logger.info("-----| Starting run @ lifelog-%s |-----", __version__)
         if DEBUG_MODE:
             logger.info(
                 ">>>>> DEBUG MODE IS ENABLED!!! Disable it by setting env variable 'DEBUG_MODE' to '0'."
             )
-        logger.info(f"Current state: {ui.state}")
-        logger.info(f"Args passed from user: {self.args}")
+        logger.info("Current state: %s", ui.state)
+        logger.info("Args passed from user: %s", self.args)
+
+        with profiling.span("config"):
+            self.config = Config(self.args.config_file)
+        set_file_log_level(self.config.settings.get("log_level", "info"))
+
+        with profiling.span("storage.open"):
+            if self.config.settings["storage_mode"] == "database":
+                from lifelog.storage.database import DatabaseStorage
 
-        self.config = Config(self.args.config_file)
+                logger.info("Using storage type database")
+                self.storage = DatabaseStorage(self.config)
+            else:
+                from lifelog.storage.file import FileStorage
 
-        if self.config.settings["storage_mode"] == "database":
-            logger.info("Using storage type database")
-            self.storage = DatabaseStorage(self.config)
-        else:
-            logger.info("Using storage type file")
-            self.storage = FileStorage(self.config)
+                logger.info("Using storage type file")
+                self.storage = FileStorage(self.config)
+
+        if profiling.enabled():
+            self.storage.instrument(profiling.current())
 
         self.entry_handler = EntryHandler(self.config, self.storage)
-        self.menu_handler = MenuHandler(self, self.config)
+        self._menu_handler = None
+
+    @property
+    def menu_handler(self):
+        if self._menu_handler is None:
+            from lifelog.cli.menu import MenuHandler
+
+            self._menu_handler = MenuHandler(self, self.config)
+
+        return self._menu_handler
 
     def run(self):
         ran_something = False
 
         if self.args.read_entries:
             ran_something = True
-            self.entry_handler.select_and_open_entry()
+            self.entry_handler.select_and_open_entry(
+                self.args.since, self.args.until, self.args.tag
+            )
+
+        if self.args.search:
+            ran_something = True
+            self.entry_handler.search_entries(
+                self.args.search, self.args.since, self.args.until, self.args.tag
+            )
+
+        if self.args.related is not None:
+            ran_something = True
+            self.entry_handler.show_related_entries(self.args.related)
+
+        if self.args.command == "import":
+            from lifelog.core.importer import Importer
+
+            ran_something = True
+            Importer(self.storage, self.args.batch_size).run(
+                self.args.sources, self.args.format
+            )
+
+        if self.args.command == "export":
+            from lifelog.core.exporter import Exporter
+
+            ran_something = True
+            Exporter(self.storage, self.args.workers).run(
+                self.args.destination,
+                self.args.format,
+                self.args.since,
+                self.args.until,
+                self.args.tag,
+            )
+
+        if self.args.command == "stats":
+            from lifelog.core.stats import StatsReport
+
+            ran_something = True
+            StatsReport(self.storage).run(
+                self.args.period,
+                self.args.limit,
+                self.args.since,
+                self.args.until,
+                self.args.rebuild,
+            )
+
+        if self.args.command == "tags":
+            from lifelog.core.tags import TagsReport
+
+            ran_something = True
+            TagsReport(self.storage).run(
+                self.args.limit, self.args.since, self.args.until
+            )
+
+        if self.args.command == "attach":
+            from lifelog.core.attachments import AttachmentHandler
+
+            ran_something = True
+            AttachmentHandler(self.storage).attach(self.args.uid, self.args.paths)
+
+        if self.args.command == "attachment":
+            from lifelog.core.attachments import AttachmentHandler
+
+            ran_something = True
+            AttachmentHandler(self.storage).extract(self.args.handle, self.args.output)
+
+        if self.args.command == "backup":
+            from lifelog.core.backup import Backup
+
+            ran_something = True
+            Backup(
+                self.storage,
+                self.config.paths.get("backup_folder"),
+                self.config.backup.get("pages_per_step"),
+                self.config.backup.get("step_pause"),
+                self.config.backup,
+            ).run(self.args.destination, self.args.pages)
+
+        if self.args.command == "archive":
+            from lifelog.core.archive import Archiver
 
-        if self.args.message:
+            ran_something = True
+            Archiver(self.storage, self.config.archive.get("hot_years")).run(
+                self.args.before
+            )
+
+        if self.args.command == "daemon":
+            from lifelog.core.daemon import Daemon
+
+            ran_something = True
+            if self.args.stop:
+                Daemon.stop()
+            else:
+                Daemon(self).serve()
+
+        if self.args.message == "-":
+            from lifelog.core.ingest import StreamIngester
+
+            ran_something = True
+            StreamIngester(
+                self.storage,
+                self.config.storage.get("ingest_batch_size"),
+                self.config.storage.get("ingest_flush_interval"),
+            ).run(sys.stdin.buffer, self.args.separator)
+
+        elif self.args.message:
             ran_something = True
             self.entry_handler.create_entry_from_string(self.args.message)
 
@@ -61,11 +197,26 @@ class App:
             ran_something = True
             self.entry_handler.create_entry_from_editor()
 
+        # A date range or a tag on its own prints the entries in it
+        if not ran_something and (self.args.since or self.args.until or self.args.tag):
+            ran_something = True
+            self.entry_handler.print_entries(
+                self.args.since, self.args.until, self.args.tag
+            )
+
         # If nothing ran, open the interactive menu
         if not ran_something:
             self.menu_handler.run()
 
 
 def main():
-    app = App()
-    app.run()
+    args = parse_args()
+
+    if args.profile:
+        profiling.enable(args.profile_output)
+
+    try:
+        App(args).run()
+    finally:
+        # Also when the menu exits with sys.exit()
+        profiling.finish()
@@ -0,0 +1,323 @@
+"""Hot/cold partitioning of the diary database by year.
+
+`lifelog archive` moves the entries of past years out of the diary into one
+archive database per year, a regular lifelog database of its own with the
+entries, their history, tags, vectors, attachments, search index and
+statistics. The diary keeps a row per archive in the archives table and a
+row per moved entry in archived_entries, so day-to-day work only touches
+the small hot file, and DatabaseStorage ATTACHes an archive when a query
+reaches into its year.
+
+An archive is built under a temporary name from a separate connection, only
+reading the diary, then renamed into place. The move becomes visible when
+the diary transaction recording the archive and deleting the moved rows
+commits; until then queries never look at the new file, and files no
+archives row refers to are left-overs of an interrupted run. Archiving a
+year again writes the next generation of its file, so archiving never
+modifies the one in use. Edits and attachments of archived entries do, in
+place, but only while holding the diary's write lock and bumping the
+year's archives.writes, so a run that copied the file before such a write
+sees the diary changed and starts over.
+"""
+
+import logging
+import re
+import shutil
+import sqlite3
+
+from datetime import datetime
+
+from lifelog.core.constants import ATTACHMENT_CHUNK_SIZE
+from lifelog.storage.bodies import register_functions, unindex_bodies
+from lifelog.storage.migrations import apply_migrations
+
+logger = logging.getLogger(__name__)
+
+PARTIAL_SUFFIX = ".partial"
+# Tries to move a year while other sessions keep writing to the diary
+ARCHIVE_ATTEMPTS = 3
+
+
+def archive_name(stem, year, generation):
+    return f"{stem}-{year}.{generation}.db"
+
+
+def is_archive_file(stem, name):
+    # Archives and interrupted builds of them, anything else is left alone
+    pattern = rf"{re.escape(stem)}-\d+\.\d+\.db({re.escape(PARTIAL_SUFFIX)})?"
+    return re.fullmatch(pattern, name) is not None
+
+
+def schema_name(year, generation):
+    return f"archive_{year}_{generation}"
+
+
+def year_bounds(year):
+    return datetime(year, 1, 1), datetime(year + 1, 1, 1)
+
+
+def list_archives(connection, since=None, until=None) -> list:
+    """Returns (year, generation, file, first, last) of the archives holding
+    entries in [since, until), newest first."""
+    where, params = [], []
+
+    if since is not None:
+        where.append("last_timestamp >= ?")
+        params.append(since)
+
+    if until is not None:
+        where.append("first_timestamp < ?")
+        params.append(until)
+
+    return connection.execute(
+        f"""
+        SELECT year, generation, file, first_timestamp, last_timestamp
+        FROM archives
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY year DESC
+        """,
+        params,
+    ).fetchall()
+
+
+def find_archive(connection, entry_id):
+    return connection.execute(
+        """
+        SELECT a.year, a.generation, a.file, a.first_timestamp, a.last_timestamp
+        FROM archived_entries x
+        JOIN archives a ON a.year = x.year
+        WHERE x.entry_id = ?
+        """,
+        (entry_id,),
+    ).fetchone()
+
+
+def build_archive(source_path, path, year, schemas_path, existing=None) -> tuple:
+    """Writes the entries of `year` in the database at `source_path` to a new
+    archive database at `path`, on top of a copy of the `existing` archive.
+
+    Returns (moved, entries, first, last): the entries copied, and the
+    entries and epoch microsecond bounds of the whole archive.
+    """
+    target = sqlite3.connect(path)
+
+    try:
+        if existing is not None:
+            source = sqlite3.connect(existing)
+            try:
+                source.backup(target)
+            finally:
+                source.close()
+
+            # A single file, whatever journal mode the copy was opened with
+            target.execute("PRAGMA journal_mode = delete")
+
+        register_functions(target)
+        apply_migrations(target, schemas_path)
+
+        target.execute("ATTACH DATABASE ? AS hot", (str(source_path),))
+        since, until = year_bounds(year)
+
+        # One transaction, so every read from the diary sees the same snapshot
+        with target:
+            target.execute("BEGIN")
+            moved = _copy_year(target, since, until)
+
+        entries, first, last = target.execute(
+            "SELECT count(*), min(timestamp), max(timestamp) FROM entries"
+        ).fetchone()
+        problems = [row[0] for row in target.execute("PRAGMA quick_check")]
+
+        if problems != ["ok"]:
+            raise sqlite3.DatabaseError(
+                f"Archive of {year} failed its check: {'; '.join(problems[:5])}"
+            )
+
+    finally:
+        target.close()
+
+    logger.info("Wrote %s entries of %s to %s", moved, year, path)
+    return moved, entries, first, last
+
+
+def _copy_year(target, since, until) -> int:
+    # The search index and daily totals are added in bulk afterwards, like
+    # DatabaseStorage.add_entries() does
+    target.execute("INSERT INTO fts_deferred VALUES (1)")
+    target.execute(
+        """
+        CREATE TEMP TABLE moved AS
+        SELECT entry_id, body_id FROM hot.entries
+        WHERE timestamp >= ? AND timestamp < ?
+        """,
+        (since, until),
+    )
+
+    target.execute(
+        """
+        INSERT INTO main.bodies (hash, body, codec)
+        SELECT b.hash, b.body, b.codec
+        FROM hot.bodies b
+        WHERE b.body_id IN (
+            SELECT body_id FROM moved
+            UNION
+            SELECT h.body_id FROM hot.entries_history h
+            JOIN moved m ON m.entry_id = h.entry_id
+            WHERE h.body_id IS NOT NULL
+        )
+        ON CONFLICT (hash) DO NOTHING
+        """
+    )
+    moved = target.execute(
+        """
+        INSERT INTO main.entries (entry_id, timestamp, body_id, updated_at, word_count)
+        SELECT e.entry_id, e.timestamp, nb.body_id, e.updated_at, e.word_count
+        FROM moved m
+        JOIN hot.entries e ON e.entry_id = m.entry_id
+        JOIN hot.bodies hb ON hb.body_id = e.body_id
+        JOIN main.bodies nb ON nb.hash = hb.hash
+        """
+    ).rowcount
+    target.execute(
+        """
+        INSERT INTO main.entries_history
+            (entry_id, version, base_version, timestamp, archived_at, body_id, data)
+        SELECT h.entry_id, h.version, h.base_version, h.timestamp, h.archived_at,
+               nb.body_id, h.data
+        FROM moved m
+        JOIN hot.entries_history h ON h.entry_id = m.entry_id
+        LEFT JOIN hot.bodies hb ON hb.body_id = h.body_id
+        LEFT JOIN main.bodies nb ON nb.hash = hb.hash
+        ORDER BY h.history_id
+        """
+    )
+    target.execute(
+        """
+        INSERT INTO main.entry_tags (tag, timestamp, entry_id)
+        SELECT t.tag, t.timestamp, t.entry_id
+        FROM moved m
+        JOIN hot.entry_tags t ON t.entry_id = m.entry_id
+        """
+    )
+
+    target.execute(
+        """
+        INSERT INTO main.entry_vectors (entry_id, terms, counts)
+        SELECT v.entry_id, v.terms, v.counts
+        FROM moved m
+        JOIN hot.entry_vectors v ON v.entry_id = m.entry_id
+        """
+    )
+
+    _copy_attachments(target)
+
+    target.execute(
+        """
+        INSERT INTO main.entries_fts (rowid, body)
+        SELECT entry_id, body FROM main.entry_bodies
+        WHERE entry_id IN (SELECT entry_id FROM moved)
+        """
+    )
+    target.execute(
+        """
+        INSERT INTO main.daily_stats (day, entries, words)
+        SELECT date(timestamp / 1000000, 'unixepoch'), count(*), sum(word_count)
+        FROM main.entries
+        WHERE entry_id IN (SELECT entry_id FROM moved)
+        GROUP BY 1
+        ON CONFLICT (day) DO UPDATE SET
+            entries = entries + excluded.entries,
+            words = words + excluded.words
+        """
+    )
+    target.execute("DELETE FROM fts_deferred")
+    target.execute("DROP TABLE moved")
+
+    return moved
+
+
+def _copy_attachments(target):
+    # Payloads are streamed over in chunks, they can be far larger than memory
+    payloads = target.execute(
+        """
+        SELECT DISTINCT a.attachment_id, a.hash, a.size
+        FROM moved m
+        JOIN hot.entry_attachments l ON l.entry_id = m.entry_id
+        JOIN hot.attachments a ON a.attachment_id = l.attachment_id
+        WHERE a.hash NOT IN (SELECT hash FROM main.attachments)
+        """
+    ).fetchall()
+
+    for source_id, digest, size in payloads:
+        attachment_id = target.execute(
+            "INSERT INTO main.attachments (hash, size) VALUES (?, ?)", (digest, size)
+        ).lastrowid
+        target.execute(
+            "INSERT INTO main.attachment_data (attachment_id, data) VALUES (?, zeroblob(?))",
+            (attachment_id, size),
+        )
+
+        with (
+            target.blobopen(
+                "attachment_data", "data", source_id, readonly=True, name="hot"
+            ) as source,
+            target.blobopen("attachment_data", "data", attachment_id) as blob,
+        ):
+            shutil.copyfileobj(source, blob, ATTACHMENT_CHUNK_SIZE)
+
+    target.execute(
+        """
+        INSERT INTO main.entry_attachments (entry_id, name, attachment_id, mime_type)
+        SELECT l.entry_id, l.name, na.attachment_id, l.mime_type
+        FROM moved m
+        JOIN hot.entry_attachments l ON l.entry_id = m.entry_id
+        JOIN hot.attachments ha ON ha.attachment_id = l.attachment_id
+        JOIN main.attachments na ON na.hash = ha.hash
+        """
+    )
+
+
+def record_archive(connection, year, generation, file, stats, archived_at):
+    """Points the diary at the new archive of `year` and deletes the entries
+    it now holds. Must run inside the caller's write transaction."""
+    _, entries, first, last = stats
+    since, until = year_bounds(year)
+
+    connection.execute(
+        """
+        INSERT INTO archives
+            (year, generation, file, entries, first_timestamp, last_timestamp,
+             archived_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (year) DO UPDATE SET
+            generation = excluded.generation,
+            file = excluded.file,
+            entries = excluded.entries,
+            first_timestamp = excluded.first_timestamp,
+            last_timestamp = excluded.last_timestamp,
+            archived_at = excluded.archived_at
+        """,
+        (year, generation, file, entries, first, last, archived_at),
+    )
+    connection.execute(
+        """
+        INSERT INTO archived_entries (entry_id, year)
+        SELECT entry_id, ? FROM entries
+        WHERE timestamp >= ? AND timestamp < ?
+        """,
+        (year, since, until),
+    )
+
+    # Triggers take the tags, statistics, attachments and unreferenced
+    # bodies along with the entries, the search index is up to us
+    unindex_bodies(connection, "e.timestamp >= ? AND e.timestamp < ?", (since, until))
+    connection.execute(
+        """
+        DELETE FROM entries_history
+        WHERE entry_id IN (SELECT entry_id FROM archived_entries WHERE year = ?)
+        """,
+        (year,),
+    )
+    connection.execute(
+        "DELETE FROM entries WHERE timestamp >= ? AND timestamp < ?", (since, until)
+    )
@@ -1,7 +1,11 @@
+import functools
+import inspect
 import logging
 
 from abc import ABC, abstractmethod
 
+from lifelog.core.constants import DEFAULT_PAGE_SIZE
+
 logger = logging.getLogger(__name__)
 
 
@@ -10,12 +14,91 @@ class Storage(ABC):
     def type(self) -> str:
         raise NotImplementedError("Subclasses must implemnet the 'type' property")
 
+    @property
+    def page_size(self) -> int:
+        return int(self.config.storage.get("page_size", DEFAULT_PAGE_SIZE))
+
+    def instrument(self, profiler):
+        """Records a profiler span for every public method call on this storage.
+
+        Called by `lifelog --profile` only, so a normal run doesn't pay for
+        the wrappers. Methods returning a lazy iterator are timed while it
+        is consumed.
+        """
+        for name, method in inspect.getmembers(self, inspect.ismethod):
+            if name.startswith("_") or name == "instrument":
+                continue
+
+            setattr(self, name, _timed(profiler, f"storage.{name}", method))
+
+        logger.info("Instrumented %s storage for profiling", self.type)
+
+    def _iter_pages(self, fetch_page, page_size=None, since=None, until=None, tag=None):
+        # Walks fetch_page(before, limit) newest first until a short page.
+        # Pages are ordered by (timestamp, uid), the last one is the cursor.
+        page_size = page_size or self.page_size
+        before = None
+
+        while True:
+            page = fetch_page(
+                before=before, limit=page_size, since=since, until=until, tag=tag
+            )
+            yield from page
+
+            if len(page) < page_size:
+                return
+
+            before = (page[-1].timestamp, page[-1].uid)
+
     @abstractmethod
     def add_entry(self, body, timestamp):
         pass
 
+    @abstractmethod
+    def add_entries(self, entries, checkpoints=None):
+        pass
+
+    @abstractmethod
+    def get_import_progress(self) -> dict:
+        pass
+
     @abstractmethod
     def update_entry(self, old_entry, new_entry):
+        """Returns False when the body is unchanged and nothing was written."""
+        pass
+
+    @abstractmethod
+    def add_attachment(self, uid, path, name, mime_type, digest):
+        """Attaches the file at `path` to an entry, streaming it into storage.
+
+        `digest` is the content hash of the file (see hash_file()); content
+        that is already stored is only linked. Returns the Attachment, or None
+        when there is no entry `uid`.
+        """
+        pass
+
+    @abstractmethod
+    def get_entry_attachments(self, uid) -> list:
+        pass
+
+    @abstractmethod
+    def get_attachments(self, entries) -> dict:
+        """Returns the attachments of those of `entries` that have some, by
+        uid. For exports, which look them up a chunk of entries at a time."""
+        pass
+
+    @abstractmethod
+    def open_attachment(self, prefix):
+        """Returns (Attachment, readable binary stream) for a hash prefix, or None."""
+        pass
+
+    @abstractmethod
+    def get_entry_history(self, uid) -> list:
+        """Returns (version, archived_at) of every past version, oldest first."""
+        pass
+
+    @abstractmethod
+    def get_entry_version(self, uid, version):
         pass
 
     @abstractmethod
@@ -25,3 +108,77 @@ class Storage(ABC):
     @abstractmethod
     def get_entries(self) -> list:
         pass
+
+    @abstractmethod
+    def iter_entries(self, page_size=None, since=None, until=None, tag=None):
+        """Yields entries newest first, only those tagged `tag` (e.g. "#health")."""
+        pass
+
+    @abstractmethod
+    def iter_entry_headers(self, page_size=None, since=None, until=None, tag=None):
+        pass
+
+    def iter_entry_headers_matching(
+        self, words, page_size=None, since=None, until=None, tag=None
+    ):
+        """Yields headers of entries with a word starting with each of `words`.
+
+        Answered from an index, newest written first. Returns None when the
+        backend has no index to answer it from.
+        """
+        return None
+
+    def get_vector_state(self):
+        """Returns (last vector id, removals, archives), a cheap value that
+        changes whenever entry vectors are written or removed, or None when
+        the backend keeps no vectors (see core/related.py).
+        """
+        return None
+
+    def iter_entry_vectors(self, after=None):
+        """Yields the (uid, terms, counts) vector of every entry, or with
+        `after` those written to the main database since vector `after`."""
+        return iter(())
+
+    @abstractmethod
+    def get_entry(self, uid):
+        pass
+
+    @abstractmethod
+    def get_daily_stats(self, since=None, until=None) -> list:
+        """Returns (date, entries, words) for every day written, oldest first."""
+        pass
+
+    @abstractmethod
+    def get_longest_entries(self, limit=None, since=None, until=None) -> list:
+        """Returns (EntryHeader, word_count) pairs, longest first."""
+        pass
+
+    @abstractmethod
+    def get_tag_counts(self, since=None, until=None) -> list:
+        """Returns (tag, entries) for every tag used, most used first."""
+        pass
+
+    @abstractmethod
+    def rebuild_stats(self):
+        pass
+
+    @abstractmethod
+    def search_entries(
+        self, query, limit=None, since=None, until=None, tag=None
+    ) -> list:
+        pass
+
+
+def _timed(profiler, name, method):
+    @functools.wraps(method)
+    def timed(*args, **kwargs):
+        with profiler.span(name):
+            result = method(*args, **kwargs)
+
+        if inspect.isgenerator(result):
+            return profiler.timed_iterator(name, result)
+
+        return result
+
+    return timed
@@ -0,0 +1,192 @@
+"""Content-addressed storage of entry bodies.
+
+Every distinct body is stored once in the bodies table, keyed by its hash,
+and entries and history keyframes refer to it by body_id. Triggers keep
+bodies.refs up to date and delete a body once nothing refers to it, so a
+template or a repeated check-in takes no extra space, and an edit that
+doesn't change the text is spotted by comparing hashes.
+
+Bodies of at least body_compression_threshold bytes are stored
+compressed, with the codec in bodies.codec (NULL for plain text). They are
+only decompressed when read, by the body_text() and body_prefix() SQL
+functions register_functions() adds to every connection. Queries go
+through body_column() and preview_column(), so plain bodies never call
+into Python.
+
+Triggers never call those functions, so other tools (the sqlite3 shell, a
+restore script) can still write to the tables. They can't read compressed
+bodies or the entry_bodies view though, and since the search index is kept
+up to date by index_bodies() and unindex_bodies() rather than by triggers,
+entries they write or delete are only searchable as they were until
+`lifelog stats --rebuild` rebuilds the index.
+"""
+
+import hashlib
+import importlib
+import zlib
+
+from lifelog.core.constants import (
+    DEFAULT_BODY_COMPRESSION,
+    DEFAULT_BODY_COMPRESSION_THRESHOLD,
+)
+
+HASH_SIZE = 16  # bytes, collisions are out of reach at diary scale
+
+CODECS = ("none", "zlib", "lzma", "bz2")
+# Compressed bodies cost a decompression on every read, keep them plain
+# unless that saves at least this much
+MAX_COMPRESSED_RATIO = 0.9
+ZLIB_LEVEL = 6
+
+
+def content_hasher():
+    """The hash bodies and attachment payloads are stored under."""
+    return hashlib.blake2b(digest_size=HASH_SIZE)
+
+
+def body_hash(body) -> bytes:
+    hasher = content_hasher()
+    hasher.update(body.encode("utf-8"))
+    return hasher.digest()
+
+
+def resolve_compression(storage_config) -> tuple:
+    codec = str(
+        storage_config.get("body_compression", DEFAULT_BODY_COMPRESSION)
+    ).lower()
+    threshold = int(
+        storage_config.get(
+            "body_compression_threshold", DEFAULT_BODY_COMPRESSION_THRESHOLD
+        )
+    )
+
+    if codec not in CODECS:
+        raise ValueError(
+            f"Invalid storage.body_compression '{codec}', "
+            f"expected one of {', '.join(CODECS)}"
+        )
+
+    return (None if codec == "none" else codec), threshold
+
+
+def _module(codec):
+    # lzma and bz2 are only imported by databases that use them
+    return zlib if codec == "zlib" else importlib.import_module(codec)
+
+
+def encode_body(body, codec=None, threshold=0) -> tuple:
+    """Returns (value, codec) to store, codec is None for plain text."""
+    data = body.encode("utf-8")
+
+    if codec is None or len(data) < threshold:
+        return body, None
+
+    if codec == "zlib":
+        compressed = zlib.compress(data, ZLIB_LEVEL)
+    else:
+        compressed = _module(codec).compress(data)
+
+    if len(compressed) > len(data) * MAX_COMPRESSED_RATIO:
+        return body, None
+
+    return compressed, codec
+
+
+def body_text(value, codec):
+    if codec is None:
+        return value
+
+    return _module(codec).decompress(value).decode("utf-8")
+
+
+def body_prefix(value, codec, length):
+    # Listings only need the start of a body, stop decompressing there
+    if codec is None:
+        return value[:length]
+
+    if codec == "zlib":
+        decompressor = zlib.decompressobj()
+    elif codec == "lzma":
+        decompressor = _module(codec).LZMADecompressor()
+    else:
+        decompressor = _module(codec).BZ2Decompressor()
+
+    # A multi-byte character may be cut in half at the end
+    return decompressor.decompress(value, length).decode("utf-8", errors="ignore")
+
+
+def register_functions(connection):
+    connection.create_function("body_text", 2, body_text, deterministic=True)
+    connection.create_function("body_prefix", 3, body_prefix, deterministic=True)
+
+
+def body_column(table="b"):
+    return (
+        f"CASE WHEN {table}.codec IS NULL THEN {table}.body "
+        f"ELSE body_text({table}.body, {table}.codec) END"
+    )
+
+
+def preview_column(length, table="b"):
+    return (
+        f"CASE WHEN {table}.codec IS NULL THEN substr({table}.body, 1, {length}) "
+        f"ELSE body_prefix({table}.body, {table}.codec, {length}) END"
+    )
+
+
+def store_body(connection, body, digest=None, codec=None, threshold=0) -> int:
+    # Must run inside the caller's write transaction, the refs are counted
+    # by triggers once an entry or history row points at the body.
+    digest = digest or body_hash(body)
+
+    if (
+        row := connection.execute(
+            "SELECT body_id FROM bodies WHERE hash = ?;", (digest,)
+        ).fetchone()
+    ) is not None:
+        return row[0]
+
+    return connection.execute(
+        "INSERT INTO bodies (hash, body, codec) VALUES (?, ?, ?);",
+        (digest, *encode_body(body, codec, threshold)),
+    ).lastrowid
+
+
+def store_bodies(connection, bodies, codec=None, threshold=0) -> list:
+    """Bulk store_body(), returns the hashes in the same order."""
+    digests = [body_hash(body) for body in bodies]
+
+    connection.executemany(
+        """
+        INSERT INTO bodies (hash, body, codec) VALUES (?, ?, ?)
+        ON CONFLICT (hash) DO NOTHING;
+        """,
+        (
+            (digest, *encode_body(body, codec, threshold))
+            for digest, body in zip(digests, bodies)
+        ),
+    )
+
+    return digests
+
+
+def index_bodies(connection, rows):
+    """Adds (entry_id, body) rows, with plain text bodies, to the search
+    index. Must run in the transaction that writes the entries."""
+    connection.executemany("INSERT INTO entries_fts (rowid, body) VALUES (?, ?);", rows)
+
+
+def unindex_bodies(connection, condition, parameters=()):
+    """Removes the entries matching `condition` (on entries e) from the
+    search index, before they are deleted or their body changes."""
+    # FTS5 needs the exact text that was indexed to remove it
+    connection.execute(
+        f"""
+        INSERT INTO entries_fts (entries_fts, rowid, body)
+        SELECT 'delete', e.entry_id, {body_column()}
+        FROM entries e
+        JOIN bodies b ON b.body_id = e.body_id
+        WHERE {condition};
+        """,
+        parameters,
+    )
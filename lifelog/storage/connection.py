@@ -0,0 +1,100 @@
+import logging
+import sqlite3
+
+from datetime import datetime
+
+from lifelog.core.timestamps import from_epoch_us, to_epoch_us
+from lifelog.storage.bodies import register_functions
+
+logger = logging.getLogger(__name__)
+
+# Defaults for the [storage] connection settings. WAL with synchronous=NORMAL
+# lets a background capture write while an interactive session is reading,
+# and only fsyncs on checkpoints instead of on every commit.
+DEFAULT_CONNECTION_SETTINGS = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -16_000,  # negative means KiB, so ~16 MB
+    "busy_timeout": 5000,  # milliseconds
+    "statement_cache_size": 256,
+}
+
+JOURNAL_MODES = ("delete", "truncate", "persist", "memory", "wal", "off")
+SYNCHRONOUS_MODES = ("off", "normal", "full", "extra")
+
+
+def convert_timestamp(value):
+    # TIMESTAMP columns hold epoch microseconds, rows written before
+    # migration 006 used the old default adapter's ISO text.
+    try:
+        return from_epoch_us(int(value))
+    except ValueError:
+        return datetime.fromisoformat(value.decode("utf-8"))
+
+
+# Replaces sqlite3's deprecated default datetime adapter and converter
+sqlite3.register_adapter(datetime, to_epoch_us)
+sqlite3.register_converter("timestamp", convert_timestamp)
+
+
+def resolve_connection_settings(storage_config) -> dict:
+    settings = {
+        key: storage_config.get(key, default)
+        for key, default in DEFAULT_CONNECTION_SETTINGS.items()
+    }
+
+    settings["journal_mode"] = str(settings["journal_mode"]).lower()
+    settings["synchronous"] = str(settings["synchronous"]).lower()
+
+    if settings["journal_mode"] not in JOURNAL_MODES:
+        raise ValueError(
+            f"Invalid storage.journal_mode '{settings['journal_mode']}', "
+            f"expected one of {', '.join(JOURNAL_MODES)}"
+        )
+
+    if settings["synchronous"] not in SYNCHRONOUS_MODES:
+        raise ValueError(
+            f"Invalid storage.synchronous '{settings['synchronous']}', "
+            f"expected one of {', '.join(SYNCHRONOUS_MODES)}"
+        )
+
+    for key in ("mmap_size", "cache_size", "busy_timeout", "statement_cache_size"):
+        settings[key] = int(settings[key])
+
+    return settings
+
+
+def connect(db_path, storage_config) -> sqlite3.Connection:
+    settings = resolve_connection_settings(storage_config)
+
+    connection = sqlite3.connect(
+        db_path,
+        timeout=settings["busy_timeout"] / 1000,
+        cached_statements=settings["statement_cache_size"],
+        detect_types=sqlite3.PARSE_DECLTYPES,
+    )
+
+    # Values are validated above, pragmas can't take bound parameters
+    connection.execute(f"PRAGMA busy_timeout = {settings['busy_timeout']}")
+
+    journal_mode = connection.execute(
+        f"PRAGMA journal_mode = {settings['journal_mode']}"
+    ).fetchone()[0]
+    if journal_mode != settings["journal_mode"]:
+        logger.warning(
+            "Requested journal_mode %s but database is using %s",
+            settings["journal_mode"],
+            journal_mode,
+        )
+
+    connection.execute(f"PRAGMA synchronous = {settings['synchronous']}")
+    connection.execute(f"PRAGMA mmap_size = {settings['mmap_size']}")
+    connection.execute(f"PRAGMA cache_size = {settings['cache_size']}")
+
+    # Compressed bodies are decompressed by SQL functions, views and
+    # triggers use them too
+    register_functions(connection)
+
+    logger.info("Opened %s with %s", db_path, settings)
+    return connection
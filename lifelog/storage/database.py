@@ -1,10 +1,51 @@
+import heapq
 import sqlite3
 import os
 import logging
 
+from collections import Counter
+from datetime import date, datetime, timedelta
+from itertools import islice
 from pathlib import Path
+from lifelog.storage.archives import (
+    ARCHIVE_ATTEMPTS,
+    PARTIAL_SUFFIX,
+    archive_name,
+    build_archive,
+    find_archive,
+    is_archive_file,
+    list_archives,
+    record_archive,
+    schema_name,
+)
 from lifelog.storage.base import Storage
-from lifelog.core.entry import Entry
+from lifelog.storage.bodies import (
+    HASH_SIZE,
+    body_column,
+    body_hash,
+    index_bodies,
+    preview_column,
+    resolve_compression,
+    store_bodies,
+    store_body,
+    unindex_bodies,
+)
+from lifelog.storage.connection import connect
+from lifelog.storage.history import archive_version, get_versions, load_version
+from lifelog.storage.migrations import apply_migrations
+from lifelog.core import profiling
+from lifelog.core.attachments import Attachment, copy_verified
+from lifelog.core.entry import Entry, EntryHeader, make_preview
+from lifelog.core.stats import count_words, day_bounds
+from lifelog.core.tags import extract_tags
+from lifelog.core.vectors import term_vector
+from lifelog.core.constants import (
+    DEFAULT_ARCHIVE_FOLDER,
+    DEFAULT_HISTORY_KEYFRAME_INTERVAL,
+    DEFAULT_SEARCH_LIMIT,
+    DEFAULT_STATS_LIMIT,
+    PREVIEW_LENGTH,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -12,136 +53,1219 @@ DEBUG_MODE = os.getenv("DEBUG_MODE") == "1"
 
 
 class DatabaseStorage(Storage):
-    def __init__(self, config):
+    def __init__(self, config, db_path=None):
         self.config = config
-        if DEBUG_MODE:
+        if db_path is not None:
+            self.db_path = Path(db_path)
+        elif DEBUG_MODE:
             self.db_path = Path(__file__).parent.parent.parent / "dev_diary.db"
         else:
             self.db_path = Path(self.config.paths["diary_db"]).expanduser()
-        logger.info(f"Using db {str(self.db_path)}")
+        logger.info("Using db %s", self.db_path)
         self.schemas_path = Path(__file__).parent / "schemas"
+        self.archive_folder = Path(
+            self.config.paths.get("archive_folder", DEFAULT_ARCHIVE_FOLDER)
+        ).expanduser()
         self.connection = None
+        self.schema_version = None
+        # Schema names of the attached archives, least recently used first
+        self._attached = {}
+        self.history_keyframe_interval = int(
+            self.config.storage.get(
+                "history_keyframe_interval", DEFAULT_HISTORY_KEYFRAME_INTERVAL
+            )
+        )
+        self.body_codec, self.body_compression_threshold = resolve_compression(
+            self.config.storage
+        )
         self._setup_database()
 
     def __enter__(self):
-        self.connection = sqlite3.connect(self.db_path)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
         if self.connection:
             self.connection.close()
+            self.connection = None
+            self._attached.clear()
 
     @property
     def type(self):
         return "database"
 
-    def run_script(self, script):
-        if not os.path.exists(script):
-            raise FileNotFoundError(f"Unable to find file {script}")
-
-        with open(script, "r") as f:
-            sql = f.read()
-
-        try:
-            self.connection.executescript(sql)
-            self.connection.commit()
-            logger.info(f"Executed script {script}")
-        except sqlite3.Error as e:
-            logger.error(f"Unable to execute script {script}, {e}")
-
     def _setup_database(self):
         if not os.path.exists(self.db_path):
-            logger.info(f"Unable to find database {self.db_path}, creating it.")
+            logger.info("Unable to find database %s, creating it.", self.db_path)
             self.db_path.parent.mkdir(parents=True, exist_ok=True)
 
-        self.connection = sqlite3.connect(self.db_path)
+        with profiling.span("storage.connect"):
+            self.connection = connect(self.db_path, self.config.storage)
+
+        with profiling.span("storage.migrations"):
+            self.schema_version = apply_migrations(self.connection, self.schemas_path)
+
+    def _archive_path(self, file):
+        path = self.archive_folder / file
+
+        # ATTACH and connect() would quietly create an empty database
+        if not path.exists():
+            logger.error("Archive %s is missing", path)
+            raise FileNotFoundError(
+                f"Archive {path} is missing, check paths.archive_folder"
+            )
+
+        return path
+
+    def _attach(self, archive) -> str:
+        """ATTACHes an archive to the connection, returns its schema name."""
+        year, generation, file = archive[:3]
+        schema = schema_name(year, generation)
+
+        if schema in self._attached:
+            self._attached[schema] = self._attached.pop(schema)
+            return schema
+
+        path = self._archive_path(file)
+
+        # SQLite allows only a few attached databases, 10 by default
+        if len(self._attached) >= self.connection.getlimit(
+            sqlite3.SQLITE_LIMIT_ATTACHED
+        ):
+            oldest = next(iter(self._attached))
+            self.connection.execute(f"DETACH DATABASE {oldest}")
+            del self._attached[oldest]
+
+        self.connection.execute(f"ATTACH DATABASE ? AS {schema}", (str(path),))
+        version = self.connection.execute(f"PRAGMA {schema}.user_version").fetchone()
 
-        for script in os.listdir(self.schemas_path):
-            self.run_script(Path(self.schemas_path / script))
+        if version[0] < self.schema_version:
+            # Archived before a newer lifelog, opening it migrates it
+            self.connection.execute(f"DETACH DATABASE {schema}")
+            DatabaseStorage(self.config, path).close()
+            self.connection.execute(f"ATTACH DATABASE ? AS {schema}", (str(path),))
+
+        self._attached[schema] = None
+        logger.debug("Attached archive %s as %s", path, schema)
+        return schema
+
+    def _partitions(self, since=None, until=None):
+        # The diary first, it can hold entries of archived years too, then
+        # the archives with entries in [since, until), newest first
+        yield "main"
+
+        for archive in list_archives(self.connection, since, until):
+            yield self._attach(archive)
+
+    def _schema_of(self, uid):
+        archive = find_archive(self.connection, uid)
+        return "main" if archive is None else self._attach(archive)
+
+    def _open_archive(self, uid):
+        """Returns the storage of the archive holding entry `uid`, or None.
+
+        For the history lookups, which run the same code as for the diary
+        on the archive's own connection. Writes go through _write_archive().
+        """
+        archive = find_archive(self.connection, uid)
+
+        if archive is None:
+            return None
+
+        return DatabaseStorage(self.config, self._archive_path(archive[2]))
+
+    def _write_archive(self, uid, write):
+        """Returns write(storage) run on the storage of the archive holding
+        entry `uid`, while holding the diary's write lock.
+
+        `lifelog archive` copies an archive without locking anything and
+        only swaps in the new generation if the diary is unchanged by then
+        (see _archive_year), so a write to the archive also bumps its row
+        in the diary: a run that copied the file before the write starts
+        over instead of dropping it.
+        """
+        # BEGIN IMMEDIATE locks the attached databases too, the archive's
+        # own connection couldn't write to it
+        for schema in list(self._attached):
+            self.connection.execute(f"DETACH DATABASE {schema}")
+            del self._attached[schema]
+
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+
+            # Under the lock, a run may just have replaced the file
+            year, _, file = find_archive(self.connection, uid)[:3]
+            self.connection.execute(
+                "UPDATE archives SET writes = writes + 1 WHERE year = ?", (year,)
+            )
+
+            with DatabaseStorage(self.config, self._archive_path(file)) as archive:
+                return write(archive)
 
     def add_entry(self, entry):
         query = """
-        INSERT INTO entries (timestamp, body)
-        VALUES (?, ?)
+        INSERT INTO entries (timestamp, body_id, word_count)
+        VALUES (?, ?, ?)
         """
 
         try:
-            cursor = self.connection.cursor()
-            cursor.execute(query, (entry.timestamp, entry.body))
-            self.connection.commit()
+            with self.connection:
+                body_id = store_body(
+                    self.connection,
+                    entry.body,
+                    codec=self.body_codec,
+                    threshold=self.body_compression_threshold,
+                )
+                cursor = self.connection.execute(
+                    query, (entry.timestamp, body_id, count_words(entry.body))
+                )
+                index_bodies(self.connection, [(cursor.lastrowid, entry.body)])
+                self._add_tags(
+                    cursor.lastrowid, entry.timestamp, extract_tags(entry.body)
+                )
+                self._add_vectors([cursor.lastrowid], [entry.body])
 
             new_id = cursor.lastrowid
 
             logger.info(
-                f"Inserted entry for timestamp {str(entry.timestamp)} at entry_id {str(new_id)}"
+                "Inserted entry for timestamp %s at entry_id %s",
+                entry.timestamp,
+                new_id,
             )
 
         except sqlite3.Error as e:
-            logger.error(f"Failed to insert entry into database: {e}")
+            logger.error("Failed to insert entry into database: %s", e)
 
-    def update_entry(self, old_entry, new_entry):
+    def add_entries(self, entries, checkpoints=None):
+        # Bulk path for imports: one transaction per batch, and the import
+        # checkpoints are committed together with the entries they cover.
         try:
             with self.connection:
+                self.connection.execute("INSERT INTO fts_deferred VALUES (1)")
+                last_id = self.connection.execute(
+                    "SELECT coalesce(max(entry_id), 0) FROM entries"
+                ).fetchone()[0]
+
+                digests = store_bodies(
+                    self.connection,
+                    [entry.body for entry in entries],
+                    self.body_codec,
+                    self.body_compression_threshold,
+                )
+                self.connection.executemany(
+                    """
+                    INSERT INTO entries (timestamp, body_id, word_count)
+                    SELECT ?, body_id, ? FROM bodies WHERE hash = ?
+                    """,
+                    (
+                        (entry.timestamp, count_words(entry.body), digest)
+                        for entry, digest in zip(entries, digests)
+                    ),
+                )
+
+                # AUTOINCREMENT hands out ids in insertion order
+                entry_ids = self.connection.execute(
+                    "SELECT entry_id FROM entries WHERE entry_id > ? ORDER BY entry_id",
+                    (last_id,),
+                ).fetchall()
+                self.connection.executemany(
+                    "INSERT INTO entry_tags (tag, timestamp, entry_id) VALUES (?, ?, ?)",
+                    (
+                        (tag, entry.timestamp, entry_id)
+                        for entry, (entry_id,) in zip(entries, entry_ids)
+                        for tag in extract_tags(entry.body)
+                    ),
+                )
+                self._add_vectors(
+                    [entry_id for (entry_id,) in entry_ids],
+                    [entry.body for entry in entries],
+                )
+
+                index_bodies(
+                    self.connection,
+                    (
+                        (entry_id, entry.body)
+                        for entry, (entry_id,) in zip(entries, entry_ids)
+                    ),
+                )
                 self.connection.execute(
                     """
-                    INSERT INTO entries_history (entry_id, timestamp, body, archived_at)
-                    SELECT entry_id, timestamp, body, ?
+                    INSERT INTO daily_stats (day, entries, words)
+                    SELECT date(timestamp / 1000000, 'unixepoch'), count(*), sum(word_count)
                     FROM entries
-                    WHERE entry_id = ?;
-                """,
-                    (str(new_entry.timestamp), old_entry.uid),
+                    WHERE entry_id > ?
+                    GROUP BY 1
+                    ON CONFLICT (day) DO UPDATE SET
+                        entries = entries + excluded.entries,
+                        words = words + excluded.words
+                    """,
+                    (last_id,),
                 )
+                self.connection.execute("DELETE FROM fts_deferred")
+
+                self.connection.executemany(
+                    """
+                    INSERT INTO import_progress (source, position, completed, size, mtime_ns)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (source) DO UPDATE SET
+                        position = excluded.position,
+                        completed = excluded.completed,
+                        size = excluded.size,
+                        mtime_ns = excluded.mtime_ns
+                    """,
+                    checkpoints or (),
+                )
+
+            logger.info("Inserted batch of %s entries", len(entries))
+
+        except sqlite3.Error as e:
+            logger.error("Failed to insert batch of %s entries: %s", len(entries), e)
+            raise
+
+    def get_import_progress(self) -> dict:
+        cursor = self.connection.execute(
+            "SELECT source, position, completed, size, mtime_ns FROM import_progress"
+        )
+
+        return {
+            source: (position, bool(completed), size, mtime_ns)
+            for source, position, completed, size, mtime_ns in cursor
+        }
+
+    def update_entry(self, old_entry, new_entry):
+        if find_archive(self.connection, old_entry.uid) is not None:
+            return self._update_archived_entry(old_entry, new_entry)
+
+        digest = body_hash(new_entry.body)
+
+        try:
+            with self.connection:
+                row = self.connection.execute(
+                    """
+                    SELECT e.timestamp, e.body_id, b.hash
+                    FROM entries e
+                    JOIN bodies b ON b.body_id = e.body_id
+                    WHERE e.entry_id = ?;
+                    """,
+                    (old_entry.uid,),
+                ).fetchone()
+
+                if row is None:
+                    logger.warning("No entry found for uid %s", old_entry.uid)
+                    return False
+
+                timestamp, body_id, old_digest = row
+
+                if digest == old_digest:
+                    logger.info(
+                        "Entry %s is unchanged, nothing to write", old_entry.uid
+                    )
+                    return False
+
+                archive_version(
+                    self.connection,
+                    old_entry.uid,
+                    timestamp,
+                    body_id,
+                    new_entry.timestamp,
+                    self.history_keyframe_interval,
+                )
+                unindex_bodies(self.connection, "e.entry_id = ?", (old_entry.uid,))
 
                 self.connection.execute(
                     """
                     UPDATE entries
-                    SET body = ?,
+                    SET body_id = ?,
+                        word_count = ?,
                         updated_at = ?
                     WHERE entry_id = ?;
                 """,
-                    (new_entry.body, str(new_entry.timestamp), old_entry.uid),
+                    (
+                        store_body(
+                            self.connection,
+                            new_entry.body,
+                            digest,
+                            self.body_codec,
+                            self.body_compression_threshold,
+                        ),
+                        count_words(new_entry.body),
+                        new_entry.timestamp,
+                        old_entry.uid,
+                    ),
+                )
+                index_bodies(self.connection, [(old_entry.uid, new_entry.body)])
+                self._update_tags(
+                    old_entry.uid, timestamp, extract_tags(new_entry.body)
                 )
+                self._add_vectors([old_entry.uid], [new_entry.body])
 
-                logger.info(f"Updated entry for uid {str(old_entry.uid)}")
+                logger.info("Updated entry for uid %s", old_entry.uid)
+                return True
 
         except sqlite3.Error as e:
-            logger.error(f"Failed to update entry for {str(old_entry.uid)}: {e}")
+            logger.error("Failed to update entry for %s: %s", old_entry.uid, e)
+            return False
+
+    def _update_archived_entry(self, old_entry, new_entry):
+        def update(archive):
+            updated = archive.update_entry(old_entry, new_entry)
+
+            if updated:
+                # The diary's vector_changes is all related entries watch
+                self.connection.execute(
+                    "UPDATE vector_changes SET removed = removed + 1"
+                )
+
+            return updated
+
+        try:
+            return self._write_archive(old_entry.uid, update)
+
+        except sqlite3.Error as e:
+            logger.error("Failed to update archived entry %s: %s", old_entry.uid, e)
+            return False
+
+    def _add_tags(self, entry_id, timestamp, tags):
+        # Inside the caller's transaction, with the entry change it indexes
+        self.connection.executemany(
+            "INSERT INTO entry_tags (tag, timestamp, entry_id) VALUES (?, ?, ?)",
+            ((tag, timestamp, entry_id) for tag in tags),
+        )
+
+    def _update_tags(self, entry_id, timestamp, tags):
+        old_tags = {
+            tag
+            for (tag,) in self.connection.execute(
+                "SELECT tag FROM entry_tags WHERE entry_id = ?", (entry_id,)
+            )
+        }
+
+        self.connection.executemany(
+            "DELETE FROM entry_tags WHERE tag = ? AND entry_id = ?",
+            ((tag, entry_id) for tag in old_tags - tags),
+        )
+        self._add_tags(entry_id, timestamp, tags - old_tags)
+
+    def _add_vectors(self, entry_ids, bodies):
+        # Replacing gives an edited entry a new vector_id, see RelatedIndex
+        self.connection.executemany(
+            """
+            INSERT OR REPLACE INTO entry_vectors (entry_id, terms, counts)
+            VALUES (?, ?, ?)
+            """,
+            (
+                (entry_id, *term_vector(body))
+                for entry_id, body in zip(entry_ids, bodies)
+            ),
+        )
+
+    def get_vector_state(self):
+        # Only reads the diary, archives aren't attached for this. New
+        # vectors raise the last vector_id, anything else vector_changes or
+        # the archives' generations (see migration 014).
+        return self.connection.execute(
+            """
+            SELECT
+                (SELECT coalesce(max(vector_id), 0) FROM entry_vectors),
+                (SELECT removed FROM vector_changes),
+                (SELECT group_concat(year || '.' || generation, ' ')
+                 FROM (SELECT year, generation FROM archives ORDER BY year))
+            """
+        ).fetchone()
+
+    def iter_entry_vectors(self, after=None):
+        partitions = ["main"] if after is not None else self._partitions()
+
+        for schema in partitions:
+            yield from self.connection.execute(
+                f"""
+                SELECT entry_id, terms, counts
+                FROM {schema}.entry_vectors
+                WHERE vector_id > ?
+                ORDER BY vector_id
+                """,
+                (after or 0,),
+            ).fetchall()
+
+    def add_attachment(self, uid, path, name, mime_type, digest):
+        if find_archive(self.connection, uid) is not None:
+            return self._write_archive(
+                uid,
+                lambda archive: archive.add_attachment(
+                    uid, path, name, mime_type, digest
+                ),
+            )
+
+        size = path.stat().st_size
+
+        if size > self.connection.getlimit(sqlite3.SQLITE_LIMIT_LENGTH):
+            raise ValueError(f"{path} is too large to store in the database")
+
+        with self.connection:
+            if not self.connection.execute(
+                "SELECT 1 FROM entries WHERE entry_id = ?", (uid,)
+            ).fetchone():
+                logger.warning("No entry found for uid %s", uid)
+                return None
+
+            row = self.connection.execute(
+                "SELECT attachment_id, size FROM attachments WHERE hash = ?",
+                (digest,),
+            ).fetchone()
+
+            if row is None:
+                # zeroblob() reserves the space without building the payload
+                # in memory, it is then streamed in chunk by chunk
+                attachment_id = self.connection.execute(
+                    "INSERT INTO attachments (hash, size) VALUES (?, ?)",
+                    (digest, size),
+                ).lastrowid
+                self.connection.execute(
+                    "INSERT INTO attachment_data (attachment_id, data) VALUES (?, zeroblob(?))",
+                    (attachment_id, size),
+                )
+
+                with self.connection.blobopen(
+                    "attachment_data", "data", attachment_id
+                ) as blob:
+                    copy_verified(path, blob, digest, size)
+
+                logger.info("Stored %s bytes from %s", size, path)
+            else:
+                attachment_id, size = row
+                logger.info("%s is already stored, only linking it", path)
+
+            self.connection.execute(
+                """
+                INSERT INTO entry_attachments (entry_id, name, attachment_id, mime_type)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (entry_id, name) DO UPDATE SET
+                    attachment_id = excluded.attachment_id,
+                    mime_type = excluded.mime_type
+                """,
+                (uid, name, attachment_id, mime_type),
+            )
+
+        return Attachment(digest, name, mime_type, size)
+
+    def get_entry_attachments(self, uid) -> list:
+        return [
+            attachment
+            for _, attachment in self._fetch_attachments(
+                self._schema_of(uid), "WHERE l.entry_id = ?", (uid,)
+            )
+        ]
+
+    def get_attachments(self, entries) -> dict:
+        if not entries:
+            return {}
+
+        # Only the partitions the entries' time span falls in can hold them
+        uids = [entry.uid for entry in entries]
+        since = min(entry.timestamp for entry in entries)
+        until = max(entry.timestamp for entry in entries) + timedelta(microseconds=1)
+        where = f"WHERE l.entry_id IN ({', '.join('?' * len(uids))})"
+
+        index = {}
+        for schema in self._partitions(since, until):
+            for uid, attachment in self._fetch_attachments(schema, where, uids):
+                index.setdefault(uid, []).append(attachment)
+
+        return index
+
+    def open_attachment(self, prefix):
+        # Handles are hash prefixes, so this is a range on the hash index.
+        # The first partition storing a match answers.
+        for schema in self._partitions():
+            rows = self.connection.execute(
+                f"""
+                SELECT a.attachment_id, a.hash, a.size, l.name, l.mime_type
+                FROM {schema}.attachments a
+                JOIN {schema}.entry_attachments l
+                    ON l.attachment_id = a.attachment_id
+                WHERE a.hash BETWEEN ? AND ?
+                GROUP BY a.attachment_id
+                LIMIT 2
+                """,
+                (
+                    prefix.ljust(HASH_SIZE, b"\x00"),
+                    prefix.ljust(HASH_SIZE, b"\xff"),
+                ),
+            ).fetchall()
+
+            if rows:
+                break
+        else:
+            return None
+
+        if len(rows) > 1:
+            raise ValueError(f"Attachment handle {prefix.hex()} is ambiguous")
+
+        attachment_id, digest, size, name, mime_type = rows[0]
+        blob = self.connection.blobopen(
+            "attachment_data", "data", attachment_id, readonly=True, name=schema
+        )
+
+        return Attachment(digest, name, mime_type, size), blob
+
+    def _fetch_attachments(self, schema, where="", params=()):
+        rows = self.connection.execute(
+            f"""
+            SELECT l.entry_id, a.hash, l.name, l.mime_type, a.size
+            FROM {schema}.entry_attachments l
+            JOIN {schema}.attachments a ON a.attachment_id = l.attachment_id
+            {where}
+            ORDER BY l.entry_id, l.name
+            """,
+            params,
+        )
+
+        return [
+            (uid, Attachment(digest, name, mime_type, size))
+            for uid, digest, name, mime_type, size in rows
+        ]
+
+    def get_entry_history(self, uid) -> list:
+        if (archive := self._open_archive(uid)) is not None:
+            with archive:
+                return archive.get_entry_history(uid)
+
+        return get_versions(self.connection, uid)
+
+    def get_entry_version(self, uid, version):
+        if (archive := self._open_archive(uid)) is not None:
+            with archive:
+                return archive.get_entry_version(uid, version)
+
+        row = load_version(self.connection, uid, version)
+
+        if row is None:
+            logger.warning("No version %s found for uid %s", version, uid)
+            return None
+
+        timestamp, body = row
+        return Entry(timestamp=timestamp, body=body, storage_type="database", uid=uid)
 
     def open_entry(self, body, timestamp):
         pass
 
     def get_entries(self) -> list:
-        query = """
-        SELECT entry_id, timestamp, body
-        FROM entries
-        ORDER BY entry_id DESC
+        entries = list(self.iter_entries())
+        logger.info("Found %s entries", len(entries))
+        return entries
+
+    def iter_entries(self, page_size=None, since=None, until=None, tag=None):
+        return self._iter_pages(self.get_entries_page, page_size, since, until, tag)
+
+    def iter_entry_headers(self, page_size=None, since=None, until=None, tag=None):
+        return self._iter_pages(
+            self.get_entry_headers_page, page_size, since, until, tag
+        )
+
+    def get_entries_page(
+        self, before=None, limit=None, since=None, until=None, tag=None
+    ):
+        rows = self._fetch_page(body_column(), before, limit, since, until, tag)
+
+        return [
+            Entry(
+                timestamp=timestamp,
+                body=body,
+                storage_type="database",
+                uid=id,
+            )
+            for id, timestamp, body in rows
+        ]
+
+    def get_entry_headers_page(
+        self, before=None, limit=None, since=None, until=None, tag=None
+    ):
+        # Only a prefix of the body is read, the rest is loaded by get_entry()
+        # when the entry is actually opened.
+        rows = self._fetch_page(
+            preview_column(PREVIEW_LENGTH * 4), before, limit, since, until, tag
+        )
+
+        return [
+            EntryHeader(
+                uid=id,
+                timestamp=timestamp,
+                preview=make_preview(body_prefix),
+                storage_type="database",
+            )
+            for id, timestamp, body_prefix in rows
+        ]
+
+    def iter_entry_headers_matching(
+        self, words, page_size=None, since=None, until=None, tag=None
+    ):
+        # Walks the FTS index in its own rowid order: ordering by timestamp
+        # would have to collect every match before returning the first page.
+        # Partitions are walked one after the other, the diary first.
+        match = " ".join(_quote_fts_query(word) + "*" for word in words)
+        page_size = page_size or self.page_size
+
+        for schema in self._partitions(since, until):
+            yield from self._match_partition(
+                schema, match, page_size, since, until, tag
+            )
+
+    def _match_partition(self, schema, match, page_size, since, until, tag):
+        before = None
+
+        while True:
+            where, params = _range_conditions("e.timestamp", since, until, tag, schema)
+
+            if before is not None:
+                where.append("entries_fts.rowid < ?")
+                params.append(before)
+
+            # CROSS JOIN keeps the planner from driving the query from entries
+            query = f"""
+            SELECT e.entry_id, e.timestamp, {preview_column(PREVIEW_LENGTH * 4)}
+            FROM {schema}.entries_fts
+            CROSS JOIN {schema}.entries e ON e.entry_id = entries_fts.rowid
+            JOIN {schema}.bodies b ON b.body_id = e.body_id
+            WHERE entries_fts MATCH ? {"".join(" AND " + term for term in where)}
+            ORDER BY entries_fts.rowid DESC
+            LIMIT ?
+            """
+
+            try:
+                rows = self.connection.execute(
+                    query, (match, *params, page_size)
+                ).fetchall()
+            except sqlite3.Error as e:
+                logger.error("Failed to match entries on %s: %s", match, e)
+                return
+
+            yield from (
+                EntryHeader(
+                    uid=id,
+                    timestamp=timestamp,
+                    preview=make_preview(body_prefix),
+                    storage_type="database",
+                )
+                for id, timestamp, body_prefix in rows
+            )
+
+            if len(rows) < page_size:
+                return
+
+            before = rows[-1][0]
+
+    def _fetch_page(
+        self, body_column, before=None, limit=None, since=None, until=None, tag=None
+    ) -> list:
+        # The diary's page is merged with the same page of each archive,
+        # newest first. Archives hold one year each, so once the page is
+        # full of rows newer than an archive's last entry, neither it nor
+        # any older one can add to it and they aren't even attached.
+        limit = limit or self.page_size
+        rows = self._fetch_partition_page(
+            "main", body_column, before, limit, since, until, tag
+        )
+
+        for archive in list_archives(self.connection, since, until):
+            *_, first, last = archive
+
+            if len(rows) == limit and rows[-1][1] > last:
+                break
+
+            if before is not None and first > before[0]:
+                continue
+
+            archived = self._fetch_partition_page(
+                self._attach(archive), body_column, before, limit, since, until, tag
+            )
+            rows = list(
+                islice(heapq.merge(rows, archived, key=_page_key, reverse=True), limit)
+            )
+
+        return rows
+
+    def _fetch_partition_page(
+        self, schema, body_column, before, limit, since, until, tag
+    ) -> list:
+        # Keyset pagination on the entries_timestamp index: seek past the
+        # (timestamp, uid) of the last row returned instead of using OFFSET,
+        # so every page costs the same regardless of depth, and a date range
+        # only touches the rows inside it. A tag walks the entry_tags primary
+        # key the same way.
+        keys = "t" if tag is not None else "e"
+        where, params = _range_conditions(f"{keys}.timestamp", since, until)
+
+        if tag is not None:
+            where.insert(0, "t.tag = ?")
+            params.insert(0, tag)
+
+        if before is not None:
+            where.append(f"({keys}.timestamp, {keys}.entry_id) < (?, ?)")
+            params.extend(before)
+
+        query = f"""
+        SELECT e.entry_id, e.timestamp, {body_column}
+        FROM {f"{schema}.entry_tags t CROSS JOIN " if tag is not None else ""}
+        {schema}.entries e
+        {"ON e.entry_id = t.entry_id" if tag is not None else ""}
+        JOIN {schema}.bodies b ON b.body_id = e.body_id
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY {keys}.timestamp DESC, {keys}.entry_id DESC
+        LIMIT ?
         """
 
         try:
-            cursor = self.connection.cursor()
-            cursor.execute(query)
-            self.connection.commit()
+            rows = self.connection.execute(query, (*params, limit)).fetchall()
+
+            logger.debug("Fetched page of %s entries before %s", len(rows), before)
+            return rows
+
+        except sqlite3.Error as e:
+            logger.error("Failed to fetch entries: %s", e)
+            return []
 
-            entries = []
+    def get_entry(self, uid):
+        try:
+            schema = self._schema_of(uid)
+            row = self.connection.execute(
+                f"""
+                SELECT e.entry_id, e.timestamp, {body_column()}
+                FROM {schema}.entries e
+                JOIN {schema}.bodies b ON b.body_id = e.body_id
+                WHERE e.entry_id = ?
+                """,
+                (uid,),
+            ).fetchone()
 
-            for row in cursor:
-                logger.info(f"Found row: {row}")
+        except sqlite3.Error as e:
+            logger.error("Failed to fetch entry %s: %s", uid, e)
+            return None
 
-                id = row[0]
-                timestamp = row[1]
-                body = row[2]
+        if row is None:
+            logger.warning("No entry found for uid %s", uid)
+            return None
 
-                entry = Entry(
+        id, timestamp, body = row
+        return Entry(timestamp=timestamp, body=body, storage_type="database", uid=id)
+
+    def get_daily_stats(self, since=None, until=None) -> list:
+        first, last = day_bounds(since, until)
+        where, params = [], []
+
+        if first is not None:
+            where.append("day >= ?")
+            params.append(first.isoformat())
+
+        if last is not None:
+            where.append("day <= ?")
+            params.append(last.isoformat())
+
+        # The diary can hold days of archived years too
+        totals = {}
+
+        for schema in self._partitions(since, until):
+            rows = self.connection.execute(
+                f"""
+                SELECT day, entries, words
+                FROM {schema}.daily_stats
+                {"WHERE " + " AND ".join(where) if where else ""}
+                """,
+                params,
+            )
+
+            for day, entries, words in rows:
+                total = totals.setdefault(day, [0, 0])
+                total[0] += entries
+                total[1] += words
+
+        return [
+            (date.fromisoformat(day), entries, words)
+            for day, (entries, words) in sorted(totals.items())
+        ]
+
+    def get_longest_entries(self, limit=None, since=None, until=None) -> list:
+        where, params = _range_conditions("e.timestamp", since, until)
+        limit = limit or DEFAULT_STATS_LIMIT
+
+        rows = islice(
+            heapq.merge(
+                *(
+                    self.connection.execute(
+                        f"""
+                        SELECT e.entry_id, e.timestamp,
+                               {preview_column(PREVIEW_LENGTH * 4)}, e.word_count
+                        FROM {schema}.entries e
+                        JOIN {schema}.bodies b ON b.body_id = e.body_id
+                        {"WHERE " + " AND ".join(where) if where else ""}
+                        ORDER BY e.word_count DESC
+                        LIMIT ?
+                        """,
+                        (*params, limit),
+                    ).fetchall()
+                    for schema in self._partitions(since, until)
+                ),
+                key=lambda row: row[3],
+                reverse=True,
+            ),
+            limit,
+        )
+
+        return [
+            (
+                EntryHeader(
+                    uid=id,
                     timestamp=timestamp,
-                    body=body,
+                    preview=make_preview(body_prefix),
                     storage_type="database",
-                    uid=id,
+                ),
+                word_count,
+            )
+            for id, timestamp, body_prefix, word_count in rows
+        ]
+
+    def get_tag_counts(self, since=None, until=None) -> list:
+        # Counted from the index alone, bodies are never read
+        where, params = _range_conditions("timestamp", since, until)
+        counts = Counter()
+
+        for schema in self._partitions(since, until):
+            counts.update(
+                dict(
+                    self.connection.execute(
+                        f"""
+                        SELECT tag, count(*)
+                        FROM {schema}.entry_tags
+                        {"WHERE " + " AND ".join(where) if where else ""}
+                        GROUP BY tag
+                        """,
+                        params,
+                    )
                 )
+            )
+
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+
+    def rebuild_stats(self):
+        # Recount only drifted rows, then recompute the per-day totals
+        self.connection.create_function(
+            "count_words", 1, count_words, deterministic=True
+        )
+
+        with self.connection:
+            recounted = self.connection.execute(
+                """
+                UPDATE entries
+                SET word_count = counted.word_count
+                FROM (
+                    SELECT body_id, count_words(body_text(body, codec)) AS word_count
+                    FROM bodies
+                ) AS counted
+                WHERE counted.body_id = entries.body_id
+                  AND entries.word_count != counted.word_count
+                """
+            ).rowcount
+
+            self.connection.execute("DELETE FROM daily_stats")
+            self.connection.execute(
+                """
+                INSERT INTO daily_stats (day, entries, words)
+                SELECT date(timestamp / 1000000, 'unixepoch'), count(*), sum(word_count)
+                FROM entries
+                GROUP BY 1
+                """
+            )
+            # Also catches up with entries written by other tools, see
+            # lifelog.storage.bodies
+            self.connection.execute(
+                "INSERT INTO entries_fts (entries_fts) VALUES ('rebuild')"
+            )
+
+        logger.info("Rebuilt statistics, recounted %s entries", recounted)
 
-                entries.append(entry)
+        for archive in list_archives(self.connection):
+            with DatabaseStorage(self.config, self._archive_path(archive[2])) as cold:
+                cold.rebuild_stats()
 
-            logger.info(f"Found {len(entries)} entries")
-            return entries
+    def backup(self, path, pages_per_step, progress=None):
+        """Copies the database into a new database file at `path`.
+
+        Runs on its own connection, `pages_per_step` pages at a time. In WAL
+        mode the whole copy reads from one snapshot, so writers are never
+        blocked and don't make the copy start over; in the other journal
+        modes writers only wait for the step in progress.
+        """
+        self._copy_database(self.db_path, path, pages_per_step, progress)
+
+    def backup_archives(self, snapshot, folder, pages_per_step) -> list:
+        """Copies the archives a backup of the diary at `snapshot` refers to
+        into `folder`, under the names its archives table knows them by.
+
+        Returns the paths written. Raises FileNotFoundError when one of them
+        was replaced by `lifelog archive` after the snapshot was taken.
+        """
+        connection = sqlite3.connect(f"{Path(snapshot).as_uri()}?mode=ro", uri=True)
+
+        try:
+            files = [
+                file
+                for (file,) in connection.execute(
+                    "SELECT file FROM archives ORDER BY year"
+                )
+            ]
+        finally:
+            connection.close()
+
+        copies = []
+        for file in files:
+            copy = Path(folder) / file
+            copy.parent.mkdir(parents=True, exist_ok=True)
+            self._copy_database(self._archive_path(file), copy, pages_per_step)
+            copies.append(copy)
+
+        return copies
+
+    def _copy_database(self, source_path, path, pages_per_step, progress=None):
+        source = connect(source_path, self.config.storage)
+        target = sqlite3.connect(path)
+
+        try:
+            wal = source.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            if wal:
+                source.execute("BEGIN")
+                source.execute("SELECT count(*) FROM sqlite_schema").fetchone()
+
+            source.backup(target, pages=pages_per_step, progress=progress)
+
+            # The snapshot is a standalone file, not a WAL database
+            target.execute("PRAGMA journal_mode = delete")
+
+            if wal:
+                source.rollback()
+
+        finally:
+            target.close()
+            source.close()
+
+        logger.info("Backed up %s to %s", source_path, path)
+
+    def archive(self, before, progress=None):
+        """Moves the entries written before the year `before` out of the
+        diary, into one archive database per year (see storage/archives.py).
+
+        Calls progress(year, moved) after each year and returns the number
+        of entries moved. The diary is vacuumed afterwards to shrink it.
+        """
+        years = [
+            int(year)
+            for (year,) in self.connection.execute(
+                "SELECT DISTINCT substr(day, 1, 4) FROM daily_stats WHERE day < ?",
+                (f"{before:04d}",),
+            )
+        ]
+        total = 0
+
+        for year in sorted(years):
+            moved = self._archive_year(year)
+            total += moved
+
+            if progress is not None:
+                progress(year, moved)
+
+        if total:
+            # FTS5 only records deletions, merging its segments drops them
+            with self.connection:
+                self.connection.execute(
+                    "INSERT INTO entries_fts (entries_fts) VALUES ('optimize')"
+                )
+            self.connection.execute("VACUUM")
+            logger.info("Vacuumed %s after archiving %s entries", self.db_path, total)
+
+        return total
+
+    def _archive_year(self, year) -> int:
+        self.archive_folder.mkdir(parents=True, exist_ok=True)
+
+        for _ in range(ARCHIVE_ATTEMPTS):
+            # Built from another connection without locking the diary, the
+            # move only goes ahead if nothing was written in the meantime,
+            # edits of archived entries included (see _write_archive)
+            version = self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+            # Looked up again on every attempt, another run may have
+            # replaced the archive in the meantime
+            existing = self.connection.execute(
+                "SELECT generation, file FROM archives WHERE year = ?", (year,)
+            ).fetchone()
+            generation = existing[0] + 1 if existing else 1
+            file = archive_name(self.db_path.stem, year, generation)
+            path = self.archive_folder / file
+            partial = path.with_name(file + PARTIAL_SUFFIX)
+
+            try:
+                stats = build_archive(
+                    self.db_path,
+                    partial,
+                    year,
+                    self.schemas_path,
+                    existing and self._archive_path(existing[1]),
+                )
+
+                if not stats[0]:
+                    return 0
+
+                with self.connection:
+                    self.connection.execute("BEGIN IMMEDIATE")
+
+                    if (
+                        self.connection.execute("PRAGMA data_version").fetchone()[0]
+                        != version
+                    ):
+                        logger.info("Diary changed while archiving %s, retrying", year)
+                        continue
+
+                    self._remove_stale_archives(keep=partial)
+                    partial.replace(path)
+                    record_archive(
+                        self.connection, year, generation, file, stats, datetime.now()
+                    )
+
+            finally:
+                partial.unlink(missing_ok=True)
+
+            logger.info("Archived %s entries of %s to %s", stats[0], year, path)
+            break
+
+        else:
+            raise sqlite3.OperationalError(
+                f"The diary kept changing while archiving {year}, try again later"
+            )
+
+        if existing:
+            self._remove_archive_file(
+                schema_name(year, existing[0]), self.archive_folder / existing[1]
+            )
+
+        return stats[0]
+
+    def _remove_stale_archives(self, keep):
+        # Left behind by an interrupted run, only while holding the write
+        # lock, so no other run is between renaming and recording its file
+        used = {
+            file for (file,) in self.connection.execute("SELECT file FROM archives")
+        }
+
+        for path in self.archive_folder.iterdir():
+            if (
+                path != keep
+                and path.name not in used
+                and is_archive_file(self.db_path.stem, path.name)
+            ):
+                logger.info("Removing stale archive %s", path)
+                path.unlink(missing_ok=True)
+
+    def _remove_archive_file(self, schema, path):
+        if schema in self._attached:
+            self.connection.execute(f"DETACH DATABASE {schema}")
+            del self._attached[schema]
+
+        try:
+            for suffix in ("", "-wal", "-shm"):
+                path.with_name(path.name + suffix).unlink(missing_ok=True)
+        except OSError as e:
+            # Still open elsewhere on some platforms, the next run removes it
+            logger.warning("Could not remove old archive %s: %s", path, e)
+
+    def search_entries(
+        self, query, limit=None, since=None, until=None, tag=None
+    ) -> list:
+        limit = limit or DEFAULT_SEARCH_LIMIT
+
+        try:
+            # Each partition ranks its own matches, the best of them win
+            rows = list(
+                islice(
+                    heapq.merge(
+                        *(
+                            self._search_partition(
+                                schema, query, limit, since, until, tag
+                            )
+                            for schema in self._partitions(since, until)
+                        ),
+                        key=lambda row: row[4],
+                    ),
+                    limit,
+                )
+            )
+
+            logger.info("Search '%s' matched %s entries", query, len(rows))
+
+            return [
+                (
+                    Entry(
+                        timestamp=timestamp,
+                        body=body,
+                        storage_type="database",
+                        uid=id,
+                    ),
+                    snippet,
+                )
+                for id, timestamp, body, snippet, _ in rows
+            ]
 
         except sqlite3.Error as e:
-            logger.error(f"Failed to fetch entries: {e}")
+            logger.error("Failed to search entries for '%s': %s", query, e)
+            return []
+
+    def _search_partition(self, schema, query, limit, since, until, tag) -> list:
+        where, params = _range_conditions("e.timestamp", since, until, tag, schema)
+
+        sql = f"""
+        SELECT e.entry_id, e.timestamp, {body_column()},
+               snippet(entries_fts, 0, '[', ']', '...', 12), rank
+        FROM {schema}.entries_fts
+        JOIN {schema}.entries e ON e.entry_id = entries_fts.rowid
+        JOIN {schema}.bodies b ON b.body_id = e.body_id
+        WHERE entries_fts MATCH ? {"".join(" AND " + term for term in where)}
+        ORDER BY rank
+        LIMIT ?
+        """
+
+        try:
+            return self.connection.execute(sql, (query, *params, limit)).fetchall()
+        except sqlite3.OperationalError as e:
+            # Most likely FTS5 query syntax (e.g. a stray quote or colon),
+            # retry matching the words literally.
+            logger.info("Retrying search '%s' as plain words: %s", query, e)
+            return self.connection.execute(
+                sql, (_quote_fts_query(query), *params, limit)
+            ).fetchall()
+
+
+def _range_conditions(column, since=None, until=None, tag=None, schema="main"):
+    where, params = [], []
+
+    if tag is not None:
+        where.append(
+            f"e.entry_id IN (SELECT entry_id FROM {schema}.entry_tags WHERE tag = ?)"
+        )
+        params.append(tag)
+
+    if since is not None:
+        where.append(f"{column} >= ?")
+        params.append(since)
+
+    if until is not None:
+        where.append(f"{column} < ?")
+        params.append(until)
+
+    return where, params
+
+
+def _page_key(row):
+    return row[1], row[0]
+
+
+def _quote_fts_query(query):
+    return " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
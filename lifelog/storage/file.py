@@ -1,22 +1,768 @@
+import array
+import heapq
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import zlib
+
+from bisect import bisect_left, insort
+from contextlib import contextmanager
+from datetime import date
+from itertools import islice
+from pathlib import Path
+
+from lifelog.core import profiling
+from lifelog.core.attachments import Attachment, copy_verified
+from lifelog.core.constants import (
+    DEFAULT_STATS_LIMIT,
+    DEFAULT_SEARCH_LIMIT,
+    DEFAULT_SEGMENT_SIZE,
+    PREVIEW_LENGTH,
+)
+from lifelog.core.entry import Entry, EntryHeader, make_preview
+from lifelog.core.stats import count_words, day_bounds
+from lifelog.core.tags import extract_tags
+from lifelog.core.timestamps import from_epoch_us, to_epoch_us
 from lifelog.storage.base import Storage
 
+try:
+    import fcntl
+except ImportError:  # Windows, writers are not serialized across processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEBUG_MODE = os.getenv("DEBUG_MODE") == "1"
+
+# Segment record: magic, uid, timestamp, updated_at (both epoch microseconds,
+# updated_at 0 when never edited), body length, crc32 of the body. The UTF-8
+# body follows the header directly.
+RECORD_HEADER = struct.Struct("<4sQqqII")
+RECORD_MAGIC = b"LLE1"
+
+# Index record: uid, segment number, body offset, body length, timestamp.
+# The index is append-only too, the last record for a uid wins.
+INDEX_RECORD = struct.Struct("<QIQIq")
+
+# uid 0 is never handed out to entries, records with it hold import
+# checkpoints so they are made durable by the same fsync as their entries.
+CHECKPOINT_UID = 0
+
+# Listings are ordered by (timestamp, uid). Both are packed into one int,
+# timestamp in the high bits, which sorts the same way as the tuple but keeps
+# the in-memory order list at one small object per entry.
+UID_BITS = 32
+UID_MASK = (1 << UID_BITS) - 1
+
 
 class FileStorage(Storage):
+    """Append-only journal of segment files plus a sidecar offset index.
+
+    Every write appends a record to the newest segment, an edit is simply a
+    newer record for the same uid. index.bin maps each uid to the location of
+    its latest body, so listing never has to scan the segments, and bodies are
+    read through mmap. Anything in the segments that the index is missing
+    (e.g. after a crash between the two writes) is re-indexed on open.
+    """
+
     def __init__(self, config):
-        pass
+        self.config = config
+
+        if DEBUG_MODE:
+            self.folder = Path(__file__).parent.parent.parent / "dev_diary"
+        else:
+            self.folder = Path(self.config.paths["diary_folder"]).expanduser()
+        logger.info("Using diary folder %s", self.folder)
+
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.folder / "index.bin"
+        self.lock_path = self.folder / ".lock"
+        self.stats_path = self.folder / "stats.json"
+        self.word_counts_path = self.folder / "word_counts.bin"
+        # Payloads are stored once per content hash, attachments.json lists
+        # what each entry has attached
+        self.attachments_folder = self.folder / "attachments"
+        self.attachments_path = self.folder / "attachments.json"
+        self.segment_size = int(
+            self.config.storage.get("segment_size", DEFAULT_SEGMENT_SIZE)
+        )
+
+        self._index = {}  # uid -> (segment, offset, length, timestamp_us)
+        self._order = []  # sort keys, see order_key(), ascending
+        self._max_uid = 0
+        self._checkpoints = []  # (segment, offset, length)
+        self._index_size = 0
+        self._indexed_end = (1, 0)  # (segment, offset) after the last record
+        self._maps = {}
+
+        with profiling.span("storage.load_index"), self._locked():
+            self._load_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        for mapped in self._maps.values():
+            mapped.close()
+        self._maps = {}
 
     @property
     def type(self):
         return "file"
 
-    def add_entry(self, body, timestamp):
-        pass
+    def add_entry(self, entry):
+        uid = self._append([(None, entry.timestamp, None, entry.body)])[0]
+        logger.info("Appended entry for timestamp %s with uid %s", entry.timestamp, uid)
+
+    def add_entries(self, entries, checkpoints=None):
+        records = [(None, entry.timestamp, None, entry.body) for entry in entries]
+
+        if checkpoints:
+            records.append((CHECKPOINT_UID, None, None, json.dumps(list(checkpoints))))
+
+        self._append(records)
+        logger.info("Appended batch of %s entries", len(entries))
+
+    def get_import_progress(self) -> dict:
+        self._sync_index()
+
+        progress = {}
+        for segment, offset, length in self._checkpoints:
+            for source, position, completed, size, mtime_ns in json.loads(
+                self._read(segment, offset, length)
+            ):
+                progress[source] = (position, bool(completed), size, mtime_ns)
+
+        return progress
 
     def update_entry(self, old_entry, new_entry):
-        pass
+        self._sync_index()
+
+        if old_entry.uid not in self._index:
+            logger.warning("No entry found for uid %s", old_entry.uid)
+            return False
+
+        # The journal only grows, so don't append a copy of an unchanged body
+        segment, offset, length, _ = self._index[old_entry.uid]
+        body = new_entry.body.encode("utf-8")
+        if length == len(body) and self._read_bytes(segment, offset, length) == body:
+            logger.info("Entry %s is unchanged, nothing to write", old_entry.uid)
+            return False
+
+        self._append([(old_entry.uid, None, new_entry.timestamp, new_entry.body)])
+        logger.info("Updated entry for uid %s", old_entry.uid)
+        return True
+
+    def add_attachment(self, uid, path, name, mime_type, digest):
+        self._sync_index()
+
+        if uid not in self._index:
+            logger.warning("No entry found for uid %s", uid)
+            return None
+
+        payload_path = self._attachment_path(digest)
+
+        if not payload_path.exists():
+            payload_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = payload_path.with_suffix(".tmp")
+
+            try:
+                with open(temp_path, "wb") as f:
+                    copy_verified(path, f, digest)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                os.replace(temp_path, payload_path)
+            finally:
+                temp_path.unlink(missing_ok=True)
+
+            logger.info("Stored %s as %s", path, payload_path)
+        else:
+            logger.info("%s is already stored, only linking it", path)
+
+        size = payload_path.stat().st_size
+
+        with self._locked():
+            index = self._load_attachments()
+            records = [
+                record for record in index.get(str(uid), []) if record[0] != name
+            ]
+            records.append([name, digest.hex(), size, mime_type])
+            index[str(uid)] = sorted(records)
+
+            self._write_atomic(self.attachments_path, json.dumps(index).encode("utf-8"))
+
+        return Attachment(digest, name, mime_type, size)
+
+    def get_entry_attachments(self, uid) -> list:
+        return self._attachment_index().get(uid, [])
+
+    def get_attachments(self, entries) -> dict:
+        index = self._attachment_index()
+        return {entry.uid: index[entry.uid] for entry in entries if entry.uid in index}
+
+    def _attachment_index(self) -> dict:
+        return {
+            int(uid): [
+                Attachment(bytes.fromhex(digest), name, mime_type, size)
+                for name, digest, size, mime_type in records
+            ]
+            for uid, records in self._load_attachments().items()
+        }
+
+    def open_attachment(self, prefix):
+        matches = {
+            attachment.digest: attachment
+            for attachments in self._attachment_index().values()
+            for attachment in attachments
+            if attachment.digest.startswith(prefix)
+        }
+
+        if not matches:
+            return None
+
+        if len(matches) > 1:
+            raise ValueError(f"Attachment handle {prefix.hex()} is ambiguous")
+
+        attachment = next(iter(matches.values()))
+        return attachment, open(self._attachment_path(attachment.digest), "rb")
+
+    def _attachment_path(self, digest):
+        name = digest.hex()
+        return self.attachments_folder / name[:2] / name
+
+    def _load_attachments(self):
+        if not self.attachments_path.exists():
+            return {}
+
+        return json.loads(self.attachments_path.read_text())
+
+    def get_entry_history(self, uid) -> list:
+        records = self._uid_records(uid)
+
+        # A version was archived when the record after it was written
+        history = []
+        for version, (_, segment, offset, _, _) in enumerate(records[1:], start=1):
+            header = self._read_bytes(
+                segment, offset - RECORD_HEADER.size, RECORD_HEADER.size
+            )
+            history.append((version, from_epoch_us(RECORD_HEADER.unpack(header)[3])))
+
+        return history
+
+    def get_entry_version(self, uid, version):
+        records = self._uid_records(uid)
+
+        # The last record is the current body, not a past version
+        if not 1 <= version < len(records):
+            logger.warning("No version %s found for uid %s", version, uid)
+            return None
+
+        _, segment, offset, length, timestamp_us = records[version - 1]
+        return Entry(
+            timestamp=from_epoch_us(timestamp_us),
+            body=self._read(segment, offset, length),
+            storage_type="file",
+            uid=uid,
+        )
 
     def open_entry(self, body, timestamp):
         pass
 
     def get_entries(self) -> list:
-        pass
+        entries = list(self.iter_entries())
+        logger.info("Found %s entries", len(entries))
+        return entries
+
+    def iter_entries(self, page_size=None, since=None, until=None, tag=None):
+        return self._iter_pages(self.get_entries_page, page_size, since, until, tag)
+
+    def iter_entry_headers(self, page_size=None, since=None, until=None, tag=None):
+        return self._iter_pages(
+            self.get_entry_headers_page, page_size, since, until, tag
+        )
+
+    def get_entries_page(
+        self, before=None, limit=None, since=None, until=None, tag=None
+    ):
+        return [
+            self._make_entry(uid)
+            for uid in self._page_uids(before, limit, since, until, tag)
+        ]
+
+    def get_entry_headers_page(
+        self, before=None, limit=None, since=None, until=None, tag=None
+    ):
+        return [
+            self._make_header(uid)
+            for uid in self._page_uids(before, limit, since, until, tag)
+        ]
+
+    def get_entry(self, uid):
+        self._sync_index()
+
+        if uid not in self._index:
+            logger.warning("No entry found for uid %s", uid)
+            return None
+
+        return self._make_entry(uid)
+
+    def get_daily_stats(self, since=None, until=None) -> list:
+        days, _, _ = self._update_stats()
+        first, last = day_bounds(since, until)
+
+        return [
+            (day, entries, words)
+            for day, (entries, words) in sorted(
+                (date.fromisoformat(day), totals) for day, totals in days.items()
+            )
+            if (first is None or day >= first) and (last is None or day <= last)
+        ]
+
+    def get_longest_entries(self, limit=None, since=None, until=None) -> list:
+        _, word_counts, _ = self._update_stats()
+        start, end = self._range_bounds(since, until)
+
+        longest = heapq.nlargest(
+            limit or DEFAULT_STATS_LIMIT,
+            (
+                (word_counts[key & UID_MASK], key & UID_MASK)
+                for key in self._order[start:end]
+            ),
+        )
+
+        return [(self._make_header(uid), words) for words, uid in longest]
+
+    def get_tag_counts(self, since=None, until=None) -> list:
+        _, _, tags = self._update_stats()
+        start, end = self._range_bounds(since, until)
+
+        counts = {}
+        for key in self._order[start:end]:
+            for tag in tags.get(str(key & UID_MASK), ()):
+                counts[tag] = counts.get(tag, 0) + 1
+
+        return sorted(counts.items(), key=lambda count: (-count[1], count[0]))
+
+    def rebuild_stats(self):
+        with self._locked():
+            self.stats_path.unlink(missing_ok=True)
+            self.word_counts_path.unlink(missing_ok=True)
+
+        self._update_stats()
+
+    def search_entries(
+        self, query, limit=None, since=None, until=None, tag=None
+    ) -> list:
+        # No index to lean on here, so this is a scan over the latest bodies
+        words = [word.lower() for word in query.split()]
+        if not words:
+            return []
+
+        self._sync_index()
+
+        start, end = self._range_bounds(since, until)
+        tagged = self._tagged_uids(tag)
+
+        best = []
+        for key in reversed(self._order[start:end]):
+            uid = key & UID_MASK
+            if tagged is not None and uid not in tagged:
+                continue
+            body = self._read(*self._index[uid][:3]).lower()
+            if all(word in body for word in words):
+                score = sum(body.count(word) for word in words)
+                heapq.heappush(best, (score, uid))
+                if len(best) > (limit or DEFAULT_SEARCH_LIMIT):
+                    heapq.heappop(best)
+
+        results = []
+        for _, uid in sorted(best, reverse=True):
+            entry = self._make_entry(uid)
+            results.append((entry, make_snippet(entry.body, words)))
+
+        logger.info("Search '%s' matched %s entries", query, len(results))
+        return results
+
+    def _make_entry(self, uid):
+        segment, offset, length, timestamp_us = self._index[uid]
+
+        return Entry(
+            timestamp=from_epoch_us(timestamp_us),
+            body=self._read(segment, offset, length),
+            storage_type="file",
+            uid=uid,
+        )
+
+    def _make_header(self, uid):
+        segment, offset, length, timestamp_us = self._index[uid]
+        prefix = self._read(segment, offset, min(length, PREVIEW_LENGTH * 4))
+
+        return EntryHeader(
+            uid=uid,
+            timestamp=from_epoch_us(timestamp_us),
+            preview=make_preview(prefix),
+            storage_type="file",
+        )
+
+    def _update_stats(self):
+        # Statistics are caught up lazily: stats.json remembers how much of
+        # index.bin it has counted, and only the records appended since are
+        # read. word_counts.bin holds the word count of every uid so an edit
+        # can replace the old count without re-reading the old body. The tags
+        # of every tagged uid are kept in stats.json too.
+        with self._locked():
+            self._sync_index()
+
+            stats = {"index_size": 0, "max_uid": 0, "days": {}, "tags": {}}
+            word_counts = array.array("I")
+
+            if self.stats_path.exists() and self.word_counts_path.exists():
+                stats = json.loads(self.stats_path.read_text())
+                word_counts.frombytes(self.word_counts_path.read_bytes())
+
+            if stats["index_size"] == self._index_size:
+                return stats["days"], word_counts, stats["tags"]
+
+            with open(self.index_path, "rb") as f:
+                f.seek(stats["index_size"])
+                data = f.read(self._index_size - stats["index_size"])
+
+            days, tags = stats["days"], stats["tags"]
+            for uid, segment, offset, length, timestamp_us in INDEX_RECORD.iter_unpack(
+                data
+            ):
+                if uid == CHECKPOINT_UID:
+                    continue
+
+                if uid >= len(word_counts):
+                    word_counts.extend([0] * (uid + 1 - len(word_counts)))
+
+                body = self._read(segment, offset, length)
+                words = count_words(body)
+
+                if uid_tags := extract_tags(body):
+                    tags[str(uid)] = sorted(uid_tags)
+                else:
+                    tags.pop(str(uid), None)
+
+                totals = days.setdefault(
+                    from_epoch_us(timestamp_us).date().isoformat(), [0, 0]
+                )
+
+                # uids only grow, anything at or below the highest seen is an edit
+                if uid > stats["max_uid"]:
+                    totals[0] += 1
+                    stats["max_uid"] = uid
+                totals[1] += words - word_counts[uid]
+                word_counts[uid] = words
+
+            stats["index_size"] = self._index_size
+            self._write_atomic(self.word_counts_path, word_counts.tobytes())
+            self._write_atomic(self.stats_path, json.dumps(stats).encode("utf-8"))
+
+            return days, word_counts, tags
+
+    def _write_atomic(self, path, data):
+        temp_path = path.with_suffix(".tmp")
+        temp_path.write_bytes(data)
+        os.replace(temp_path, path)
+
+    def _uid_records(self, uid):
+        # Edits never overwrite, so every index record for a uid is one of its
+        # versions. Only the latest is kept in memory, history scans the file.
+        self._sync_index()
+
+        if not self.index_path.exists():
+            return []
+
+        with open(self.index_path, "rb") as f:
+            data = f.read(self._index_size)
+
+        return [record for record in INDEX_RECORD.iter_unpack(data) if record[0] == uid]
+
+    def _range_bounds(self, since=None, until=None):
+        # Slice of self._order with since <= timestamp < until
+        start = 0 if since is None else bisect_left(self._order, order_key(since, 0))
+        end = (
+            len(self._order)
+            if until is None
+            else bisect_left(self._order, order_key(until, 0))
+        )
+        return start, end
+
+    def _page_uids(self, before=None, limit=None, since=None, until=None, tag=None):
+        self._sync_index()
+
+        start, end = self._range_bounds(since, until)
+        if before is not None:
+            end = min(end, bisect_left(self._order, order_key(*before)))
+
+        if (tagged := self._tagged_uids(tag)) is not None:
+            # Walked in place, a page is usually found long before `start`
+            uids = (self._order[i] & UID_MASK for i in reversed(range(start, end)))
+            return list(
+                islice((uid for uid in uids if uid in tagged), limit or self.page_size)
+            )
+
+        start = max(start, end - (limit or self.page_size))
+
+        return [key & UID_MASK for key in reversed(self._order[start:end])]
+
+    def _tagged_uids(self, tag):
+        # No tag index in the journal, the tags are kept with the statistics
+        if tag is None:
+            return None
+
+        _, _, tags = self._update_stats()
+        return {int(uid) for uid, uid_tags in tags.items() if tag in uid_tags}
+
+    def _segment_path(self, segment):
+        return self.folder / f"segment-{segment:06d}.log"
+
+    def _read(self, segment, offset, length):
+        return self._read_bytes(segment, offset, length).decode(
+            "utf-8", errors="ignore"
+        )
+
+    def _read_bytes(self, segment, offset, length):
+        if length == 0:
+            return b""
+
+        mapped = self._maps.get(segment)
+
+        # The active segment keeps growing, remap it when reading past the end
+        if mapped is None or len(mapped) < offset + length:
+            if mapped is not None:
+                mapped.close()
+
+            with open(self._segment_path(segment), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+            self._maps[segment] = mapped
+
+        return mapped[offset : offset + length]
+
+    @contextmanager
+    def _locked(self):
+        with open(self.lock_path, "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _append(self, records):
+        with self._locked():
+            self._sync_index()
+            self._recover_segments()
+
+            segment, offset = self._indexed_end
+            index_records = []
+            uids = []
+
+            f = open(self._segment_path(segment), "ab")
+            try:
+                for uid, timestamp, updated_at, body in records:
+                    if offset >= self.segment_size:
+                        f.flush()
+                        os.fsync(f.fileno())
+                        f.close()
+
+                        segment, offset = segment + 1, 0
+                        f = open(self._segment_path(segment), "ab")
+
+                    if uid is None:
+                        uid = self._max_uid + 1
+                        uids.append(uid)
+                    elif uid != CHECKPOINT_UID:
+                        uids.append(uid)
+
+                    # Edits keep the original timestamp
+                    if timestamp is None:
+                        timestamp_us = self._index.get(uid, (0, 0, 0, 0))[3]
+                    else:
+                        timestamp_us = to_epoch_us(timestamp)
+
+                    updated_us = to_epoch_us(updated_at) if updated_at else 0
+                    data = body.encode("utf-8")
+
+                    f.write(
+                        RECORD_HEADER.pack(
+                            RECORD_MAGIC,
+                            uid,
+                            timestamp_us,
+                            updated_us,
+                            len(data),
+                            zlib.crc32(data),
+                        )
+                    )
+                    f.write(data)
+
+                    record = (
+                        uid,
+                        segment,
+                        offset + RECORD_HEADER.size,
+                        len(data),
+                        timestamp_us,
+                    )
+                    index_records.append(record)
+                    self._apply_index_record(record)
+                    offset += RECORD_HEADER.size + len(data)
+
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                f.close()
+
+            self._write_index(index_records)
+            return uids
+
+    def _write_index(self, index_records):
+        data = b"".join(INDEX_RECORD.pack(*record) for record in index_records)
+
+        with open(self.index_path, "ab") as f:
+            f.write(data)
+
+        self._index_size += len(data)
+
+    def _apply_index_record(self, record, ordered=True):
+        uid, segment, offset, length, timestamp_us = record
+
+        if uid == CHECKPOINT_UID:
+            self._checkpoints.append((segment, offset, length))
+        else:
+            # Edits keep the timestamp, so only new uids change the order
+            if uid not in self._index:
+                key = (timestamp_us << UID_BITS) | uid
+                if ordered:
+                    insort(self._order, key)
+                else:
+                    self._order.append(key)
+                self._max_uid = max(self._max_uid, uid)
+            self._index[uid] = (segment, offset, length, timestamp_us)
+
+        self._indexed_end = max(self._indexed_end, (segment, offset + length))
+
+    def _apply_index_records(self, records):
+        # Imports write entries out of date order, inserting each key in
+        # place would be quadratic on load: append them all, sort once
+        for record in records:
+            self._apply_index_record(record, ordered=False)
+
+        self._order.sort()
+
+    def _load_index(self):
+        if self.index_path.exists():
+            # Drop a torn trailing record, it'll be recovered from the segment
+            size = self.index_path.stat().st_size
+            whole = size - size % INDEX_RECORD.size
+            if whole != size:
+                logger.warning(
+                    "Truncating partial record at end of %s", self.index_path
+                )
+                os.truncate(self.index_path, whole)
+
+        self._sync_index()
+        self._recover_segments()
+
+        logger.info(
+            "Loaded index of %s entries from %s", len(self._order), self.index_path
+        )
+
+    def _sync_index(self):
+        # Pick up records appended by other processes since the last read
+        if not self.index_path.exists():
+            return
+
+        size = self.index_path.stat().st_size
+        if size <= self._index_size:
+            return
+
+        with open(self.index_path, "rb") as f:
+            f.seek(self._index_size)
+            data = f.read(size - self._index_size)
+
+        data = data[: len(data) - len(data) % INDEX_RECORD.size]
+        self._apply_index_records(INDEX_RECORD.iter_unpack(data))
+
+        self._index_size += len(data)
+
+    def _recover_segments(self):
+        # Must be called with the lock held
+        segment, offset = self._indexed_end
+        recovered = []
+
+        while self._segment_path(segment).exists():
+            path = self._segment_path(segment)
+            size = path.stat().st_size
+
+            with open(path, "rb") as f:
+                f.seek(offset)
+
+                while offset < size:
+                    header = f.read(RECORD_HEADER.size)
+                    if len(header) < RECORD_HEADER.size:
+                        break
+
+                    magic, uid, timestamp_us, _, length, crc = RECORD_HEADER.unpack(
+                        header
+                    )
+                    data = f.read(length) if magic == RECORD_MAGIC else b""
+                    if (
+                        magic != RECORD_MAGIC
+                        or len(data) < length
+                        or zlib.crc32(data) != crc
+                    ):
+                        break
+
+                    recovered.append(
+                        (
+                            uid,
+                            segment,
+                            offset + RECORD_HEADER.size,
+                            length,
+                            timestamp_us,
+                        )
+                    )
+                    offset += RECORD_HEADER.size + length
+
+            if offset < size:
+                logger.warning("Truncating torn record at %s:%s", path, offset)
+                os.truncate(path, offset)
+
+            segment, offset = segment + 1, 0
+
+        if recovered:
+            logger.warning("Re-indexing %s records missing from index", len(recovered))
+            self._apply_index_records(recovered)
+            self._write_index(recovered)
+
+
+def order_key(timestamp, uid):
+    return (to_epoch_us(timestamp) << UID_BITS) | uid
+
+
+def make_snippet(body, words, width=40):
+    lowered = body.lower()
+    position = min(
+        (index for index in map(lowered.find, words) if index >= 0), default=0
+    )
+
+    start = max(0, position - width)
+    end = min(len(body), position + width * 2)
+    snippet = body[start:end]
+
+    pattern = re.compile("|".join(map(re.escape, words)), re.IGNORECASE)
+    snippet = pattern.sub(lambda match: f"[{match.group(0)}]", snippet)
+
+    return ("..." if start > 0 else "") + snippet + ("..." if end < len(body) else "")
@@ -0,0 +1,157 @@
+"""Delta-compressed storage of past entry versions.
+
+Every edit archives the replaced body as the next version of the entry. A
+version is stored either as a keyframe, which keeps the replaced body alive
+in the bodies table by referring to it, or as a delta against the entry's
+latest keyframe. Deltas never chain, so any version is rebuilt from at most
+one keyframe and one delta, and a keyframe is written every
+`keyframe_interval` versions to keep deltas small.
+
+A delta is a compressed JSON list of `[start, end]` line ranges copied from
+the keyframe and strings of inserted text.
+"""
+
+import json
+import zlib
+
+from lifelog.core.constants import DEFAULT_HISTORY_KEYFRAME_INTERVAL
+from lifelog.storage.bodies import body_column
+
+COMPRESSION_LEVEL = 6
+
+
+def encode_keyframe(body) -> bytes:
+    # Only a yardstick now, keyframes are stored in the bodies table
+    return zlib.compress(body.encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def encode_delta(base, body) -> bytes:
+    # Slow to import, and only needed when an entry is edited
+    from difflib import SequenceMatcher
+
+    base_lines = base.splitlines(keepends=True)
+    lines = body.splitlines(keepends=True)
+    operations = []
+
+    matcher = SequenceMatcher(None, base_lines, lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            operations.append([i1, i2])
+        elif j1 != j2:
+            operations.append("".join(lines[j1:j2]))
+
+    return zlib.compress(
+        json.dumps(operations, separators=(",", ":")).encode("utf-8"),
+        COMPRESSION_LEVEL,
+    )
+
+
+def apply_delta(base, data) -> str:
+    base_lines = base.splitlines(keepends=True)
+
+    return "".join(
+        operation
+        if isinstance(operation, str)
+        else "".join(base_lines[operation[0] : operation[1]])
+        for operation in json.loads(zlib.decompress(data))
+    )
+
+
+def encode_version(version, body, keyframe=None, keyframe_interval=None):
+    """Returns (base_version, delta) for storing `body` as `version`.
+
+    `keyframe` is the entry's latest (version, body) keyframe, if any.
+    Both are None when the version is stored as a keyframe itself.
+    """
+    interval = keyframe_interval or DEFAULT_HISTORY_KEYFRAME_INTERVAL
+
+    if keyframe is None or version - keyframe[0] >= interval:
+        return None, None
+
+    # A rewrite can make the delta bigger than the body, keep it whole then
+    delta = encode_delta(keyframe[1], body)
+    if len(delta) >= len(encode_keyframe(body)):
+        return None, None
+
+    return keyframe[0], delta
+
+
+def archive_version(connection, entry_id, timestamp, body_id, archived_at, interval):
+    # Must run inside the caller's write transaction
+    version = connection.execute(
+        "SELECT coalesce(max(version), 0) + 1 FROM entries_history WHERE entry_id = ?",
+        (entry_id,),
+    ).fetchone()[0]
+
+    keyframe = connection.execute(
+        f"""
+        SELECT h.version, {body_column()}
+        FROM entries_history h
+        JOIN bodies b ON b.body_id = h.body_id
+        WHERE h.entry_id = ? AND h.base_version IS NULL
+        ORDER BY h.version DESC
+        LIMIT 1;
+        """,
+        (entry_id,),
+    ).fetchone()
+
+    body = connection.execute(
+        f"SELECT {body_column()} FROM bodies b WHERE b.body_id = ?;", (body_id,)
+    ).fetchone()[0]
+    base_version, data = encode_version(version, body, keyframe, interval)
+
+    connection.execute(
+        """
+        INSERT INTO entries_history
+            (entry_id, version, base_version, timestamp, archived_at, body_id, data)
+        VALUES (?, ?, ?, ?, ?, ?, ?);
+        """,
+        (
+            entry_id,
+            version,
+            base_version,
+            timestamp,
+            archived_at,
+            body_id if base_version is None else None,
+            data,
+        ),
+    )
+
+    return version
+
+
+def get_versions(connection, entry_id) -> list:
+    return connection.execute(
+        """
+        SELECT version, archived_at
+        FROM entries_history
+        WHERE entry_id = ?
+        ORDER BY version;
+        """,
+        (entry_id,),
+    ).fetchall()
+
+
+def load_version(connection, entry_id, version):
+    """Returns (timestamp, body) of a past version, or None."""
+    row = connection.execute(
+        f"""
+        SELECT h.timestamp, h.data, {body_column()}
+        FROM entries_history h
+        LEFT JOIN entries_history k
+            ON k.entry_id = h.entry_id AND k.version = h.base_version
+        JOIN bodies b ON b.body_id = coalesce(h.body_id, k.body_id)
+        WHERE h.entry_id = ? AND h.version = ?;
+        """,
+        (entry_id, version),
+    ).fetchone()
+
+    if row is None:
+        return None
+
+    timestamp, data, body = row
+
+    if data is None:
+        return timestamp, body
+
+    return timestamp, apply_delta(body, data)
@@ -0,0 +1,107 @@
+import importlib.util
+import logging
+import sqlite3
+
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def get_schema_version(connection) -> int:
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def find_migrations(schemas_path: Path) -> list:
+    migrations = []
+
+    for path in schemas_path.iterdir():
+        if path.suffix not in (".sql", ".py") or path.name.startswith("_"):
+            continue
+
+        version = path.stem.split("_", 1)[0]
+        if not version.isdigit():
+            logger.warning("Ignoring migration without a version prefix: %s", path)
+            continue
+
+        migrations.append((int(version), path))
+
+    return sorted(migrations)
+
+
+def split_statements(sql: str) -> list:
+    # executescript() commits any open transaction before it runs, so scripts
+    # are split and executed one statement at a time instead.
+    # complete_statement() keeps trigger bodies and quoted ';' together.
+    statements = []
+    buffer = ""
+
+    for part in sql.split(";"):
+        buffer += part + ";"
+        if sqlite3.complete_statement(buffer):
+            statements.append(buffer.strip())
+            buffer = ""
+
+    statements.append(buffer.rstrip(";"))
+
+    return [statement for statement in statements if statement.strip(" \n;")]
+
+
+def run_python_migration(connection, path: Path):
+    # For data migrations SQL can't express. The module's migrate(connection)
+    # runs inside the migration transaction and must not commit.
+    spec = importlib.util.spec_from_file_location(f"_migration_{path.stem}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.migrate(connection)
+
+
+def get_pending_migrations(connection, migrations) -> tuple:
+    current_version = get_schema_version(connection)
+    return current_version, [
+        (version, path) for version, path in migrations if version > current_version
+    ]
+
+
+def apply_migrations(connection, schemas_path: Path) -> int:
+    migrations = find_migrations(schemas_path)
+    current_version, pending = get_pending_migrations(connection, migrations)
+
+    if not pending:
+        logger.info("Database schema is up to date at version %s", current_version)
+        return current_version
+
+    try:
+        # Take the write lock up front and re-check, another lifelog process
+        # may have migrated while we were waiting for it.
+        connection.execute("BEGIN IMMEDIATE")
+        current_version, pending = get_pending_migrations(connection, migrations)
+
+        if not pending:
+            connection.rollback()
+            return current_version
+
+        target_version = pending[-1][0]
+
+        for version, path in pending:
+            logger.info("Applying migration %s", path.name)
+            if path.suffix == ".py":
+                run_python_migration(connection, path)
+                continue
+
+            for statement in split_statements(path.read_text()):
+                connection.execute(statement)
+
+        connection.execute(f"PRAGMA user_version = {target_version}")
+        connection.commit()
+
+    except sqlite3.Error as e:
+        connection.rollback()
+        logger.error(
+            "Failed to migrate database from version %s: %s", current_version, e
+        )
+        raise
+
+    logger.info(
+        "Migrated database from version %s to %s", current_version, target_version
+    )
+    return target_version
@@ -0,0 +1,27 @@
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+    body,
+    content='entries',
+    content_rowid='entry_id'
+);
+
+CREATE TRIGGER IF NOT EXISTS entries_fts_insert AFTER INSERT ON entries BEGIN
+    INSERT INTO entries_fts (rowid, body) VALUES (new.entry_id, new.body);
+END;
+
+CREATE TRIGGER IF NOT EXISTS entries_fts_delete AFTER DELETE ON entries BEGIN
+    INSERT INTO entries_fts (entries_fts, rowid, body)
+    VALUES ('delete', old.entry_id, old.body);
+END;
+
+CREATE TRIGGER IF NOT EXISTS entries_fts_update AFTER UPDATE OF body ON entries BEGIN
+    INSERT INTO entries_fts (entries_fts, rowid, body)
+    VALUES ('delete', old.entry_id, old.body);
+    INSERT INTO entries_fts (rowid, body) VALUES (new.entry_id, new.body);
+END;
+
+-- Index entries written before this table existed. The docsize shadow table
+-- is empty until something has been indexed, so this only runs once.
+INSERT INTO entries_fts (entries_fts)
+SELECT 'rebuild'
+WHERE NOT EXISTS (SELECT 1 FROM entries_fts_docsize)
+  AND EXISTS (SELECT 1 FROM entries);
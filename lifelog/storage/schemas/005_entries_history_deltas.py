@@ -0,0 +1,104 @@
+"""Rebuild entries_history with delta-compressed versions.
+
+The old table holds a full copy of the body for every edit, each is
+re-encoded as a keyframe or a delta, in edit order per entry.
+
+The encoding is frozen here as it was when this migration was written,
+later changes to lifelog.storage.history must not change what it writes.
+"""
+
+import json
+import zlib
+
+from difflib import SequenceMatcher
+
+KEYFRAME_INTERVAL = 16
+COMPRESSION_LEVEL = 6
+
+
+def encode_keyframe(body):
+    return zlib.compress(body.encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def encode_delta(base, body):
+    base_lines = base.splitlines(keepends=True)
+    lines = body.splitlines(keepends=True)
+    operations = []
+
+    matcher = SequenceMatcher(None, base_lines, lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            operations.append([i1, i2])
+        elif j1 != j2:
+            operations.append("".join(lines[j1:j2]))
+
+    return zlib.compress(
+        json.dumps(operations, separators=(",", ":")).encode("utf-8"),
+        COMPRESSION_LEVEL,
+    )
+
+
+def encode_version(version, body, keyframe):
+    full = encode_keyframe(body)
+
+    if keyframe is None or version - keyframe[0] >= KEYFRAME_INTERVAL:
+        return None, full
+
+    delta = encode_delta(keyframe[1], body)
+    if len(delta) >= len(full):
+        return None, full
+
+    return keyframe[0], delta
+
+
+def migrate(connection):
+    connection.execute(
+        """
+        CREATE TABLE entries_history_new (
+            history_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            entry_id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            base_version INTEGER NULL,
+            timestamp TIMESTAMP NOT NULL,
+            archived_at TIMESTAMP NOT NULL,
+            data BLOB NOT NULL
+        );
+        """
+    )
+
+    rows = connection.execute(
+        """
+        SELECT history_id, entry_id, timestamp, body, archived_at
+        FROM entries_history
+        ORDER BY entry_id, history_id;
+        """
+    )
+
+    current_entry = None
+    for history_id, entry_id, timestamp, body, archived_at in rows:
+        if entry_id != current_entry:
+            current_entry, version, keyframe = entry_id, 0, None
+
+        version += 1
+        base_version, data = encode_version(version, body, keyframe)
+        if base_version is None:
+            keyframe = (version, body)
+
+        connection.execute(
+            """
+            INSERT INTO entries_history_new
+                (history_id, entry_id, version, base_version, timestamp,
+                 archived_at, data)
+            VALUES (?, ?, ?, ?, ?, ?, ?);
+            """,
+            (history_id, entry_id, version, base_version, timestamp, archived_at, data),
+        )
+
+    connection.execute("DROP TABLE entries_history;")
+    connection.execute("ALTER TABLE entries_history_new RENAME TO entries_history;")
+    connection.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS entries_history_version
+        ON entries_history (entry_id, version);
+        """
+    )
@@ -0,0 +1,38 @@
+"""Store timestamps as integer epoch microseconds and index entry times.
+
+Rows written through sqlite3's old default adapter hold ISO text. Integers
+sort and compare correctly and make date-range queries an index range scan.
+"""
+
+from datetime import datetime, timedelta
+
+EPOCH = datetime(1970, 1, 1)
+
+COLUMNS = {
+    "entries": ("timestamp", "updated_at"),
+    "entries_history": ("timestamp", "archived_at"),
+}
+
+
+def text_to_epoch_us(value):
+    return (datetime.fromisoformat(value) - EPOCH) // timedelta(microseconds=1)
+
+
+def migrate(connection):
+    connection.create_function(
+        "text_to_epoch_us", 1, text_to_epoch_us, deterministic=True
+    )
+
+    for table, columns in COLUMNS.items():
+        for column in columns:
+            connection.execute(
+                f"""
+                UPDATE {table}
+                SET {column} = text_to_epoch_us({column})
+                WHERE typeof({column}) = 'text';
+                """
+            )
+
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS entries_timestamp ON entries (timestamp);"
+    )
@@ -0,0 +1,272 @@
+"""Move entry bodies into the content-addressed bodies table.
+
+entries keeps a body_id instead of its own copy of the body, and history
+keyframes refer to the body they archived instead of a compressed copy of
+it (deltas stay as they are). Identical bodies share one row. The full-text
+index reads bodies through the entry_bodies view, it is rebuilt once here.
+"""
+
+import hashlib
+import zlib
+
+# The hash bodies are keyed by, as lifelog.storage.bodies had it then
+HASH_SIZE = 16
+
+TABLES = (
+    """
+    CREATE TABLE bodies (
+        body_id INTEGER PRIMARY KEY,
+        hash BLOB NOT NULL UNIQUE,
+        body TEXT NOT NULL,
+        refs INTEGER NOT NULL DEFAULT 0
+    );
+    """,
+    """
+    CREATE TABLE entries_new (
+        entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TIMESTAMP NOT NULL,
+        body_id INTEGER NOT NULL REFERENCES bodies (body_id),
+        updated_at TIMESTAMP NULL,
+        word_count INTEGER NOT NULL DEFAULT 0
+    );
+    """,
+    """
+    CREATE TABLE entries_history_new (
+        history_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        entry_id INTEGER NOT NULL,
+        version INTEGER NOT NULL,
+        base_version INTEGER NULL,
+        timestamp TIMESTAMP NOT NULL,
+        archived_at TIMESTAMP NOT NULL,
+        -- Keyframes refer to a body, deltas against them hold data
+        body_id INTEGER NULL REFERENCES bodies (body_id),
+        data BLOB NULL
+    );
+    """,
+)
+
+# Dropping the old tables drops their triggers and indexes with them
+SCHEMA = (
+    "CREATE INDEX IF NOT EXISTS entries_timestamp ON entries (timestamp);",
+    "CREATE INDEX IF NOT EXISTS entries_word_count ON entries (word_count);",
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS entries_history_version
+    ON entries_history (entry_id, version);
+    """,
+    """
+    CREATE VIEW entry_bodies AS
+    SELECT e.entry_id, b.body
+    FROM entries e
+    JOIN bodies b ON b.body_id = e.body_id;
+    """,
+    "DROP TABLE entries_fts;",
+    """
+    CREATE VIRTUAL TABLE entries_fts USING fts5(
+        body,
+        content='entry_bodies',
+        content_rowid='entry_id'
+    );
+    """,
+    "INSERT INTO entries_fts (entries_fts) VALUES ('rebuild');",
+    # The full-text index and the refs of a body are updated by the same
+    # trigger, so the old body is still there when the index needs it.
+    """
+    CREATE TRIGGER entries_fts_insert AFTER INSERT ON entries
+    WHEN NOT EXISTS (SELECT 1 FROM fts_deferred)
+    BEGIN
+        INSERT INTO entries_fts (rowid, body)
+        SELECT new.entry_id, body FROM bodies WHERE body_id = new.body_id;
+    END;
+    """,
+    """
+    CREATE TRIGGER entries_bodies_insert AFTER INSERT ON entries
+    BEGIN
+        UPDATE bodies SET refs = refs + 1 WHERE body_id = new.body_id;
+    END;
+    """,
+    """
+    CREATE TRIGGER entries_bodies_delete AFTER DELETE ON entries
+    BEGIN
+        INSERT INTO entries_fts (entries_fts, rowid, body)
+        SELECT 'delete', old.entry_id, body FROM bodies WHERE body_id = old.body_id;
+
+        UPDATE bodies SET refs = refs - 1 WHERE body_id = old.body_id;
+        DELETE FROM bodies WHERE body_id = old.body_id AND refs <= 0;
+    END;
+    """,
+    """
+    CREATE TRIGGER entries_bodies_update AFTER UPDATE OF body_id ON entries
+    BEGIN
+        INSERT INTO entries_fts (entries_fts, rowid, body)
+        SELECT 'delete', old.entry_id, body FROM bodies WHERE body_id = old.body_id;
+        INSERT INTO entries_fts (rowid, body)
+        SELECT new.entry_id, body FROM bodies WHERE body_id = new.body_id;
+
+        UPDATE bodies SET refs = refs + 1 WHERE body_id = new.body_id;
+        UPDATE bodies SET refs = refs - 1 WHERE body_id = old.body_id;
+        DELETE FROM bodies WHERE body_id = old.body_id AND refs <= 0;
+    END;
+    """,
+    """
+    CREATE TRIGGER entries_history_bodies_insert AFTER INSERT ON entries_history
+    WHEN new.body_id IS NOT NULL
+    BEGIN
+        UPDATE bodies SET refs = refs + 1 WHERE body_id = new.body_id;
+    END;
+    """,
+    """
+    CREATE TRIGGER entries_history_bodies_delete AFTER DELETE ON entries_history
+    WHEN old.body_id IS NOT NULL
+    BEGIN
+        UPDATE bodies SET refs = refs - 1 WHERE body_id = old.body_id;
+        DELETE FROM bodies WHERE body_id = old.body_id AND refs <= 0;
+    END;
+    """,
+    """
+    CREATE TRIGGER entries_stats_insert AFTER INSERT ON entries
+    WHEN NOT EXISTS (SELECT 1 FROM fts_deferred)
+    BEGIN
+        INSERT INTO daily_stats (day, entries, words)
+        VALUES (date(new.timestamp / 1000000, 'unixepoch'), 1, new.word_count)
+        ON CONFLICT (day) DO UPDATE SET
+            entries = entries + 1,
+            words = words + excluded.words;
+    END;
+    """,
+    """
+    CREATE TRIGGER entries_stats_delete AFTER DELETE ON entries
+    BEGIN
+        UPDATE daily_stats
+        SET entries = entries - 1,
+            words = words - old.word_count
+        WHERE day = date(old.timestamp / 1000000, 'unixepoch');
+
+        DELETE FROM daily_stats
+        WHERE day = date(old.timestamp / 1000000, 'unixepoch') AND entries <= 0;
+    END;
+    """,
+    """
+    CREATE TRIGGER entries_stats_update
+    AFTER UPDATE OF timestamp, word_count ON entries
+    BEGIN
+        UPDATE daily_stats
+        SET entries = entries - 1,
+            words = words - old.word_count
+        WHERE day = date(old.timestamp / 1000000, 'unixepoch');
+
+        INSERT INTO daily_stats (day, entries, words)
+        VALUES (date(new.timestamp / 1000000, 'unixepoch'), 1, new.word_count)
+        ON CONFLICT (day) DO UPDATE SET
+            entries = entries + 1,
+            words = words + excluded.words;
+
+        DELETE FROM daily_stats
+        WHERE day = date(old.timestamp / 1000000, 'unixepoch') AND entries <= 0;
+    END;
+    """,
+)
+
+
+def body_hash(body):
+    return hashlib.blake2b(body.encode("utf-8"), digest_size=HASH_SIZE).digest()
+
+
+def decode_keyframe(data):
+    return zlib.decompress(data).decode("utf-8")
+
+
+def migrate(connection):
+    for statement in TABLES:
+        connection.execute(statement)
+
+    connection.create_function("body_hash", 1, body_hash, deterministic=True)
+
+    # refs are counted here, the triggers only exist once this is done
+    connection.execute(
+        """
+        INSERT INTO bodies (hash, body, refs)
+        SELECT body_hash(body), body, count(*)
+        FROM entries
+        GROUP BY 1;
+        """
+    )
+    connection.execute(
+        """
+        INSERT INTO entries_new (entry_id, timestamp, body_id, updated_at, word_count)
+        SELECT e.entry_id, e.timestamp, b.body_id, e.updated_at, e.word_count
+        FROM entries e
+        JOIN bodies b ON b.hash = body_hash(e.body);
+        """
+    )
+
+    rows = connection.execute(
+        """
+        SELECT history_id, entry_id, version, base_version, timestamp,
+               archived_at, data
+        FROM entries_history;
+        """
+    )
+
+    for (
+        history_id,
+        entry_id,
+        version,
+        base_version,
+        timestamp,
+        archived_at,
+        data,
+    ) in rows:
+        body_id = None
+
+        if base_version is None:
+            body = decode_keyframe(data)
+            digest = body_hash(body)
+            connection.execute(
+                """
+                INSERT INTO bodies (hash, body, refs) VALUES (?, ?, 1)
+                ON CONFLICT (hash) DO UPDATE SET refs = refs + 1;
+                """,
+                (digest, body),
+            )
+            body_id = connection.execute(
+                "SELECT body_id FROM bodies WHERE hash = ?;", (digest,)
+            ).fetchone()[0]
+            data = None
+
+        connection.execute(
+            """
+            INSERT INTO entries_history_new
+                (history_id, entry_id, version, base_version, timestamp,
+                 archived_at, body_id, data)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?);
+            """,
+            (
+                history_id,
+                entry_id,
+                version,
+                base_version,
+                timestamp,
+                archived_at,
+                body_id,
+                data,
+            ),
+        )
+
+    # Keep handing out new uids where the old table left off, ids of deleted
+    # entries are never reused
+    for table in ("entries", "entries_history"):
+        connection.execute(
+            "DELETE FROM sqlite_sequence WHERE name = ?;", (f"{table}_new",)
+        )
+        connection.execute(
+            """
+            INSERT INTO sqlite_sequence (name, seq)
+            SELECT ?, seq FROM sqlite_sequence WHERE name = ?;
+            """,
+            (f"{table}_new", table),
+        )
+        connection.execute(f"DROP TABLE {table};")
+        connection.execute(f"ALTER TABLE {table}_new RENAME TO {table};")
+
+    for statement in SCHEMA:
+        connection.execute(statement)
@@ -0,0 +1,94 @@
+"""Compress large bodies in place.
+
+bodies.codec says how a body is stored, NULL for plain text. The entry_bodies
+view and the full-text triggers read bodies through body_text(), so the
+index keeps seeing plain text and doesn't need a rebuild. Existing bodies
+are compressed with the defaults of the time (zlib from 512 bytes), later
+writes follow the [storage] settings.
+"""
+
+import zlib
+
+THRESHOLD = 512  # bytes
+ZLIB_LEVEL = 6
+MAX_COMPRESSED_RATIO = 0.9
+
+BODY_COLUMN = (
+    "CASE WHEN b.codec IS NULL THEN b.body ELSE body_text(b.body, b.codec) END"
+)
+
+SCHEMA = (
+    "ALTER TABLE bodies ADD COLUMN codec TEXT NULL;",
+    "DROP VIEW entry_bodies;",
+    f"""
+    CREATE VIEW entry_bodies AS
+    SELECT e.entry_id, {BODY_COLUMN} AS body
+    FROM entries e
+    JOIN bodies b ON b.body_id = e.body_id;
+    """,
+    "DROP TRIGGER entries_fts_insert;",
+    "DROP TRIGGER entries_bodies_delete;",
+    "DROP TRIGGER entries_bodies_update;",
+    f"""
+    CREATE TRIGGER entries_fts_insert AFTER INSERT ON entries
+    WHEN NOT EXISTS (SELECT 1 FROM fts_deferred)
+    BEGIN
+        INSERT INTO entries_fts (rowid, body)
+        SELECT new.entry_id, {BODY_COLUMN} FROM bodies b
+        WHERE b.body_id = new.body_id;
+    END;
+    """,
+    f"""
+    CREATE TRIGGER entries_bodies_delete AFTER DELETE ON entries
+    BEGIN
+        INSERT INTO entries_fts (entries_fts, rowid, body)
+        SELECT 'delete', old.entry_id, {BODY_COLUMN} FROM bodies b
+        WHERE b.body_id = old.body_id;
+
+        UPDATE bodies SET refs = refs - 1 WHERE body_id = old.body_id;
+        DELETE FROM bodies WHERE body_id = old.body_id AND refs <= 0;
+    END;
+    """,
+    f"""
+    CREATE TRIGGER entries_bodies_update AFTER UPDATE OF body_id ON entries
+    BEGIN
+        INSERT INTO entries_fts (entries_fts, rowid, body)
+        SELECT 'delete', old.entry_id, {BODY_COLUMN} FROM bodies b
+        WHERE b.body_id = old.body_id;
+        INSERT INTO entries_fts (rowid, body)
+        SELECT new.entry_id, {BODY_COLUMN} FROM bodies b
+        WHERE b.body_id = new.body_id;
+
+        UPDATE bodies SET refs = refs + 1 WHERE body_id = new.body_id;
+        UPDATE bodies SET refs = refs - 1 WHERE body_id = old.body_id;
+        DELETE FROM bodies WHERE body_id = old.body_id AND refs <= 0;
+    END;
+    """,
+)
+
+
+def migrate(connection):
+    for statement in SCHEMA:
+        connection.execute(statement)
+
+    # Collected first, the bodies table is rewritten below
+    body_ids = [
+        body_id
+        for (body_id,) in connection.execute(
+            "SELECT body_id FROM bodies WHERE length(CAST(body AS BLOB)) >= ?;",
+            (THRESHOLD,),
+        )
+    ]
+
+    for body_id in body_ids:
+        body = connection.execute(
+            "SELECT body FROM bodies WHERE body_id = ?;", (body_id,)
+        ).fetchone()[0]
+        data = body.encode("utf-8")
+        compressed = zlib.compress(data, ZLIB_LEVEL)
+
+        if len(compressed) <= len(data) * MAX_COMPRESSED_RATIO:
+            connection.execute(
+                "UPDATE bodies SET body = ?, codec = 'zlib' WHERE body_id = ?;",
+                (compressed, body_id),
+            )
@@ -0,0 +1,77 @@
+"""Index the #tags and @mentions of every entry.
+
+entry_tags holds one row per (tag, entry), with the entry's timestamp copied
+in, so listing an entry range for a tag walks the primary key in order
+instead of scanning bodies. Tags are extracted in Python when entries are
+written; triggers only follow deletes and timestamp changes. The
+extraction below is frozen as lifelog.core.tags had it then.
+"""
+
+import importlib
+import re
+
+TAG_PATTERN = re.compile(r"(?<![\w#@&])([#@])([^\W\d_][\w-]*)")
+
+SCHEMA = (
+    """
+    CREATE TABLE entry_tags (
+        tag TEXT NOT NULL,
+        timestamp TIMESTAMP NOT NULL,
+        entry_id INTEGER NOT NULL,
+        PRIMARY KEY (tag, timestamp, entry_id)
+    ) WITHOUT ROWID;
+    """,
+    "CREATE INDEX entry_tags_entry ON entry_tags (entry_id);",
+    """
+    CREATE TRIGGER entries_tags_delete AFTER DELETE ON entries
+    BEGIN
+        DELETE FROM entry_tags WHERE entry_id = old.entry_id;
+    END;
+    """,
+    """
+    CREATE TRIGGER entries_tags_timestamp AFTER UPDATE OF timestamp ON entries
+    BEGIN
+        UPDATE entry_tags SET timestamp = new.timestamp
+        WHERE entry_id = new.entry_id;
+    END;
+    """,
+)
+
+
+def extract_tags(body):
+    if not body or ("#" not in body and "@" not in body):
+        return set()
+
+    return {
+        sigil + name.rstrip("-").casefold() for sigil, name in TAG_PATTERN.findall(body)
+    }
+
+
+def body_text(value, codec):
+    # Bodies as 009_body_compression.py stored them
+    if codec is None:
+        return value
+
+    return importlib.import_module(codec).decompress(value).decode("utf-8")
+
+
+def migrate(connection):
+    for statement in SCHEMA:
+        connection.execute(statement)
+
+    rows = connection.execute(
+        """
+        SELECT e.entry_id, e.timestamp, b.body, b.codec
+        FROM entries e
+        JOIN bodies b ON b.body_id = e.body_id;
+        """
+    )
+
+    connection.executemany(
+        "INSERT INTO entry_tags (tag, timestamp, entry_id) VALUES (?, ?, ?);",
+        (
+            (tag, timestamp, entry_id)
+            for entry_id, timestamp, body, codec in rows
+            for tag in extract_tags(body_text(body, codec))
+        ),
+    )
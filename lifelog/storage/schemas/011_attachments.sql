@@ -0,0 +1,63 @@
+-- Attachment payloads are stored once per content, keyed by their hash, and
+-- read and written in chunks with incremental blob I/O. They live in their
+-- own table: SQLite rewrites a whole row on UPDATE, so keeping them next to
+-- refs would copy the payload every time it is linked or unlinked.
+CREATE TABLE IF NOT EXISTS attachments (
+    attachment_id INTEGER PRIMARY KEY,
+    hash BLOB NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    refs INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS attachment_data (
+    attachment_id INTEGER PRIMARY KEY REFERENCES attachments (attachment_id),
+    data BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS entry_attachments (
+    entry_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    attachment_id INTEGER NOT NULL REFERENCES attachments (attachment_id),
+    mime_type TEXT NULL,
+    PRIMARY KEY (entry_id, name)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS entry_attachments_attachment
+ON entry_attachments (attachment_id);
+
+CREATE TRIGGER IF NOT EXISTS attachments_delete AFTER DELETE ON attachments
+BEGIN
+    DELETE FROM attachment_data WHERE attachment_id = old.attachment_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS entry_attachments_insert
+AFTER INSERT ON entry_attachments
+BEGIN
+    UPDATE attachments SET refs = refs + 1
+    WHERE attachment_id = new.attachment_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS entry_attachments_update
+AFTER UPDATE OF attachment_id ON entry_attachments
+BEGIN
+    UPDATE attachments SET refs = refs + 1
+    WHERE attachment_id = new.attachment_id;
+    UPDATE attachments SET refs = refs - 1
+    WHERE attachment_id = old.attachment_id;
+    DELETE FROM attachments
+    WHERE attachment_id = old.attachment_id AND refs <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS entry_attachments_delete
+AFTER DELETE ON entry_attachments
+BEGIN
+    UPDATE attachments SET refs = refs - 1
+    WHERE attachment_id = old.attachment_id;
+    DELETE FROM attachments
+    WHERE attachment_id = old.attachment_id AND refs <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS entries_attachments_delete AFTER DELETE ON entries
+BEGIN
+    DELETE FROM entry_attachments WHERE entry_id = old.entry_id;
+END;
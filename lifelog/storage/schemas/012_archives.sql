@@ -0,0 +1,18 @@
+-- Years moved out of the diary into archive databases by `lifelog archive`,
+-- see lifelog/storage/archives.py. The first and last timestamps let a query
+-- skip archives outside its range, archived_entries finds the archive of an
+-- entry without opening any of them.
+CREATE TABLE IF NOT EXISTS archives (
+    year INTEGER PRIMARY KEY,
+    generation INTEGER NOT NULL,
+    file TEXT NOT NULL,
+    entries INTEGER NOT NULL,
+    first_timestamp TIMESTAMP NOT NULL,
+    last_timestamp TIMESTAMP NOT NULL,
+    archived_at TIMESTAMP NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS archived_entries (
+    entry_id INTEGER PRIMARY KEY,
+    year INTEGER NOT NULL
+);
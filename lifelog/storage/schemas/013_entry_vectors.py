@@ -0,0 +1,84 @@
+"""Keep a bag-of-words vector of every entry for related entries.
+
+entry_vectors holds the hashed word counts of each entry (see
+lifelog/core/related.py), written with the entry. An edit replaces the row,
+so vector_id only grows and a cache of the vectors can tell which are new.
+Existing entries are vectorized once here, with the hashing frozen as
+lifelog.core.vectors had it then.
+"""
+
+import importlib
+import re
+import sys
+import zlib
+
+from array import array
+from collections import Counter
+
+VECTOR_SIZE = 1 << 20
+WORD_PATTERN = re.compile(r"[^\W\d_]{2,}")
+
+SCHEMA = (
+    """
+    CREATE TABLE entry_vectors (
+        vector_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        entry_id INTEGER NOT NULL UNIQUE,
+        terms BLOB NOT NULL,
+        counts BLOB NOT NULL
+    );
+    """,
+    """
+    CREATE TRIGGER entries_vectors_delete AFTER DELETE ON entries
+    BEGIN
+        DELETE FROM entry_vectors WHERE entry_id = old.entry_id;
+    END;
+    """,
+)
+
+
+def term_vector(body):
+    counts = {}
+    for word, count in Counter(WORD_PATTERN.findall(body.casefold())).items():
+        term = zlib.crc32(word.encode("utf-8")) & (VECTOR_SIZE - 1)
+        counts[term] = counts.get(term, 0) + count
+
+    terms = sorted(counts)
+
+    packed_terms = array("I", terms)
+    packed_counts = array("H", (min(counts[term], 0xFFFF) for term in terms))
+
+    if sys.byteorder == "big":
+        packed_terms.byteswap()
+        packed_counts.byteswap()
+
+    return packed_terms.tobytes(), packed_counts.tobytes()
+
+
+def body_text(value, codec):
+    # Bodies as 009_body_compression.py stored them
+    if codec is None:
+        return value
+
+    return importlib.import_module(codec).decompress(value).decode("utf-8")
+
+
+def migrate(connection):
+    for statement in SCHEMA:
+        connection.execute(statement)
+
+    rows = connection.execute(
+        """
+        SELECT e.entry_id, b.body, b.codec
+        FROM entries e
+        JOIN bodies b ON b.body_id = e.body_id
+        ORDER BY e.entry_id;
+        """
+    )
+
+    connection.executemany(
+        "INSERT INTO entry_vectors (entry_id, terms, counts) VALUES (?, ?, ?);",
+        (
+            (entry_id, *term_vector(body_text(body, codec)))
+            for entry_id, body, codec in rows
+        ),
+    )
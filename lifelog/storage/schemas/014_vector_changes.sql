@@ -0,0 +1,16 @@
+-- A counter related entries check instead of scanning entry_vectors (and
+-- every archive's) on each lookup, see lifelog/core/related.py. New vectors
+-- show up as a higher max(vector_id), replacing one deletes it without
+-- firing triggers, so `removed` only moves when entries are deleted or
+-- archived, or when an archived entry is edited (DatabaseStorage bumps it).
+CREATE TABLE IF NOT EXISTS vector_changes (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    removed INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO vector_changes (id) VALUES (1);
+
+CREATE TRIGGER IF NOT EXISTS entry_vectors_removed AFTER DELETE ON entry_vectors
+BEGIN
+    UPDATE vector_changes SET removed = removed + 1 WHERE id = 1;
+END;
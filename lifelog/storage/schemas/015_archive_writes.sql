@@ -0,0 +1,5 @@
+-- Bumped by every write to an archive (edits and attachments of archived
+-- entries), under the diary's write lock. That changes the diary, so an
+-- archive run that copied the file before the write starts over, see
+-- DatabaseStorage._write_archive().
+ALTER TABLE archives ADD COLUMN writes INTEGER NOT NULL DEFAULT 0;
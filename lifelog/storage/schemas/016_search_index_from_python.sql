@@ -0,0 +1,22 @@
+-- The search index needs the plain text of compressed bodies, which only
+-- the body_text() function registered by lifelog can produce. Triggers
+-- calling it made every write to entries fail on other connections (the
+-- sqlite3 shell, restore scripts), so DatabaseStorage keeps entries_fts up
+-- to date itself, see index_bodies() and unindex_bodies(). The triggers
+-- only count bodies.refs now.
+DROP TRIGGER entries_fts_insert;
+DROP TRIGGER entries_bodies_delete;
+DROP TRIGGER entries_bodies_update;
+
+CREATE TRIGGER entries_bodies_delete AFTER DELETE ON entries
+BEGIN
+    UPDATE bodies SET refs = refs - 1 WHERE body_id = old.body_id;
+    DELETE FROM bodies WHERE body_id = old.body_id AND refs <= 0;
+END;
+
+CREATE TRIGGER entries_bodies_update AFTER UPDATE OF body_id ON entries
+BEGIN
+    UPDATE bodies SET refs = refs + 1 WHERE body_id = new.body_id;
+    UPDATE bodies SET refs = refs - 1 WHERE body_id = old.body_id;
+    DELETE FROM bodies WHERE body_id = old.body_id AND refs <= 0;
+END;
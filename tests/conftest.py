@@ -0,0 +1,39 @@
+from importlib import resources
+
+import pytest
+
+from lifelog.core.config import Config
+from lifelog.core.constants import CONFIG_TEMPLATE_NAME
+from lifelog.storage.database import DatabaseStorage
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    """The shipped config template, with every path inside tmp_path."""
+    monkeypatch.delenv("DEBUG_MODE", raising=False)
+
+    template = (
+        resources.files("lifelog.assets").joinpath(CONFIG_TEMPLATE_NAME).read_text()
+    )
+    paths = {
+        "diary_db": tmp_path / "diary.db",
+        "diary_folder": tmp_path / "diary",
+        "backup_folder": tmp_path / "backups",
+        "archive_folder": tmp_path / "archive",
+    }
+
+    lines = []
+    for line in template.splitlines():
+        key = line.split("=", 1)[0].strip()
+        lines.append(f'{key}="{paths[key].as_posix()}"' if key in paths else line)
+
+    config_file = tmp_path / "config.toml"
+    config_file.write_text("\n".join(lines) + "\n")
+
+    return Config(str(config_file))
+
+
+@pytest.fixture
+def storage(config):
+    with DatabaseStorage(config) as storage:
+        yield storage
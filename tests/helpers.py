@@ -0,0 +1,16 @@
+"""Shared by the tests, fixtures are in conftest.py."""
+
+from datetime import datetime
+
+from lifelog.core.entry import Entry
+
+
+def make_entry(body, *timestamp):
+    return Entry(body=body, timestamp=datetime(*timestamp), storage_type="database")
+
+
+def all_entries(storage):
+    """Returns {uid: (timestamp, body)} of every entry, archives included."""
+    return {
+        entry.uid: (entry.timestamp, entry.body) for entry in storage.iter_entries()
+    }
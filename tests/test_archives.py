@@ -0,0 +1,190 @@
+"""Archiving past years and reading them back through the diary."""
+
+import sqlite3
+
+from datetime import date, datetime
+
+import pytest
+
+from lifelog.core.attachments import hash_file
+from lifelog.storage import database
+from lifelog.storage.database import DatabaseStorage
+from tests.helpers import all_entries, make_entry
+
+ENTRIES = [
+    make_entry("Started the #running plan with @alice", 2019, 3, 1, 7),
+    make_entry("Rainy day, no running", 2019, 3, 2, 7),
+    make_entry("Year end notes " * 80, 2019, 12, 31, 23, 59, 59, 999999),
+    make_entry("New year, new #running shoes", 2020, 1, 1),
+    make_entry("Marathon done #running @alice", 2020, 10, 4, 14),
+    make_entry("Still running, still in the diary", 2021, 6, 1),
+    make_entry("Last week's #running log", 2022, 2, 2),
+]
+ARCHIVED = 5  # written before 2021
+
+
+@pytest.fixture
+def diary(storage):
+    storage.add_entries(ENTRIES)
+
+    # Edited before being archived, its history moves along
+    storage.update_entry(
+        storage.get_entry(2), make_entry("Rainy day, ran anyway", 2019, 3, 3)
+    )
+
+    return storage
+
+
+@pytest.fixture
+def before_archiving(diary):
+    return all_entries(diary)
+
+
+@pytest.fixture
+def archived(diary, before_archiving):
+    assert diary.archive(2021) == ARCHIVED
+    return diary
+
+
+def diary_rows(storage):
+    return storage.connection.execute("SELECT count(*) FROM main.entries").fetchone()[0]
+
+
+def test_moves_each_year_to_its_own_file(archived):
+    assert sorted(path.name for path in archived.archive_folder.iterdir()) == [
+        "diary-2019.1.db",
+        "diary-2020.1.db",
+    ]
+    assert diary_rows(archived) == len(ENTRIES) - ARCHIVED
+
+
+def test_entries_read_the_same(archived, before_archiving):
+    assert all_entries(archived) == before_archiving
+
+    timestamps = [entry.timestamp for entry in archived.iter_entries(page_size=2)]
+    assert timestamps == sorted(timestamps, reverse=True)
+    assert len(timestamps) == len(ENTRIES)
+
+    for uid, (timestamp, body) in before_archiving.items():
+        entry = archived.get_entry(uid)
+        assert (entry.timestamp, entry.body) == (timestamp, body)
+
+
+def test_date_ranges_span_partitions(archived):
+    since, until = datetime(2019, 12, 31), datetime(2021, 12, 31)
+
+    assert [entry.uid for entry in archived.iter_entries(since=since, until=until)] == [
+        6,
+        5,
+        4,
+        3,
+    ]
+    assert [entry.uid for entry in archived.iter_entries(tag="@alice")] == [5, 1]
+
+
+def test_search_spans_partitions(archived):
+    found = {entry.uid for entry, _ in archived.search_entries("running")}
+    assert found == {1, 4, 5, 6, 7}
+
+    found = archived.search_entries("running", until=datetime(2020, 1, 1))
+    assert {entry.uid for entry, _ in found} == {1}
+
+
+def test_totals_span_partitions(archived):
+    assert dict(archived.get_tag_counts()) == {"#running": 4, "@alice": 2}
+    assert archived.get_daily_stats(datetime(2019, 12, 31), datetime(2020, 1, 2)) == [
+        (date(2019, 12, 31), 1, 240),
+        (date(2020, 1, 1), 1, 5),
+    ]
+
+
+def test_history_moves_along(archived):
+    assert [version for version, _ in archived.get_entry_history(2)] == [1]
+    assert archived.get_entry_version(2, 1).body == "Rainy day, no running"
+
+
+def test_archived_entries_can_be_edited(archived):
+    old = archived.get_entry(4)
+
+    assert archived.update_entry(old, make_entry("New year, new shoes", 2024, 1, 1))
+    assert archived.get_entry(4).body == "New year, new shoes"
+    assert archived.get_entry_version(4, 1).body == old.body
+    assert diary_rows(archived) == len(ENTRIES) - ARCHIVED
+
+
+def test_archiving_a_year_again_writes_a_new_generation(archived):
+    archived.add_entry(make_entry("Found an old #running note", 2019, 7, 7))
+    expected = all_entries(archived)
+
+    assert archived.archive(2021) == 1
+    assert sorted(path.name for path in archived.archive_folder.iterdir()) == [
+        "diary-2019.2.db",
+        "diary-2020.1.db",
+    ]
+    assert all_entries(archived) == expected
+    assert archived.get_entry_version(2, 1).body == "Rainy day, no running"
+    assert diary_rows(archived) == len(ENTRIES) - ARCHIVED
+
+
+@pytest.mark.parametrize("write", ["edit", "attach"])
+def test_writes_during_an_archive_run_are_kept(
+    config, archived, monkeypatch, tmp_path, write
+):
+    archived.add_entry(make_entry("Found an old #running note", 2019, 7, 7))
+    photo = tmp_path / "photo.jpg"
+    photo.write_bytes(b"not really a photo")
+    build_archive = database.build_archive
+    written = []
+
+    def build_then_write(*args):
+        # Another session writes to the archive once the run copied it
+        stats = build_archive(*args)
+
+        if not written:
+            with DatabaseStorage(config) as other:
+                if write == "edit":
+                    other.update_entry(
+                        other.get_entry(1), make_entry("Edited meanwhile", 2024, 1, 1)
+                    )
+                else:
+                    other.add_attachment(
+                        1, photo, photo.name, "image/jpeg", hash_file(photo)
+                    )
+            written.append(write)
+
+        return stats
+
+    monkeypatch.setattr(database, "build_archive", build_then_write)
+
+    assert archived.archive(2021) == 1
+    assert written == [write]
+
+    if write == "edit":
+        assert archived.get_entry(1).body == "Edited meanwhile"
+    else:
+        assert [a.name for a in archived.get_entry_attachments(1)] == ["photo.jpg"]
+
+
+def test_nothing_left_to_archive(archived):
+    assert archived.archive(2021) == 0
+    assert len(list(archived.archive_folder.iterdir())) == 2
+
+
+def test_more_archives_than_attach_slots(storage):
+    limit = storage.connection.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    years = range(2000, 2000 + limit + 3)
+    storage.add_entries([make_entry(f"Notes of {year}", year, 6, 1) for year in years])
+    expected = all_entries(storage)
+
+    assert storage.archive(years[-1] + 1) == len(years)
+    assert all_entries(storage) == expected
+    assert len(storage.search_entries("notes", limit=100)) == len(years)
+
+
+def test_missing_archive_is_an_error(archived):
+    archived.close()
+    (archived.archive_folder / "diary-2019.1.db").unlink()
+
+    with DatabaseStorage(archived.config) as storage:
+        with pytest.raises(FileNotFoundError):
+            list(storage.iter_entries())
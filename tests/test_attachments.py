@@ -0,0 +1,93 @@
+"""Files attached to entries, stored once per content."""
+
+import pytest
+
+from lifelog.core import attachments
+from lifelog.core.attachments import AttachmentHandler, hash_file, parse_handle
+from lifelog.storage.file import FileStorage
+from tests.helpers import make_entry
+
+PAYLOAD = bytes(range(256)) * 1000
+
+
+@pytest.fixture(params=["database", "file"])
+def diary(request, config, storage):
+    if request.param == "file":
+        storage.close()
+        storage = FileStorage(config)
+
+    storage.add_entries([make_entry(f"Entry {day}", 2024, 1, day) for day in (1, 2)])
+
+    yield storage
+    storage.close()
+
+
+@pytest.fixture
+def photo(tmp_path):
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(PAYLOAD)
+    return path
+
+
+def test_attach_and_extract(diary, photo, tmp_path, capsys):
+    handler = AttachmentHandler(diary)
+    handler.attach(1, [str(photo), str(tmp_path / "missing.png")])
+
+    (attachment,) = diary.get_entry_attachments(1)
+    assert (attachment.name, attachment.mime_type, attachment.size) == (
+        "photo.jpg",
+        "image/jpeg",
+        len(PAYLOAD),
+    )
+    assert "missing.png: not a file" in capsys.readouterr().out
+
+    output = handler.extract(attachment.handle, tmp_path / "out.jpg")
+    assert output.read_bytes() == PAYLOAD
+
+
+def test_same_content_is_stored_once(diary, photo, tmp_path):
+    copy = tmp_path / "copy.jpg"
+    copy.write_bytes(PAYLOAD)
+
+    AttachmentHandler(diary).attach(1, [str(photo)])
+    AttachmentHandler(diary).attach(2, [str(copy)])
+
+    first, second = diary.get_entry_attachments(1), diary.get_entry_attachments(2)
+    assert first[0].digest == second[0].digest == hash_file(photo)
+    assert {
+        uid: [attachment.digest for attachment in found]
+        for uid, found in diary.get_attachments([diary.get_entry(2)]).items()
+    } == {2: [second[0].digest]}
+
+    if diary.type == "database":
+        stored = diary.connection.execute("SELECT count(*) FROM attachments")
+        assert stored.fetchone() == (1,)
+
+
+def test_a_file_changed_while_attaching_is_skipped(diary, photo, monkeypatch, capsys):
+    # As if the file was written to between hashing and copying it
+    monkeypatch.setattr(attachments, "hash_file", lambda path: b"\0" * 16)
+
+    AttachmentHandler(diary).attach(1, [str(photo)])
+
+    assert "changed while it was being attached" in capsys.readouterr().out
+    assert diary.get_entry_attachments(1) == []
+
+
+def test_unknown_entry(diary, photo, capsys):
+    AttachmentHandler(diary).attach(99, [str(photo)])
+
+    assert "No entry found with uid 99" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize(
+    "handle", ["att:12", "att:zz12345678ab", "", "att:" + "a" * 40]
+)
+def test_invalid_handles(handle):
+    with pytest.raises(ValueError, match="Invalid attachment handle"):
+        parse_handle(handle)
+
+
+def test_handles_and_longer_prefixes():
+    assert parse_handle("att:3f2a9c1b0d4e") == bytes.fromhex("3f2a9c1b0d4e")
+    assert parse_handle(" 3f2a9c1b0d4e55 ") == bytes.fromhex("3f2a9c1b0d4e55")
@@ -0,0 +1,130 @@
+"""Snapshots of the diary and its archives, and restoring from them."""
+
+import shutil
+import sqlite3
+
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from lifelog.core.backup import (
+    Backup,
+    list_snapshots,
+    reserve,
+    select_snapshots_to_keep,
+    snapshot_archives,
+)
+from lifelog.storage.database import DatabaseStorage
+from tests.helpers import all_entries, make_entry
+
+ENTRIES = [
+    make_entry(f"Day {day} of {year} #log " + "words " * day, year, 1 + day % 12, day)
+    for year in (2019, 2020, 2024)
+    for day in range(1, 29)
+]
+
+
+@pytest.fixture
+def backup(storage, tmp_path):
+    # One page per step, so the copy really runs in steps
+    return Backup(storage, tmp_path / "backups", pages_per_step=1, step_pause=0)
+
+
+def restore(config, snapshot):
+    """Restores a snapshot the way Backup's docstring describes."""
+    diary_db = Path(config.paths["diary_db"])
+    archive_folder = Path(config.paths["archive_folder"])
+
+    # A WAL left next to the old diary would be replayed onto the snapshot
+    for suffix in ("-wal", "-shm"):
+        diary_db.with_name(diary_db.name + suffix).unlink(missing_ok=True)
+
+    shutil.copyfile(snapshot, diary_db)
+    shutil.rmtree(archive_folder, ignore_errors=True)
+    shutil.copytree(snapshot_archives(snapshot), archive_folder)
+
+
+def test_restores_diary_and_archives(config, storage, backup):
+    storage.add_entries(ENTRIES)
+    storage.archive(2021)
+    expected = all_entries(storage)
+
+    snapshot = backup.run()
+
+    # Changed after the backup, and the 2019 archive replaced by a new one
+    storage.add_entry(make_entry("After the backup", 2024, 6, 1))
+    storage.update_entry(storage.get_entry(1), make_entry("Edited", 2024, 6, 2))
+    storage.add_entry(make_entry("Late 2019 note", 2019, 12, 1))
+    storage.archive(2021)
+    assert not (storage.archive_folder / "diary-2019.1.db").exists()
+    storage.close()
+
+    restore(config, snapshot)
+
+    with DatabaseStorage(config) as restored:
+        assert all_entries(restored) == expected
+        assert restored.get_entry_history(1) == []
+        assert len(restored.search_entries("day", limit=1000)) == len(ENTRIES)
+
+
+def test_snapshot_is_a_checked_standalone_database(storage, backup):
+    storage.add_entries(ENTRIES)
+    storage.archive(2021)
+
+    snapshot = backup.run()
+    copies = sorted(snapshot_archives(snapshot).iterdir())
+
+    assert [copy.name for copy in copies] == ["diary-2019.1.db", "diary-2020.1.db"]
+
+    for path in (snapshot, *copies):
+        connection = sqlite3.connect(path)
+        try:
+            assert connection.execute("PRAGMA journal_mode").fetchone() == ("delete",)
+            assert connection.execute("PRAGMA integrity_check").fetchall() == [("ok",)]
+        finally:
+            connection.close()
+
+    assert not list(snapshot.parent.glob("*.partial"))
+
+
+def test_diary_without_archives(storage, backup):
+    storage.add_entries(ENTRIES)
+
+    snapshot = backup.run()
+
+    assert snapshot.exists()
+    assert not snapshot_archives(snapshot).exists()
+
+
+def test_never_overwrites_a_snapshot(storage, backup):
+    storage.add_entry(make_entry("Only entry", 2024, 1, 1))
+
+    first = backup.run()
+    second = backup.run()
+
+    assert first != second
+    assert [path for _, path in list_snapshots(backup.folder)] == [second, first]
+
+    with pytest.raises(FileExistsError):
+        reserve(first, first.with_name(first.name + ".partial"))
+
+
+def test_keeps_grandfather_father_son_snapshots():
+    newest = datetime(2026, 3, 31, 12)
+    taken = [newest - timedelta(hours=12 * step) for step in range(200)]
+    retention = {"last": 3, "daily": 5, "weekly": 2, "monthly": 3}
+
+    keep = select_snapshots_to_keep(taken, retention)
+
+    assert keep == {
+        # the last 3
+        datetime(2026, 3, 31, 12),
+        datetime(2026, 3, 31, 0),
+        datetime(2026, 3, 30, 12),
+        # the newest of 5 days, of this week and the last, and of 3 months
+        *(datetime(2026, 3, day, 12) for day in range(27, 30)),
+        datetime(2026, 2, 28, 12),
+        datetime(2026, 1, 31, 12),
+    }
+    assert select_snapshots_to_keep(taken, {}) == {newest}
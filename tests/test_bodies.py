@@ -0,0 +1,129 @@
+"""Content-addressed bodies: shared rows, their refs and compression."""
+
+import sqlite3
+
+import pytest
+
+from lifelog.core.entry import make_preview
+from lifelog.storage.bodies import body_hash
+from lifelog.storage.database import DatabaseStorage
+from tests.helpers import all_entries, make_entry
+
+TEMPLATE = "Mood:\nSleep:\nWorkout:\n"
+LONG = "A long day, written out in full. " * 40
+
+
+def body_rows(storage):
+    """Returns {body: (refs, references)}, references counted from the
+    entries and history keyframes actually pointing at the row."""
+    rows = storage.connection.execute(
+        """
+        SELECT b.hash, b.refs,
+               (SELECT count(*) FROM entries e WHERE e.body_id = b.body_id)
+               + (SELECT count(*) FROM entries_history h WHERE h.body_id = b.body_id)
+        FROM bodies b
+        """
+    )
+
+    return {digest: (refs, references) for digest, refs, references in rows}
+
+
+def assert_refs_consistent(storage):
+    for refs, references in body_rows(storage).values():
+        assert refs == references > 0
+
+
+def test_identical_bodies_are_stored_once(storage):
+    storage.add_entries([make_entry(TEMPLATE, 2024, 1, day) for day in range(1, 11)])
+    storage.add_entry(make_entry(TEMPLATE, 2024, 1, 11))
+
+    assert body_rows(storage) == {body_hash(TEMPLATE): (11, 11)}
+
+
+def test_refs_follow_edits(storage):
+    storage.add_entries([make_entry(TEMPLATE, 2024, 1, day) for day in (1, 2)])
+    first = storage.get_entry(1)
+
+    assert not storage.update_entry(first, make_entry(TEMPLATE, 2024, 1, 3))
+    assert storage.update_entry(first, make_entry("Mood: good", 2024, 1, 3))
+    assert_refs_consistent(storage)
+
+    # The template lives on as entry 2 and as entry 1's first version
+    assert body_rows(storage)[body_hash(TEMPLATE)] == (2, 2)
+
+    second = storage.get_entry(2)
+    assert storage.update_entry(second, make_entry("Mood: tired", 2024, 1, 4))
+    assert body_rows(storage)[body_hash(TEMPLATE)] == (2, 2)
+    assert_refs_consistent(storage)
+
+
+def test_unreferenced_bodies_are_deleted(storage):
+    storage.add_entries(
+        [make_entry(TEMPLATE, 2020, 1, 1), make_entry(LONG, 2024, 1, 1)]
+    )
+    storage.archive(2021)
+
+    assert set(body_rows(storage)) == {body_hash(LONG)}
+    assert_refs_consistent(storage)
+
+
+@pytest.mark.parametrize("codec", ["none", "zlib", "lzma", "bz2"])
+def test_bodies_round_trip_through_each_codec(config, codec):
+    config.storage["body_compression"] = codec
+    bodies = ["", "short", LONG, "日記 " * 200]
+
+    with DatabaseStorage(config) as storage:
+        storage.add_entries(
+            [make_entry(body, 2024, 1, day) for day, body in enumerate(bodies, 1)]
+        )
+        codecs = dict(
+            storage.connection.execute("SELECT hash, codec FROM bodies").fetchall()
+        )
+
+        assert [body for _, body in sorted(all_entries(storage).values())] == bodies
+        assert [header.preview for header in storage.iter_entry_headers()] == [
+            make_preview(body) for body in reversed(bodies)
+        ]
+
+    assert codecs[body_hash("short")] is None
+    assert codecs[body_hash(LONG)] == (None if codec == "none" else codec)
+
+
+def test_unknown_codec_is_rejected(config):
+    config.storage["body_compression"] = "brotli"
+
+    with pytest.raises(ValueError, match="body_compression"):
+        DatabaseStorage(config)
+
+
+def test_other_connections_can_write_entries(config, storage):
+    storage.add_entries([make_entry(LONG, 2024, 1, 1), make_entry("short", 2024, 1, 2)])
+    storage.update_entry(storage.get_entry(1), make_entry(LONG + "edited", 2024, 1, 3))
+    storage.close()
+
+    # No body_text() here, like the sqlite3 shell
+    connection = sqlite3.connect(config.paths["diary_db"])
+    with connection:
+        connection.execute(
+            "INSERT INTO bodies (hash, body) VALUES (?, 'Written by hand')",
+            (body_hash("Written by hand"),),
+        )
+        connection.execute(
+            """
+            INSERT INTO entries (timestamp, body_id, word_count)
+            SELECT 1717200000000000, max(body_id), 3 FROM bodies
+            """
+        )
+        connection.execute("UPDATE entries SET body_id = 4 WHERE entry_id = 2")
+        connection.execute("DELETE FROM entries WHERE entry_id = 1")
+    connection.close()
+
+    with DatabaseStorage(config) as storage:
+        storage.rebuild_stats()
+
+        assert sorted(entry.uid for entry, _ in storage.search_entries("hand")) == [
+            2,
+            3,
+        ]
+        assert storage.search_entries("edited OR short") == []
+        assert_refs_consistent(storage)
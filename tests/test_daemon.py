@@ -0,0 +1,176 @@
+"""The daemon and the thin client that hands commands to it."""
+
+import os
+import socket
+import stat
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from lifelog.cli.args import parse_args
+from lifelog.client import (
+    DaemonError,
+    SOCKET_NAME,
+    peer_uid,
+    send_request,
+    socket_path,
+)
+from lifelog.core.daemon import runs_in_client
+from lifelog.storage.database import DatabaseStorage
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket, "AF_UNIX"), reason="the daemon needs Unix sockets"
+)
+
+STARTUP_TIMEOUT = 10  # seconds
+
+
+@pytest.fixture
+def socket_file(tmp_path, monkeypatch):
+    # AF_UNIX paths are short, tmp_path can be too long on some systems
+    path = tmp_path / "run" / SOCKET_NAME
+    monkeypatch.setenv("LIFELOG_SOCKET", str(path))
+    return path
+
+
+def run_client(config, *argv):
+    return subprocess.run(
+        [sys.executable, "-m", "lifelog.client", "--config-file", config, *argv],
+        capture_output=True,
+        text=True,
+        timeout=STARTUP_TIMEOUT,
+        env=os.environ | {"PYTHONPATH": os.getcwd()},
+    )
+
+
+@pytest.fixture
+def daemon(config, socket_file):
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "lifelog",
+            "--config-file",
+            str(config.config_file),
+            "daemon",
+        ],
+        stdout=subprocess.DEVNULL,
+        env=os.environ | {"PYTHONPATH": os.getcwd()},
+    )
+
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while send_request({"command": "ping"}, socket_file) is None:
+        assert process.poll() is None, "the daemon exited"
+        assert time.monotonic() < deadline, "the daemon didn't start"
+        time.sleep(0.05)
+
+    yield process
+
+    send_request({"command": "stop"}, socket_file)
+    process.wait(STARTUP_TIMEOUT)
+
+
+def test_default_socket_is_in_a_folder_of_its_own(monkeypatch):
+    monkeypatch.delenv("LIFELOG_SOCKET", raising=False)
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+
+    assert socket_path() == f"/tmp/lifelog-{os.getuid()}/{SOCKET_NAME}"
+
+
+def test_captures_through_the_daemon(config, socket_file, daemon):
+    result = run_client(str(config.config_file), "-m", "Sent to the daemon")
+
+    assert result.returncode == 0
+    assert "Created entry" in result.stdout
+    assert stat.S_IMODE(socket_file.parent.stat().st_mode) == 0o700
+
+    with DatabaseStorage(config) as storage:
+        assert [entry.body for entry in storage.iter_entries()] == [
+            "Sent to the daemon"
+        ]
+
+
+def test_without_a_daemon_the_client_runs_the_command(config, socket_file):
+    assert send_request({"command": "ping"}, socket_file) is None
+
+    result = run_client(str(config.config_file), "-m", "No daemon around")
+
+    assert result.returncode == 0
+
+    with DatabaseStorage(config) as storage:
+        assert [entry.body for entry in storage.iter_entries()] == ["No daemon around"]
+
+
+def test_a_lost_response_is_not_run_again(config, socket_file):
+    # Takes the request and hangs up, like a daemon that crashed mid-command
+    socket_file.parent.mkdir(mode=0o700)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(socket_file))
+    server.listen()
+
+    def hang_up():
+        connection, _ = server.accept()
+        with connection:
+            while connection.recv(65536):
+                pass
+
+    thread = threading.Thread(target=hang_up)
+    thread.start()
+
+    try:
+        result = run_client(str(config.config_file), "-m", "Maybe written")
+    finally:
+        thread.join()
+        server.close()
+
+    assert result.returncode == 1
+    assert "may or may not have run" in result.stderr
+
+    with DatabaseStorage(config) as storage:
+        assert list(storage.iter_entries()) == []
+
+
+def test_send_request_raises_once_sent(socket_file):
+    socket_file.parent.mkdir(mode=0o700)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(socket_file))
+    server.listen()
+
+    thread = threading.Thread(target=lambda: server.accept()[0].close())
+    thread.start()
+
+    try:
+        with pytest.raises(DaemonError):
+            send_request({"command": "ping"}, socket_file)
+    finally:
+        thread.join()
+        server.close()
+
+
+def test_peer_uid_is_the_daemons():
+    left, right = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    with left, right:
+        assert peer_uid(left, None) == os.getuid()
+
+
+@pytest.mark.parametrize(
+    "argv, in_client",
+    [
+        (["-m", "note"], False),
+        (["--search", "word"], False),
+        (["stats"], False),
+        (["-m", "-"], True),
+        (["-r"], True),
+        ([], True),
+        (["export", "out.jsonl"], True),
+        (["import", "notes"], True),
+        (["backup"], True),
+        (["archive"], True),
+    ],
+)
+def test_long_and_interactive_commands_run_in_the_client(argv, in_client):
+    assert runs_in_client(parse_args(argv)) == in_client
@@ -0,0 +1,124 @@
+"""Exports in each format, and importing them back."""
+
+import gzip
+import json
+import tarfile
+
+from datetime import datetime
+
+import pytest
+
+from lifelog.core import exporter
+from lifelog.core.attachments import hash_file
+from lifelog.core.exporter import Exporter
+from lifelog.core.importer import Importer
+from lifelog.storage.database import DatabaseStorage
+from tests.helpers import all_entries, make_entry
+
+ENTRIES = [
+    make_entry(f"Day {day} of {year}\n\nSecond paragraph, #log", year, 3, day, 8, day)
+    for year in (2019, 2024)
+    for day in range(1, 6)
+]
+
+
+@pytest.fixture
+def diary(storage, tmp_path, monkeypatch):
+    # Small chunks, so attachments are looked up across several of them
+    monkeypatch.setattr(exporter, "EXPORT_CHUNK_SIZE", 3)
+
+    storage.add_entries(ENTRIES)
+    storage.archive(2020)
+
+    photo = tmp_path / "photo.jpg"
+    photo.write_bytes(b"not really a jpeg")
+    for uid in (2, 7):
+        storage.add_attachment(uid, photo, "photo.jpg", "image/jpeg", hash_file(photo))
+
+    return storage
+
+
+def reimported(config, tmp_path, path):
+    with DatabaseStorage(config, tmp_path / "reimported.db") as storage:
+        Importer(storage).run([str(path)])
+        return sorted(all_entries(storage).values())
+
+
+@pytest.mark.parametrize("name", ["export.jsonl", "export.jsonl.gz", "export"])
+def test_round_trips_through_import(config, tmp_path, diary, name):
+    destination = tmp_path / name
+
+    assert Exporter(diary, workers=2).run(destination) == len(ENTRIES)
+
+    if name.endswith(".gz"):
+        plain = tmp_path / "export.jsonl"
+        plain.write_bytes(gzip.decompress(destination.read_bytes()))
+        destination = plain
+
+    assert reimported(config, tmp_path, destination) == sorted(
+        (entry.timestamp, entry.body) for entry in ENTRIES
+    )
+
+
+def test_jsonl_lists_attachments(tmp_path, diary):
+    destination = tmp_path / "export.jsonl"
+    Exporter(diary).run(destination)
+
+    records = {
+        record["uid"]: record
+        for record in map(json.loads, destination.read_text().splitlines())
+    }
+
+    assert {uid for uid, record in records.items() if "attachments" in record} == {
+        2,
+        7,
+    }
+    assert records[2]["attachments"] == [
+        {
+            "handle": diary.get_entry_attachments(2)[0].handle,
+            "name": "photo.jpg",
+            "mime_type": "image/jpeg",
+            "size": 17,
+        }
+    ]
+
+
+def test_markdown_lists_attachments_outside_the_body(tmp_path, diary):
+    Exporter(diary).run(tmp_path / "export")
+
+    text = (tmp_path / "export" / "2019" / "03" / "2019-03-02.md").read_text()
+
+    assert text == (
+        "## 2019-03-02 08:02:00\n\n"
+        "Day 2 of 2019\n\nSecond paragraph, #log\n\n"
+        "<!-- lifelog:attachments -->\n"
+        f"- Attachment: {diary.get_entry_attachments(2)[0]}\n\n"
+    )
+
+
+def test_tarball_holds_the_markdown_tree(tmp_path, diary):
+    Exporter(diary).run(tmp_path / "export")
+    Exporter(diary).run(tmp_path / "export.tar.gz")
+
+    with tarfile.open(tmp_path / "export.tar.gz") as tar:
+        members = {
+            member.name: tar.extractfile(member).read() for member in tar.getmembers()
+        }
+
+    assert members == {
+        str(path.relative_to(tmp_path)): path.read_bytes()
+        for path in (tmp_path / "export").rglob("*.md")
+    }
+
+
+def test_exports_a_date_range(tmp_path, diary):
+    destination = tmp_path / "export.jsonl"
+    exported = Exporter(diary).run(
+        destination, since=datetime(2024, 1, 1), until=datetime(2024, 3, 3)
+    )
+
+    assert exported == 2
+    assert [
+        json.loads(line)["body"].split("\n")[0]
+        for line in destination.read_text().splitlines()
+    ] == ["Day 2 of 2024", "Day 1 of 2024"]
@@ -0,0 +1,120 @@
+"""The file backend's journal, and recovering it after a crash."""
+
+from datetime import datetime
+
+import pytest
+
+from lifelog.storage.file import INDEX_RECORD, RECORD_HEADER, FileStorage
+from tests.helpers import all_entries, make_entry
+
+ENTRIES = [
+    make_entry(f"Entry {day}: #log " + "é" * day, 2024, 1, day) for day in range(1, 29)
+]
+
+
+@pytest.fixture
+def journal(config):
+    """Writes ENTRIES with one edit, returns the folder and what it reads as."""
+    # Small segments, so the entries span several of them
+    config.storage["segment_size"] = 256
+
+    with FileStorage(config) as storage:
+        storage.add_entries(ENTRIES[:20])
+        for entry in ENTRIES[20:]:
+            storage.add_entry(entry)
+        storage.update_entry(
+            storage.get_entry(3), make_entry("Edited #log", 2024, 2, 1)
+        )
+
+        return storage.folder, all_entries(storage)
+
+
+def segments(folder):
+    return sorted(folder.glob("segment-*.log"))
+
+
+def test_reads_back_across_segments(config, journal):
+    folder, expected = journal
+
+    assert len(segments(folder)) > 1
+    assert len(expected) == len(ENTRIES)
+
+    with FileStorage(config) as storage:
+        assert all_entries(storage) == expected
+        assert storage.get_entry(3).body == "Edited #log"
+        assert storage.get_entry_history(3) == [(1, datetime(2024, 2, 1))]
+        assert storage.get_entry_version(3, 1).body == ENTRIES[2].body
+
+
+@pytest.mark.parametrize("kept", [0, 5, 20])
+def test_rebuilds_a_lost_index(config, journal, kept):
+    folder, expected = journal
+    index = folder / "index.bin"
+
+    with open(index, "r+b") as f:
+        f.truncate(kept * INDEX_RECORD.size)
+
+    with FileStorage(config) as storage:
+        assert all_entries(storage) == expected
+
+    # The recovered records were indexed again, the next open reads them
+    assert index.stat().st_size == (len(ENTRIES) + 1) * INDEX_RECORD.size
+
+
+def test_drops_a_torn_index_record(config, journal):
+    folder, expected = journal
+    index = folder / "index.bin"
+
+    with open(index, "ab") as f:
+        f.write(b"\x01" * (INDEX_RECORD.size // 2))
+
+    with FileStorage(config) as storage:
+        assert all_entries(storage) == expected
+
+    assert index.stat().st_size == (len(ENTRIES) + 1) * INDEX_RECORD.size
+
+
+@pytest.mark.parametrize(
+    "tail",
+    [
+        b"LLE1",
+        RECORD_HEADER.pack(b"LLE1", 99, 0, 0, 100, 0) + b"cut short",
+        RECORD_HEADER.pack(b"LLE1", 99, 0, 0, 3, 12345) + b"bad",
+        b"\x00" * RECORD_HEADER.size,
+    ],
+    ids=["torn header", "torn body", "bad checksum", "zeroed"],
+)
+def test_truncates_a_torn_segment_record(config, journal, tail):
+    folder, expected = journal
+    last = segments(folder)[-1]
+    size = last.stat().st_size
+
+    with open(last, "ab") as f:
+        f.write(tail)
+
+    with FileStorage(config) as storage:
+        assert all_entries(storage) == expected
+        assert last.stat().st_size == size
+
+        storage.add_entry(make_entry("After the crash", 2024, 3, 1))
+
+    with FileStorage(config) as storage:
+        entries = all_entries(storage)
+
+        assert entries.pop(len(ENTRIES) + 1) == (
+            datetime(2024, 3, 1),
+            "After the crash",
+        )
+        assert entries == expected
+
+
+def test_import_checkpoints_survive_a_lost_index(config):
+    checkpoints = [("notes.jsonl", 1234, False, 5678, 42)]
+
+    with FileStorage(config) as storage:
+        storage.add_entries(ENTRIES[:3], checkpoints)
+        (storage.folder / "index.bin").unlink()
+
+    with FileStorage(config) as storage:
+        assert storage.get_import_progress() == {"notes.jsonl": (1234, False, 5678, 42)}
+        assert len(all_entries(storage)) == 3
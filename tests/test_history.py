@@ -0,0 +1,86 @@
+"""Past versions stored as keyframes and deltas against them."""
+
+import pytest
+
+from lifelog.storage.database import DatabaseStorage
+from lifelog.storage.history import apply_delta, encode_delta
+from tests.helpers import make_entry
+
+INTERVAL = 4
+
+
+@pytest.fixture
+def edited(config):
+    """An entry edited 10 times, returns the storage and every body it had."""
+    config.storage["history_keyframe_interval"] = INTERVAL
+    lines = [
+        f"Line {number} of a long entry, kept between edits\n" for number in range(50)
+    ]
+    bodies = []
+
+    with DatabaseStorage(config) as storage:
+        storage.add_entry(make_entry("".join(lines), 2024, 1, 1))
+
+        for edit in range(10):
+            lines[edit * 3] = f"Rewritten in edit {edit}\n"
+            bodies.append(storage.get_entry(1).body)
+            storage.update_entry(
+                storage.get_entry(1), make_entry("".join(lines), 2024, 1, 2 + edit)
+            )
+
+        bodies.append(storage.get_entry(1).body)
+        yield storage, bodies
+
+
+def test_every_version_reads_back(edited):
+    storage, bodies = edited
+
+    assert [version for version, _ in storage.get_entry_history(1)] == list(
+        range(1, len(bodies))
+    )
+
+    for version, body in enumerate(bodies[:-1], 1):
+        assert storage.get_entry_version(1, version).body == body
+
+    assert storage.get_entry(1).body == bodies[-1]
+    assert storage.get_entry_version(1, len(bodies)) is None
+
+
+def test_keyframes_every_interval(edited):
+    storage, _ = edited
+    rows = storage.connection.execute(
+        """
+        SELECT version, base_version, body_id IS NOT NULL, length(data)
+        FROM entries_history
+        WHERE entry_id = 1
+        ORDER BY version
+        """
+    ).fetchall()
+
+    keyframes = [version for version, base, _, _ in rows if base is None]
+    assert keyframes == [1, 5, 9]
+
+    for version, base, has_body, size in rows:
+        if base is None:
+            assert has_body and size is None
+        else:
+            # Deltas never chain, and are far smaller than the body
+            assert base == max(k for k in keyframes if k < version)
+            assert not has_body and size < 200
+
+
+@pytest.mark.parametrize(
+    "base, body",
+    [
+        ("", ""),
+        ("", "new\n"),
+        ("old\n", ""),
+        ("one\ntwo\nthree", "one\n2\nthree"),
+        ("no newline at the end", "no newline at the end\n"),
+        ("windows\r\nlines\r\n", "windows\r\nlines\r\nadded\r\n"),
+        ("a\nb\nc\n", "c\nb\na\n"),
+        ("日記\n", "日記\n🎉\n"),
+    ],
+)
+def test_delta_round_trip(base, body):
+    assert apply_delta(base, encode_delta(base, body)) == body
@@ -0,0 +1,128 @@
+"""`lifelog import`: the source formats, and resuming where it stopped."""
+
+import json
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from lifelog.core.importer import Importer, parse_timestamp
+from tests.helpers import all_entries
+
+
+@pytest.fixture
+def sources(tmp_path):
+    folder = tmp_path / "sources"
+    (folder / "notes").mkdir(parents=True)
+    (folder / ".hidden").mkdir()
+
+    (folder / "journal.md").write_text(
+        "## 2024-03-01 08:15\n\nFirst day\n\n"
+        "## 2024-03-02\n\nSecond day\n\n"
+        "<!-- lifelog:attachments -->\n- Attachment: att:3f2a9c1b0d4e photo.jpg\n\n"
+        "# 20240303T2130\n\nThird day\n"
+    )
+    (folder / "notes" / "2023-12-31.txt").write_text("New year's eve\n")
+    (folder / ".hidden" / "2023-01-01.txt").write_text("Not imported\n")
+    (folder / "export.jsonl").write_text(
+        "\n".join(
+            json.dumps(record)
+            for record in [
+                {"body": "From JSON", "timestamp": "2024-04-01T10:00:00"},
+                {"text": "Epoch millis", "created_at": 1711965600000},
+                {"timestamp": "2024-04-03"},
+                {"body": "Bad date", "date": "yesterday"},
+            ]
+        )
+        + "\n\n"
+    )
+
+    return folder
+
+
+def test_imports_every_format(storage, sources):
+    assert Importer(storage).run([str(sources)]) == 6
+
+    assert sorted(all_entries(storage).values()) == sorted(
+        [
+            (datetime(2023, 12, 31), "New year's eve"),
+            (datetime(2024, 3, 1, 8, 15), "First day"),
+            (datetime(2024, 3, 2), "Second day"),
+            (datetime(2024, 3, 3, 21, 30), "Third day"),
+            (datetime(2024, 4, 1, 10), "From JSON"),
+            (datetime.fromtimestamp(1711965600), "Epoch millis"),
+        ]
+    )
+
+
+def test_resumes_after_an_interruption(storage, sources, monkeypatch):
+    add_entries = storage.add_entries
+    batches = []
+
+    def interrupted(entries, **kwargs):
+        if len(batches) == 2:
+            raise KeyboardInterrupt
+        batches.append(len(entries))
+        add_entries(entries, **kwargs)
+
+    monkeypatch.setattr(storage, "add_entries", interrupted)
+    assert Importer(storage, batch_size=2).run([str(sources)]) == 4
+
+    monkeypatch.setattr(storage, "add_entries", add_entries)
+    assert Importer(storage, batch_size=2).run([str(sources)]) == 2
+
+    # Every entry once, none written twice
+    assert sorted(body for _, body in all_entries(storage).values()) == sorted(
+        [
+            "New year's eve",
+            "First day",
+            "Second day",
+            "Third day",
+            "From JSON",
+            "Epoch millis",
+        ]
+    )
+
+
+def test_skips_unchanged_files_and_continues_grown_ones(storage, sources, capsys):
+    Importer(storage).run([str(sources)])
+
+    assert Importer(storage).run([str(sources)]) == 0
+    assert "(3 unchanged files skipped)" in capsys.readouterr().out
+
+    with open(sources / "export.jsonl", "a") as f:
+        f.write(json.dumps({"body": "Appended", "date": "2024-05-01"}) + "\n")
+
+    assert Importer(storage).run([str(sources)]) == 1
+    assert len(all_entries(storage)) == 7
+
+
+def test_missing_source(storage, tmp_path):
+    with pytest.raises(FileNotFoundError, match="does not exist"):
+        Importer(storage).run([str(tmp_path / "missing")])
+
+
+@pytest.mark.parametrize(
+    "value, timestamp",
+    [
+        (None, None),
+        ("", None),
+        ("2024-03-01 08:15", datetime(2024, 3, 1, 8, 15)),
+        (1709280900, datetime.fromtimestamp(1709280900)),
+        (1709280900500, datetime.fromtimestamp(1709280900.5)),
+        (
+            "2024-03-01T08:15:00Z",
+            datetime(2024, 3, 1, 8, 15, tzinfo=timezone.utc)
+            .astimezone()
+            .replace(tzinfo=None),
+        ),
+        (
+            "2024-03-01T08:15:00+02:00",
+            datetime(2024, 3, 1, 8, 15, tzinfo=timezone(timedelta(hours=2)))
+            .astimezone()
+            .replace(tzinfo=None),
+        ),
+    ],
+)
+def test_parse_timestamp(value, timestamp):
+    assert parse_timestamp(value) == timestamp
@@ -0,0 +1,84 @@
+"""Entries streamed in with `lifelog -m -`."""
+
+import io
+import queue
+
+import pytest
+
+from lifelog.cli.args import parse_args
+from lifelog.core.ingest import StreamIngester, read_records
+
+
+class Pipe:
+    """A stream handing out `pieces` one read at a time, like a pipe."""
+
+    def __init__(self, pieces):
+        self.pieces = list(pieces)
+
+    def read1(self, size):
+        return self.pieces.pop(0) if self.pieces else b""
+
+    read = read1
+
+
+def records_of(pieces, separator):
+    chunks = queue.Queue()
+    read_records(Pipe(pieces), separator, chunks)
+
+    bodies = []
+    while (chunk := chunks.get_nowait()) is not None:
+        bodies.extend(chunk[1])
+
+    return bodies
+
+
+@pytest.mark.parametrize("separator", [b"\n", b"\0", b"\n\n", b"--8<--"])
+def test_splits_records_across_reads(separator):
+    records = ["first", "second, longer" * 50, "日記 🎉", "last"]
+    data = separator.join(record.encode("utf-8") for record in records)
+
+    for size in (1, 2, 3, 7, len(data)):
+        pieces = [data[start : start + size] for start in range(0, len(data), size)]
+        assert records_of(pieces, separator) == records
+
+
+def test_skips_blank_records():
+    assert records_of([b"\n\n one \n\n\ntwo\n"], b"\n") == ["one", "two"]
+
+
+def test_reports_a_failing_stream():
+    class Broken:
+        def read1(self, size):
+            raise OSError("gone")
+
+        read = read1
+
+    chunks = queue.Queue()
+    read_records(Broken(), b"\n", chunks)
+
+    assert isinstance(chunks.get_nowait(), OSError)
+
+
+def test_writes_every_record_in_batches(storage):
+    stream = io.BytesIO(b"".join(b"entry %d\0" % number for number in range(25)))
+
+    written = StreamIngester(storage, batch_size=10).run(stream, "\0")
+
+    assert written == 25
+    assert sorted(entry.body for entry in storage.iter_entries()) == sorted(
+        f"entry {number}" for number in range(25)
+    )
+
+
+@pytest.mark.parametrize(
+    "value, separator", [(r"\0", "\0"), (r"\n\n", "\n\n"), ("§", "§")]
+)
+def test_separator_escapes(value, separator):
+    assert parse_args(["-m", "-", "--separator", value]).separator == separator
+
+
+def test_empty_separator_is_rejected(capsys):
+    with pytest.raises(SystemExit):
+        parse_args(["-m", "-", "--separator", ""])
+
+    assert "separator can't be empty" in capsys.readouterr().err
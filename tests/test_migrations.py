@@ -0,0 +1,134 @@
+"""A diary written before any of the later migrations, migrated on open."""
+
+import ast
+import sqlite3
+
+from datetime import date, datetime
+from pathlib import Path
+
+import pytest
+
+from lifelog.storage.database import DatabaseStorage
+from lifelog.storage.migrations import find_migrations, split_statements
+from tests.helpers import all_entries, make_entry
+
+SCHEMAS_PATH = Path(__file__).parent.parent / "lifelog" / "storage" / "schemas"
+BASELINE_VERSION = 2
+
+# As the baseline wrote them: sqlite3's default adapter stored ISO text
+BASELINE_ENTRIES = [
+    ("2019-05-01 08:30:00", "First entry, about #running with @alice", None),
+    ("2019-05-01 21:00:00", "Evening notes " * 100, None),
+    ("2020-02-29 12:00:00.250000", "Leap day, edited twice #work", "2020-03-02"),
+    ("2021-07-14 09:15:00", "Unicode stays intact: café, 日記, émoji 🎉", None),
+]
+BASELINE_HISTORY = [
+    # entry 3 was "Leap day" before its two edits
+    (3, "2020-02-29 12:00:00.250000", "Leap day", "2020-03-01 10:00:00"),
+    (3, "2020-02-29 12:00:00.250000", "Leap day, edited", "2020-03-02 10:00:00"),
+]
+
+
+def make_baseline_db(path):
+    connection = sqlite3.connect(path)
+
+    with connection:
+        for version, migration in find_migrations(SCHEMAS_PATH):
+            if version > BASELINE_VERSION:
+                break
+
+            for statement in split_statements(migration.read_text()):
+                connection.execute(statement)
+
+        connection.executemany(
+            "INSERT INTO entries (timestamp, body, updated_at) VALUES (?, ?, ?)",
+            BASELINE_ENTRIES,
+        )
+        connection.executemany(
+            """
+            INSERT INTO entries_history (entry_id, timestamp, body, archived_at)
+            VALUES (?, ?, ?, ?)
+            """,
+            BASELINE_HISTORY,
+        )
+        connection.execute(f"PRAGMA user_version = {BASELINE_VERSION}")
+
+    connection.close()
+
+
+@pytest.fixture
+def migrated(config):
+    make_baseline_db(config.paths["diary_db"])
+
+    with DatabaseStorage(config) as storage:
+        yield storage
+
+
+def test_migrates_to_latest_version(migrated):
+    assert migrated.schema_version == find_migrations(SCHEMAS_PATH)[-1][0]
+
+
+def test_entries_survive(migrated):
+    assert all_entries(migrated) == {
+        uid: (datetime.fromisoformat(timestamp), body)
+        for uid, (timestamp, body, _) in enumerate(BASELINE_ENTRIES, 1)
+    }
+
+
+def test_history_survives(migrated):
+    assert [version for version, _ in migrated.get_entry_history(3)] == [1, 2]
+
+    for version, (_, _, body, _) in enumerate(BASELINE_HISTORY, 1):
+        assert migrated.get_entry_version(3, version).body == body
+
+
+def test_derived_tables_are_filled(migrated):
+    assert [entry.uid for entry, _ in migrated.search_entries("leap")] == [3]
+    assert [entry.uid for entry, _ in migrated.search_entries("日記")] == [4]
+    assert dict(migrated.get_tag_counts()) == {"#running": 1, "@alice": 1, "#work": 1}
+    assert migrated.get_daily_stats(datetime(2019, 5, 1), datetime(2019, 5, 2)) == [
+        (date(2019, 5, 1), 2, 206)
+    ]
+    assert len(list(migrated.iter_entry_vectors())) == len(BASELINE_ENTRIES)
+
+
+def test_migrated_diary_takes_writes(migrated):
+    old = migrated.get_entry(3)
+    edited = make_entry("Leap day, edited three times #work #done", 2020, 3, 5)
+
+    assert migrated.update_entry(old, edited)
+    assert migrated.get_entry(3).body == edited.body
+    assert [version for version, _ in migrated.get_entry_history(3)] == [1, 2, 3]
+    assert migrated.get_entry_version(3, 3).body == old.body
+
+    migrated.add_entry(make_entry("After the migration", 2022, 1, 1))
+    assert migrated.get_entry(5).body == "After the migration"
+
+
+def test_opening_again_changes_nothing(config, migrated):
+    before = all_entries(migrated)
+    migrated.close()
+
+    with DatabaseStorage(config) as storage:
+        assert storage.schema_version == migrated.schema_version
+        assert all_entries(storage) == before
+
+
+def test_migrations_are_self_contained():
+    # Frozen as they were written, later changes to lifelog must not change
+    # what an old diary is migrated to
+    for _, migration in find_migrations(SCHEMAS_PATH):
+        if migration.suffix != ".py":
+            continue
+
+        for node in ast.walk(ast.parse(migration.read_text())):
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom):
+                modules = [node.module or ""]
+            else:
+                continue
+
+            assert not any(module.split(".")[0] == "lifelog" for module in modules), (
+                migration.name
+            )
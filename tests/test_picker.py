@@ -0,0 +1,107 @@
+"""Fuzzy filtering in the entry picker, without a terminal."""
+
+from itertools import count
+
+import pytest
+
+from lifelog.cli.picker import Filter, Picker, fuzzy_score
+
+ITEMS = [
+    "2024-01-03 Walked the dog",
+    "2024-01-02 Dinner with Alice",
+    "2024-01-01 New year, new diary",
+    "2023-12-31 Fireworks downtown",
+]
+
+
+def run_filter(words, items, optional=()):
+    scan = Filter(words, iter(items), "scan", optional)
+    while not scan.done:
+        scan.advance(1)
+    return scan
+
+
+@pytest.mark.parametrize(
+    "word, better, worse",
+    [
+        ("dog", "dog walk", "a hotdog stand"),  # start of a word beats inside one
+        ("dinner", "dinner", "d i n n e r"),  # a substring beats scattered letters
+        ("diary", "d-i-a-r-y", "d-i-a-r---y"),  # close letters beat spread out
+    ],
+)
+def test_fuzzy_score_ranks(word, better, worse):
+    assert fuzzy_score([word], better) > fuzzy_score([word], worse)
+
+
+def test_fuzzy_score_needs_every_word():
+    assert fuzzy_score(["dog", "cat"], "walked the dog") is None
+    assert fuzzy_score(["gd"], "walked the dog") is None
+    assert fuzzy_score(["dog", "cat"], "walked the dog", optional={"cat"}) == 35
+
+
+def test_filter_orders_by_score_then_position():
+    scan = run_filter(["new"], [item.lower() for item in ITEMS])
+
+    assert scan.results() == [
+        "2024-01-01 new year, new diary",
+        "2024-01-02 dinner with alice",  # n, e and w in order
+    ]
+
+
+def test_filter_stops_within_its_budget():
+    scan = Filter(["entry"], (f"entry {number}" for number in count()), "scan")
+    scan.advance(0.01)
+
+    assert not scan.done
+    assert 0 < scan.position == len(scan.results())
+
+
+def test_narrowing_keeps_scanning_where_it_stopped():
+    items = [f"entry {number}" for number in range(100_000)]
+    scan = Filter(["entry"], iter(items), "scan")
+    scan.advance(0.001)
+
+    narrowed = scan.narrow(["entry", "99"])
+    assert 0 < narrowed.position == scan.position < len(items)
+
+    while not narrowed.done:
+        narrowed.advance(1)
+
+    assert sorted(narrowed.results()) == sorted(
+        item for item in items if fuzzy_score(["entry", "99"], item) is not None
+    )
+
+
+def test_picker_uses_the_index_for_whole_words():
+    searched = []
+
+    def search(words):
+        searched.append(words)
+        return iter(ITEMS[1:2])
+
+    picker = Picker(lambda page_size: iter(ITEMS), "title", search=search)
+
+    assert picker._make_filter("alice").kind == "index"
+    assert picker._make_filter("al").kind == "index"
+    assert picker._make_filter("a").kind == "scan"
+    assert searched == [["alice"], ["al"]]
+
+
+def test_picker_narrows_a_scan_as_the_query_grows():
+    loads = []
+
+    def load(page_size):
+        loads.append(page_size)
+        return iter(ITEMS)
+
+    picker = Picker(load, "title", page_size=2)
+    picker._set_query("d")
+    picker.filter.advance(1)
+    first = picker.filter
+
+    picker._set_query("di")
+
+    assert picker.filter.kind == "scan" and picker.filter is not first
+    assert picker.filter.results() == [ITEMS[1], ITEMS[2]]
+    # The listing and the first scan, narrowing loaded nothing
+    assert loads == [2, 2_000]
@@ -0,0 +1,109 @@
+"""`lifelog --profile`: spans, instrumented storage and the outputs."""
+
+import json
+import pstats
+
+import pytest
+
+from lifelog.cli.args import parse_args
+from lifelog.core import profiling
+from tests.helpers import make_entry
+
+
+@pytest.fixture
+def profiler(monkeypatch):
+    # Put back the disabled state however a test ends
+    monkeypatch.setattr(profiling, "_profiler", None)
+    return profiling.enable()
+
+
+def span_names(profiler):
+    return [name for name, *_ in profiler.spans]
+
+
+def test_spans_cost_nothing_until_enabled(monkeypatch):
+    monkeypatch.setattr(profiling, "_profiler", None)
+
+    assert not profiling.enabled()
+    assert profiling.span("config") is profiling.span("editor")
+
+
+def test_records_spans(profiler):
+    with profiling.span("config"):
+        with profiling.span("storage.open"):
+            pass
+
+    assert profiling.enabled() and profiling.current() is profiler
+    assert span_names(profiler) == ["storage.open", "config"]
+
+
+def test_times_lazy_results_once_consumed(profiler):
+    rows = profiler.timed_iterator("rows", iter(range(3)))
+    assert profiler.spans == []
+
+    assert list(rows) == [0, 1, 2]
+    assert span_names(profiler) == ["rows"]
+
+    # Abandoned part way, still one span
+    rows = profiler.timed_iterator("rows", iter(range(3)))
+    next(rows)
+    rows.close()
+    assert span_names(profiler) == ["rows", "rows"]
+
+
+def test_instruments_storage(profiler, storage):
+    storage.instrument(profiler)
+
+    storage.add_entry(make_entry("Profiled", 2024, 1, 1))
+    entries = storage.iter_entries()
+    assert span_names(profiler).count("storage.iter_entries") == 1
+
+    # The call, then reading its rows
+    assert [entry.body for entry in entries] == ["Profiled"]
+    assert span_names(profiler).count("storage.iter_entries") == 2
+    assert "storage.add_entry" in span_names(profiler)
+    assert "storage.instrument" not in span_names(profiler)
+
+
+def test_summary_is_slowest_first(profiler):
+    for name, duration in [("fast", 1), ("slow", 5), ("fast", 2)]:
+        profiler.record(name, 0, duration)
+
+    assert profiler.summary() == [("slow", 1, 5, 5), ("fast", 2, 3, 2)]
+
+
+def test_writes_a_chrome_trace(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(profiling, "_profiler", None)
+    path = tmp_path / "trace.json"
+
+    profiling.enable(path)
+    with profiling.span("storage.open"):
+        pass
+    profiling.finish()
+
+    (event,) = json.loads(path.read_text())["traceEvents"]
+    assert (event["name"], event["cat"], event["ph"]) == (
+        "storage.open",
+        "storage",
+        "X",
+    )
+
+    err = capsys.readouterr().err
+    assert "storage.open" in err and f"Wrote profile to {path}" in err
+    assert not profiling.enabled()
+
+
+def test_writes_cprofile_stats(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "_profiler", None)
+    path = tmp_path / "run.prof"
+
+    profiling.enable(path)
+    sorted(range(1000), reverse=True)
+    profiling.finish()
+
+    assert pstats.Stats(str(path)).total_calls > 0
+
+
+def test_profile_output_implies_profile():
+    assert not parse_args([]).profile
+    assert parse_args(["--profile-output", "trace.json"]).profile
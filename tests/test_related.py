@@ -0,0 +1,102 @@
+"""Related entries and the footer listing them in the editor."""
+
+import sys
+
+import pytest
+
+from lifelog.cli.editor import Editor
+from lifelog.core.entry import EntryHandler, add_footer, strip_footer
+from lifelog.core.related import RelatedEntries
+from tests.helpers import make_entry
+
+pytest.importorskip("numpy")
+
+BODIES = [
+    "Morning run along the river, legs tired after the long run",
+    "Baked sourdough bread, my starter finally rose",
+    "Evening run by the river, faster than the morning run",
+    "Tried a new sourdough bread recipe with rye flour",
+    "Quiet day at home reading",
+]
+
+
+@pytest.fixture
+def diary(storage):
+    storage.add_entries(
+        [make_entry(body, 2024, 1, day) for day, body in enumerate(BODIES, 1)]
+    )
+    return storage
+
+
+def related_uids(related, uid, limit=None):
+    return [entry.uid for entry, _ in related.find(uid, limit)]
+
+
+def test_finds_the_most_similar_entries(diary):
+    related = RelatedEntries(diary)
+
+    assert related_uids(related, 1, 1) == [3]
+    assert related_uids(related, 2, 1) == [4]
+    # Nothing in common with any other entry
+    assert related_uids(related, 5) == []
+
+
+def test_follows_new_and_edited_entries(diary):
+    related = RelatedEntries(diary)
+    assert related_uids(related, 2, 1) == [4]
+
+    diary.add_entry(make_entry("More bread: sourdough starter and rye", 2024, 1, 6))
+    assert related_uids(related, 2, 1) == [6]
+
+    diary.update_entry(diary.get_entry(6), make_entry("Swam a few laps", 2024, 1, 6))
+    assert related_uids(related, 2, 1) == [4]
+
+
+def test_a_new_index_starts_from_the_cache(diary):
+    assert related_uids(RelatedEntries(diary), 1) == related_uids(
+        RelatedEntries(diary), 1
+    )
+    assert diary.db_path.with_suffix(".vectors.npz").exists()
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    """Texts the editor was opened with, "Morning run" is edited in each."""
+    texts = []
+
+    def edit(editor, path):
+        texts.append(path.read_text())
+        path.write_text(texts[-1].replace("Morning run", "Morning walk"))
+
+    monkeypatch.setattr(Editor, "_verify_editor", lambda editor: None)
+    monkeypatch.setattr(Editor, "open", edit)
+    return texts
+
+
+def test_footer_lists_related_entries_and_is_not_saved(config, diary, opened):
+    EntryHandler(config, diary).open_entry_in_editor(diary.get_entry(1))
+
+    (text,) = opened
+    assert "Related entries:" in text and "(#3)" in text
+    assert diary.get_entry(1).body == BODIES[0].replace("Morning run", "Morning walk")
+
+
+def test_footer_is_left_out_without_numpy(config, diary, opened, monkeypatch):
+    monkeypatch.setitem(sys.modules, "numpy", None)
+    assert RelatedEntries(diary).find(1) is None
+
+    monkeypatch.setattr(
+        RelatedEntries,
+        "find",
+        lambda *args: pytest.fail("related entries looked up without NumPy"),
+    )
+    EntryHandler(config, diary).open_entry_in_editor(diary.get_entry(1))
+
+    assert opened == [BODIES[0]]
+
+
+def test_strip_footer_undoes_add_footer():
+    body = "Line one\n\nLine two\n"
+
+    assert strip_footer(add_footer(body, ["Related entries:", "  #2"])) == body
+    assert add_footer(body, []) == body
@@ -0,0 +1,71 @@
+"""Full-text search over entry bodies, archives included."""
+
+from datetime import datetime
+
+import pytest
+
+from tests.helpers import make_entry
+
+
+@pytest.fixture
+def diary(storage):
+    storage.add_entries(
+        [
+            make_entry("Hiking in the Alps with Alice #travel", 2019, 6, 1),
+            make_entry("Rainy day, read a book", 2024, 1, 1),
+            make_entry("Planning another hike, maybe the Alps again", 2024, 1, 2),
+            # Long enough to be stored compressed
+            make_entry("Notes from the trip. " * 60 + "Glacier", 2024, 1, 3),
+        ]
+    )
+    storage.archive(2020)
+    return storage
+
+
+def found(storage, query, **kwargs):
+    return [entry.uid for entry, _ in storage.search_entries(query, **kwargs)]
+
+
+def test_matches_words_in_every_partition(diary):
+    assert sorted(found(diary, "alps")) == [1, 3]
+    assert found(diary, "glacier") == [4]
+    assert found(diary, "snow") == []
+
+
+def test_snippets_mark_the_match(diary):
+    ((entry, snippet),) = diary.search_entries("book")
+
+    assert entry.body == "Rainy day, read a book"
+    assert snippet == "Rainy day, read a [book]"
+
+
+def test_fts_syntax_and_plain_words(diary):
+    assert sorted(found(diary, "hik*")) == [1, 3]
+    assert found(diary, "alps NOT alice") == [3]
+    # Not valid FTS5 syntax, searched for as words instead
+    assert found(diary, 'rainy "day') == [2]
+    assert found(diary, "book:") == [2]
+
+
+def test_limits_and_ranges(diary):
+    assert len(found(diary, "alps", limit=1)) == 1
+    assert found(diary, "alps", since=datetime(2020, 1, 1)) == [3]
+    assert found(diary, "alps", until=datetime(2020, 1, 1)) == [1]
+    assert found(diary, "alps", tag="#travel") == [1]
+
+
+def test_follows_edits(diary):
+    diary.update_entry(
+        diary.get_entry(2), make_entry("Sunny day, went out", 2024, 1, 1)
+    )
+    diary.add_entry(make_entry("Another book finished", 2024, 1, 4))
+
+    assert found(diary, "book") == [5]
+    assert found(diary, "sunny") == [2]
+
+
+def test_survives_a_rebuild(diary):
+    diary.rebuild_stats()
+
+    assert sorted(found(diary, "alps")) == [1, 3]
+    assert found(diary, "glacier") == [4]
@@ -0,0 +1,118 @@
+"""`lifelog stats`: per-day totals, streaks and the longest entries."""
+
+from datetime import date, datetime
+
+import pytest
+
+from lifelog.core.stats import StatsReport, count_words, find_streaks, period_key
+from lifelog.storage.file import FileStorage
+from tests.helpers import make_entry
+
+
+def days(*numbers):
+    return [date(2024, 3, number) for number in numbers]
+
+
+@pytest.mark.parametrize(
+    "written, today, streaks",
+    [
+        ([], date(2024, 3, 10), (0, (0, None, None))),
+        # Nothing written today yet, the streak still counts
+        (days(7, 8, 9), date(2024, 3, 10), (3, (3, *days(7, 9)))),
+        (days(1, 2, 3, 5, 9, 10), date(2024, 3, 10), (2, (3, *days(1, 3)))),
+        (days(1, 2, 3, 5, 6), date(2024, 3, 10), (0, (3, *days(1, 3)))),
+    ],
+)
+def test_find_streaks(written, today, streaks):
+    assert find_streaks(written, today) == streaks
+
+
+@pytest.mark.parametrize(
+    "period, key",
+    [
+        ("day", "2024-12-30"),
+        ("week", "2025-W01"),
+        ("month", "2024-12"),
+        ("year", "2024"),
+    ],
+)
+def test_period_key(period, key):
+    assert period_key(date(2024, 12, 30), period) == key
+
+
+def test_count_words():
+    assert count_words(" Two\n\nwords ") == 2
+    assert count_words("") == 0
+
+
+def write_entries(storage):
+    storage.add_entries(
+        [
+            make_entry("One two three", 2024, 3, 1, 8),
+            make_entry("Four five", 2024, 3, 1, 20),
+            make_entry("Six", 2024, 3, 2),
+        ]
+    )
+    storage.add_entry(make_entry("Seven eight nine ten", 2024, 3, 4))
+    storage.update_entry(
+        storage.get_entry(3), make_entry("Six and a few more", 2024, 3, 2)
+    )
+
+
+@pytest.fixture(params=["database", "file"])
+def diary(request, config, storage):
+    if request.param == "file":
+        storage.close()
+        storage = FileStorage(config)
+
+    write_entries(storage)
+
+    yield storage
+    storage.close()
+
+
+DAILY = [(date(2024, 3, 1), 2, 5), (date(2024, 3, 2), 1, 5), (date(2024, 3, 4), 1, 4)]
+
+
+def test_keeps_daily_totals(diary):
+    assert diary.get_daily_stats() == DAILY
+    assert (
+        diary.get_daily_stats(since=datetime(2024, 3, 2), until=datetime(2024, 3, 4))
+        == DAILY[1:2]
+    )
+
+    diary.rebuild_stats()
+    assert diary.get_daily_stats() == DAILY
+
+
+def test_rebuild_fixes_drifted_totals(storage):
+    write_entries(storage)
+    storage.connection.execute("UPDATE daily_stats SET words = 0")
+    storage.connection.execute("UPDATE entries SET word_count = 0 WHERE entry_id = 1")
+
+    storage.rebuild_stats()
+
+    assert storage.get_daily_stats() == DAILY
+
+
+def test_longest_entries(diary):
+    assert [(header.uid, words) for header, words in diary.get_longest_entries(2)] == [
+        (3, 5),
+        (4, 4),
+    ]
+    assert [
+        (header.uid, words)
+        for header, words in diary.get_longest_entries(until=datetime(2024, 3, 2))
+    ] == [(1, 3), (2, 2)]
+
+
+def test_report(diary, capsys):
+    StatsReport(diary).run(period="day", limit=2)
+
+    out = capsys.readouterr().out
+    assert "Entries: 4  Words: 14  Days written: 3" in out
+    assert "Longest streak: 2 days (2024-03-01 to 2024-03-02)" in out
+    assert "Per day (last 2):\n  2024-03-02" in out
+
+    StatsReport(diary).run(since=datetime(2025, 1, 1))
+    assert capsys.readouterr().out == "No entries found\n"
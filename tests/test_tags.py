@@ -0,0 +1,85 @@
+"""#tags and @mentions: extraction, normalizing and the per-tag queries."""
+
+from datetime import datetime
+
+import pytest
+
+from lifelog.core.tags import extract_tags, normalize_tag
+from lifelog.storage.file import FileStorage
+from tests.helpers import make_entry
+
+
+@pytest.mark.parametrize(
+    "body, tags",
+    [
+        ("Ran 5k #Running with @Alice", {"#running", "@alice"}),
+        ("#health-check- and #health", {"#health-check", "#health"}),
+        ("mail me@example.com, see page#anchor, C# and F#", set()),
+        ("# A heading\n#2024 and #1st aren't tags", set()),
+        ("(#paren), #日記 and @José", {"#paren", "#日記", "@josé"}),
+        ("", set()),
+    ],
+)
+def test_extract_tags(body, tags):
+    assert extract_tags(body) == tags
+
+
+@pytest.mark.parametrize(
+    "value, tag",
+    [("health", "#health"), (" #Health ", "#health"), ("@Alice", "@alice")],
+)
+def test_normalize_tag(value, tag):
+    assert normalize_tag(value) == tag
+
+
+@pytest.mark.parametrize("value", ["", "#", "@", "#1st", "two words", "#a#b"])
+def test_normalize_tag_rejects(value):
+    with pytest.raises(ValueError, match="Invalid tag"):
+        normalize_tag(value)
+
+
+@pytest.fixture(params=["database", "file"])
+def tagged(request, config, storage):
+    if request.param == "file":
+        storage.close()
+        storage = FileStorage(config)
+
+    storage.add_entries(
+        [
+            make_entry("Morning run #running @alice", 2024, 1, 1),
+            make_entry("Rest day #health", 2024, 1, 2),
+            make_entry("Intervals #running", 2024, 1, 3),
+        ]
+    )
+    storage.add_entry(make_entry("Long run #Running #health", 2024, 1, 4))
+    # An edit moves the entry from one tag to another
+    storage.update_entry(
+        storage.get_entry(2), make_entry("Rest day #sleep", 2024, 1, 5)
+    )
+
+    yield storage
+    storage.close()
+
+
+def test_counts_tags(tagged):
+    assert tagged.get_tag_counts() == [
+        ("#running", 3),
+        ("#health", 1),
+        ("#sleep", 1),
+        ("@alice", 1),
+    ]
+    assert tagged.get_tag_counts(since=datetime(2024, 1, 3)) == [
+        ("#running", 2),
+        ("#health", 1),
+    ]
+
+
+def test_lists_the_entries_of_a_tag(tagged):
+    assert [entry.uid for entry in tagged.iter_entries(tag="#running")] == [4, 3, 1]
+    assert [entry.uid for entry in tagged.iter_entries(tag="#health")] == [4]
+    assert [
+        entry.uid
+        for entry in tagged.iter_entries(
+            tag="#running", since=datetime(2024, 1, 2), until=datetime(2024, 1, 4)
+        )
+    ] == [3]
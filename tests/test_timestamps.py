@@ -0,0 +1,126 @@
+"""Epoch timestamps, --since/--until/--on and date-range listings."""
+
+from datetime import date, datetime
+
+import pytest
+
+from lifelog.cli.args import parse_args
+from lifelog.core.timestamps import (
+    from_epoch_us,
+    parse_date,
+    resolve_date_range,
+    to_epoch_us,
+)
+from lifelog.storage.connection import convert_timestamp
+from lifelog.storage.file import FileStorage
+from tests.helpers import make_entry
+
+TODAY = date(2024, 3, 10)
+
+
+@pytest.mark.parametrize(
+    "timestamp",
+    [
+        datetime(2024, 3, 1, 8, 15, 30, 123456),
+        datetime(1970, 1, 1),
+        datetime(1969, 12, 31, 23, 59, 59, 999999),
+    ],
+)
+def test_epoch_round_trip(timestamp):
+    assert from_epoch_us(to_epoch_us(timestamp)) == timestamp
+
+
+def test_reads_legacy_iso_text():
+    assert convert_timestamp(b"2024-03-01 08:15:30.5") == datetime(
+        2024, 3, 1, 8, 15, 30, 500000
+    )
+    assert convert_timestamp(b"1709280930500000") == from_epoch_us(1709280930500000)
+
+
+@pytest.mark.parametrize(
+    "value, parsed",
+    [
+        ("2024-03-01", (datetime(2024, 3, 1), True)),
+        ("2024-03-01T08:15", (datetime(2024, 3, 1, 8, 15), False)),
+        (" Today ", (datetime(2024, 3, 10), True)),
+        ("yesterday", (datetime(2024, 3, 9), True)),
+        ("3d", (datetime(2024, 3, 7), True)),
+        ("2w", (datetime(2024, 2, 25), True)),
+    ],
+)
+def test_parse_date(value, parsed):
+    assert parse_date(value, TODAY) == parsed
+
+
+@pytest.mark.parametrize("value", ["", "3m", "2024-13-01", "last week"])
+def test_parse_date_rejects(value):
+    with pytest.raises(ValueError, match="Invalid date"):
+        parse_date(value, TODAY)
+
+
+@pytest.mark.parametrize(
+    "kwargs, bounds",
+    [
+        ({}, (None, None)),
+        ({"on": "2024-03-01"}, (datetime(2024, 3, 1), datetime(2024, 3, 2))),
+        ({"since": "yesterday"}, (datetime(2024, 3, 9), None)),
+        # A whole-day --until includes that day, a time doesn't
+        ({"until": "2024-03-01"}, (None, datetime(2024, 3, 2))),
+        ({"until": "2024-03-01T12:00"}, (None, datetime(2024, 3, 1, 12))),
+    ],
+)
+def test_resolve_date_range(kwargs, bounds):
+    assert resolve_date_range(**kwargs, today=TODAY) == bounds
+
+
+def test_args_resolve_the_range(capsys):
+    args = parse_args(["--since", "2024-03-01", "--until", "2024-03-02"])
+    assert (args.since, args.until) == (datetime(2024, 3, 1), datetime(2024, 3, 3))
+
+    with pytest.raises(SystemExit):
+        parse_args(["--on", "today", "--since", "3d"])
+    assert "--on can't be combined" in capsys.readouterr().err
+
+    with pytest.raises(SystemExit):
+        parse_args(["--since", "soon"])
+    assert "Invalid date 'soon'" in capsys.readouterr().err
+
+
+@pytest.fixture(params=["database", "file"])
+def diary(request, config, storage):
+    if request.param == "file":
+        storage.close()
+        storage = FileStorage(config)
+
+    storage.add_entries(
+        [
+            make_entry("Before", 2024, 2, 29, 23, 59),
+            make_entry("Morning", 2024, 3, 1, 8),
+            make_entry("Same time, added later", 2024, 3, 1, 8),
+            make_entry("Evening", 2024, 3, 1, 20),
+            make_entry("After", 2024, 3, 2),
+        ]
+    )
+
+    yield storage
+    storage.close()
+
+
+def test_lists_a_range_newest_first(diary):
+    since, until = resolve_date_range(on="2024-03-01")
+
+    # Entries with the same timestamp come newest uid first
+    assert [entry.uid for entry in diary.iter_entries(since=since, until=until)] == [
+        4,
+        3,
+        2,
+    ]
+    assert [
+        header.uid
+        for header in diary.iter_entry_headers(
+            page_size=1, since=datetime(2024, 3, 1, 8)
+        )
+    ] == [5, 4, 3, 2]
+    assert [entry.timestamp for entry in diary.iter_entries(until=since)] == [
+        datetime(2024, 2, 29, 23, 59)
+    ]